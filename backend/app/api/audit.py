@@ -0,0 +1,102 @@
+import json
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import List, Optional
+from ..core import auth
+from ..core.database import get_session
+from ..services.audit import audit_arrow_schema, log_audit_event
+from ..services.audit_query import (
+    AuditFilters, audit_query, decode_cursor, encode_cursor,
+    iter_audit_batches, stream_csv, stream_parquet,
+)
+
+router = APIRouter()
+
+class AuditEvent(BaseModel):
+    id: int
+    timestamp: datetime
+    user_id: str
+    action: str
+    resource_id: Optional[str] = None
+    ip_address: Optional[str] = None
+    details: Optional[str] = None
+
+class AuditPage(BaseModel):
+    items: List[AuditEvent]
+    next_cursor: Optional[str] = None
+
+def audit_filters(
+    user_id: Optional[str] = None,
+    action: Optional[List[str]] = Query(None, description="Repeat to match several actions"),
+    since: Optional[datetime] = Query(None, description="Events at or after this time"),
+    until: Optional[datetime] = Query(None, description="Events before this time"),
+) -> AuditFilters:
+    return AuditFilters(user_id=user_id, actions=action or (), since=since, until=until)
+
+def _filter_details(filters: AuditFilters, **extra) -> str:
+    return json.dumps({
+        "user_id": filters.user_id,
+        "actions": list(filters.actions),
+        "since": filters.since.isoformat() if filters.since else None,
+        "until": filters.until.isoformat() if filters.until else None,
+        **extra,
+    })
+
+@router.get("/audit/events", response_model=AuditPage)
+async def list_audit_events(
+    filters: AuditFilters = Depends(audit_filters),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    session=Depends(get_session),
+    current_user: auth.User = Depends(auth.get_current_user)
+):
+    """Newest events first. Follow `next_cursor` until it is null."""
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Reading the audit trail is itself audited
+    await log_audit_event(user_id=current_user.username, action="AUDIT_READ", details=_filter_details(filters))
+
+    # One extra row tells us whether another page exists
+    rows = (await session.exec(audit_query(filters, after, limit + 1))).all()
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1].timestamp, page[-1].id) if len(rows) > limit else None
+    return AuditPage(items=[AuditEvent(**row._mapping) for row in page], next_cursor=next_cursor)
+
+@router.get("/audit/export")
+async def export_audit_events(
+    filters: AuditFilters = Depends(audit_filters),
+    output_format: str = Query("csv", pattern="^(csv|parquet)$"),
+    current_user: auth.User = Depends(auth.get_current_user)
+):
+    """
+    Stream every matching event, oldest first, as CSV or Parquet.
+
+    Rows are read in keyset batches as the client consumes the response,
+    so memory stays flat however large the range. The export is recorded as
+    AUDIT_EXPORT, with its filter, before the first byte is sent.
+    """
+    if output_format == "parquet":
+        try:
+            audit_arrow_schema()
+        except RuntimeError as e:
+            raise HTTPException(status_code=501, detail=str(e))
+    await log_audit_event(user_id=current_user.username, action="AUDIT_EXPORT",
+                          details=_filter_details(filters, format=output_format))
+
+    # A sync generator: StreamingResponse pulls it from a worker thread
+    batches = iter_audit_batches(filters)
+    if output_format == "parquet":
+        return StreamingResponse(
+            stream_parquet(batches),
+            media_type="application/vnd.apache.parquet",
+            headers={"Content-Disposition": 'attachment; filename="audit.parquet"'},
+        )
+    return StreamingResponse(
+        stream_csv(batches),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="audit.csv"'},
+    )
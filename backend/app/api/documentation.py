@@ -1,15 +1,27 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+import json
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Response, Query
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
 from typing import Dict, Any, List, Optional
 from ..services.documentation_service import DocumentationService
+from ..services.export_service import ExportService, NoteExport
+from ..services.note_store import iter_notes
+from ..services.audit import log_audit_event
+from ..core.container import get_documentation_service
+from ..core import auth
 
 router = APIRouter()
-doc_service = DocumentationService()
+# Routes main.py mounts next to its own /api/generate-note (which takes a
+# free-text patient_context); `router` includes them as well
+export_router = APIRouter()
 
 class GenerateNoteRequest(BaseModel):
     encounter_text: str
     patient_context: Dict[str, Any]
     encounter_type: str
+    formats: Optional[List[str]] = Field(None, description="Export formats to render (json, plain_text, patient_handout, fhir); all by default")
 
 class QualityCheckResult(BaseModel):
     is_complete: bool
@@ -22,19 +34,84 @@ class SOAPNote(BaseModel):
     plan: str
 
 class GenerateNoteResponse(BaseModel):
-    json: Dict[str, Any]
-    plain_text: str
-    patient_handout: str
-    fhir: Dict[str, Any]
+    json: Optional[Dict[str, Any]] = None
+    plain_text: Optional[str] = None
+    patient_handout: Optional[str] = None
+    fhir: Optional[Dict[str, Any]] = None
 
-@router.post("/generate-note", response_model=GenerateNoteResponse)
-async def generate_note(request: GenerateNoteRequest):
+@router.post("/generate-note", response_model=GenerateNoteResponse, response_model_exclude_unset=True)
+async def generate_note(
+    request: GenerateNoteRequest,
+    doc_service: DocumentationService = Depends(get_documentation_service)
+):
     try:
         note = await doc_service.generate_note(
             request.encounter_text,
             request.patient_context,
-            request.encounter_type
+            request.encounter_type,
+            request.formats
         )
         return note
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@export_router.post("/generate-note/fhir", response_class=Response)
+async def generate_note_fhir(
+    request: GenerateNoteRequest,
+    doc_service: DocumentationService = Depends(get_documentation_service)
+):
+    """Return only the FHIR Composition, serialized once straight to bytes."""
+    try:
+        note = await doc_service.build_note(
+            request.encounter_text,
+            request.patient_context,
+            request.encounter_type
+        )
+        export = ExportService.export(note, request.patient_context)
+        return Response(content=export.fhir_bytes, media_type="application/fhir+json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@export_router.get("/notes/export")
+async def export_notes(
+    since: Optional[datetime] = Query(None, description="Only notes created at or after this time"),
+    patient_id: Optional[str] = None,
+    output_format: str = Query("ndjson", pattern="^(ndjson|bundle)$"),
+    current_user: auth.User = Depends(auth.get_current_user)
+):
+    """
+    Bulk export of stored notes as FHIR NDJSON (or one Bundle).
+
+    The response is streamed from a generator over a server-side DB cursor:
+    each chunk is only produced after the previous one was sent, so a slow
+    client throttles the database reader instead of filling memory.
+
+    The export is audited twice: NOTES_EXPORT with the filter before the
+    first byte is sent (so an interrupted download is still on record), and
+    NOTES_EXPORT_COMPLETE with the row count once the stream has finished.
+    """
+    details = {"since": since.isoformat() if since else None, "patient_id": patient_id, "format": output_format}
+    await log_audit_event(user_id=current_user.username, action="NOTES_EXPORT", resource_id=patient_id,
+                          details=json.dumps(details))
+
+    counter = {"rows": 0}
+
+    def counted_exports():
+        for note, context, created_at in iter_notes(since, patient_id):
+            counter["rows"] += 1
+            yield NoteExport(note, context, created_at)
+
+    async def audit_complete():
+        await log_audit_event(user_id=current_user.username, action="NOTES_EXPORT_COMPLETE", resource_id=patient_id,
+                              details=json.dumps(dict(details, rows=counter["rows"])))
+
+    exports = counted_exports()
+    if output_format == "bundle":
+        stream, media_type = ExportService.stream_bundle(exports), "application/fhir+json"
+    else:
+        stream, media_type = ExportService.stream_ndjson(exports), "application/fhir+ndjson"
+    return StreamingResponse(stream, media_type=media_type, background=BackgroundTask(audit_complete))
+
+router.include_router(export_router)
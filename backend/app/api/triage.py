@@ -1,10 +1,16 @@
+import json
 import logging
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, validator
 from typing import Dict, Any, List, Optional
 from ..services.triage_service import TriageService
+from ..core.container import get_triage_service
 
 router = APIRouter()
+# Polling/SSE for refinements started by any triage endpoint; main.py mounts
+# only these next to its own /api/triage
+refinement_router = APIRouter()
 logger = logging.getLogger(__name__)
 
 # Request Models
@@ -39,9 +45,18 @@ class TriageResponse(BaseModel):
     clinical_json: TriageClinicalData
     patient_text: str
 
-# Dependency
-def get_triage_service():
-    return TriageService()
+class FastTriageResponse(TriageResponse):
+    triage_id: str
+    status: str = Field(..., description="Refinement status: pending, refined or failed")
+    poll_url: str
+    events_url: str
+
+class RefinementStatus(BaseModel):
+    triage_id: str
+    status: str
+    quick: TriageResponse
+    refined: Optional[TriageResponse] = None
+    error: Optional[str] = None
 
 @router.post("/triage", response_model=TriageResponse, summary="Process patient triage")
 async def process_triage(
@@ -68,3 +83,55 @@ async def process_triage(
             status_code=500, 
             detail="An internal error occurred while processing the triage request."
         )
+
+@router.post("/triage/fast", response_model=FastTriageResponse, summary="Instant rule-based triage with background model refinement")
+async def fast_triage(
+    request: Request,
+    payload: TriageRequest,
+    service: TriageService = Depends(get_triage_service)
+):
+    """
+    Returns the vitals/keyword ESI immediately, without waiting for the
+    model. MedGemma refines it in the background; poll `poll_url` or follow
+    the server-sent events at `events_url` for the refined result.
+    """
+    result = await service.start_triage(payload.text_input, payload.vitals.dict(), payload.image)
+    triage_id = result["triage_id"]
+    return {
+        **result,
+        "poll_url": str(request.url_for("get_triage_refinement", triage_id=triage_id)),
+        "events_url": str(request.url_for("stream_triage_refinement", triage_id=triage_id)),
+    }
+
+@refinement_router.get("/triage/{triage_id}", response_model=RefinementStatus, name="get_triage_refinement")
+async def get_triage_refinement(
+    triage_id: str,
+    wait: float = Query(0, ge=0, le=30, description="Seconds to wait for the refinement (long polling)"),
+    service: TriageService = Depends(get_triage_service)
+):
+    job = await service.refinements.wait(triage_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired triage_id")
+    return job.snapshot()
+
+@refinement_router.get("/triage/{triage_id}/events", name="stream_triage_refinement")
+async def stream_triage_refinement(
+    triage_id: str,
+    service: TriageService = Depends(get_triage_service)
+):
+    """Server-sent events: `quick`, then `refined` (or `failed`), with `ping` heartbeats in between."""
+    job = service.refinements.get(triage_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired triage_id")
+
+    async def event_stream():
+        async for event, data in service.refinements.events(job):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+router.include_router(refinement_router)
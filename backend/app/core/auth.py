@@ -1,10 +1,17 @@
 import os
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional
+import httpx
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from pydantic import BaseModel
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,6 +21,19 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "super-secret-key-for-dev-only")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# A verified token is trusted from cache until it expires, but never longer than this
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "300"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "2048"))
+
+# Hospital SSO (OIDC); verification is disabled until a JWKS URL is configured
+SSO_JWKS_URL = os.getenv("SSO_JWKS_URL")
+SSO_ISSUER = os.getenv("SSO_ISSUER")
+SSO_AUDIENCE = os.getenv("SSO_AUDIENCE")
+SSO_ALGORITHMS = os.getenv("SSO_ALGORITHMS", "RS256").split(",")
+JWKS_REFRESH_INTERVAL = float(os.getenv("JWKS_REFRESH_INTERVAL", "3600"))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -23,6 +43,71 @@ class User(BaseModel):
     full_name: Optional[str] = None
     disabled: Optional[bool] = None
 
+class ExpiringLRU:
+    """Thread-safe LRU whose entries also carry their own expiry (monotonic seconds)."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl: float):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+token_cache = ExpiringLRU(TOKEN_CACHE_SIZE)
+user_cache = ExpiringLRU(USER_CACHE_SIZE)
+
+def _token_key(token: str, issuer: str) -> str:
+    # Hash so raw bearer tokens are never held as cache keys; the issuer
+    # prefix keeps an SSO verification from vouching for an app token
+    return hashlib.sha256(f"{issuer}:{token}".encode()).hexdigest()
+
+def _claims_ttl(claims: Dict[str, Any]) -> float:
+    exp = claims.get("exp")
+    if exp is None:
+        return TOKEN_CACHE_TTL
+    return min(TOKEN_CACHE_TTL, float(exp) - time.time())
+
+def decode_access_token(token: str) -> Dict[str, Any]:
+    """Verify an app-issued HS256 token, reusing earlier verifications until `exp`."""
+    key = _token_key(token, "app")
+    claims = token_cache.get(key)
+    if claims is None:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        token_cache.set(key, claims, _claims_ttl(claims))
+    return claims
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -40,18 +125,120 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
+
+    user = await get_user(username)
+    if user is None or user.disabled:
+        raise credentials_exception
+    return user
+
+async def load_user(username: str) -> Optional[User]:
     # In a real app, you would fetch the user from the database
     # For HIPAA compliance/SSO stub, we assume the token comes from a trusted hospital SSO
     return User(username=username, email=f"{username}@hospital.org", full_name="Clinical User")
 
-def verify_hospital_sso_token(token: str):
-    # Stub for actual SSO integration (e.g., Okta, Ping, or Hospital LDAP)
-    # This would involve verifying the token against the hospital's OIDC provider
-    return True
+async def get_user(username: str) -> Optional[User]:
+    """User profile through a short-lived LRU, so a burst of requests costs one lookup."""
+    user = user_cache.get(username)
+    if user is None:
+        user = await load_user(username)
+        if user is not None:
+            user_cache.set(username, user, USER_CACHE_TTL)
+    return user
+
+class JWKSCache:
+    """
+    The SSO provider's signing keys, kept locally.
+
+    Keys are fetched once and refreshed in the background every
+    `refresh_interval` seconds. A token signed with an unknown `kid` (key
+    rotation) triggers one immediate refresh, at most every
+    `min_refresh_interval` seconds since the last attempt (failed or not),
+    so bad tokens can't hammer the provider even while it is down.
+    """
+
+    def __init__(self, url: str, refresh_interval: float = JWKS_REFRESH_INTERVAL,
+                 min_refresh_interval: float = 30.0, client: Optional[httpx.AsyncClient] = None):
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.client = client or httpx.AsyncClient(timeout=5.0)
+        self.keys: Dict[str, Dict[str, Any]] = {}
+        self.fetched_at = 0.0
+        self.refreshes = 0
+        self._attempted_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self, force: bool = False):
+        async with self._lock:
+            now = time.monotonic()
+            if not force and self._attempted_at is not None and now - self._attempted_at < self.min_refresh_interval:
+                return
+            self._attempted_at = now
+            response = await self.client.get(self.url)
+            response.raise_for_status()
+            body = response.json()  # ValueError on a non-JSON body
+            if not isinstance(body, dict):
+                raise ValueError("JWKS response is not a JSON object")
+            self.keys = {key["kid"]: key for key in body.get("keys", []) if isinstance(key, dict) and "kid" in key}
+            self.fetched_at = time.monotonic()
+            self.refreshes += 1
+
+    async def get_key(self, kid: str) -> Optional[Dict[str, Any]]:
+        if kid not in self.keys:
+            await self.refresh()
+        return self.keys.get(kid)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh(force=True)
+            except Exception as e:
+                # Keep serving the last good key set
+                print(f"Warning: JWKS refresh failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.client.aclose()
+
+jwks_cache: Optional[JWKSCache] = JWKSCache(SSO_JWKS_URL) if SSO_JWKS_URL else None
+
+async def verify_hospital_sso_token(token: str, jwks: Optional[JWKSCache] = None) -> Optional[Dict[str, Any]]:
+    """
+    Verify a hospital SSO (OIDC) token against the locally cached JWKS and
+    return its claims, or None if it is invalid or SSO isn't configured.
+    Verified tokens are cached like app tokens, until `exp`.
+    """
+    jwks = jwks or jwks_cache
+    if jwks is None:
+        return None
+    key = _token_key(token, "sso")
+    claims = token_cache.get(key)
+    if claims is not None:
+        return claims
+    try:
+        signing_key = await jwks.get_key(jwt.get_unverified_header(token).get("kid"))
+        if signing_key is None:
+            return None
+        claims = jwt.decode(
+            token, signing_key, algorithms=SSO_ALGORITHMS, audience=SSO_AUDIENCE, issuer=SSO_ISSUER,
+            options={"verify_aud": SSO_AUDIENCE is not None},
+        )
+    except (JWTError, httpx.HTTPError, ValueError):
+        # ValueError: the provider answered with something other than a JWKS document
+        return None
+    token_cache.set(key, claims, _claims_ttl(claims))
+    return claims
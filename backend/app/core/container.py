@@ -0,0 +1,64 @@
+import asyncio
+import os
+from typing import Optional
+from fastapi import Request
+
+from ..services.ollama_service import OllamaService
+from ..services.documentation_service import DocumentationService
+from ..services.triage_service import TriageService
+from ..services.inference_scheduler import InferenceScheduler
+
+
+class ServiceContainer:
+    """
+    Application-scoped service instances.
+
+    Built once by the app lifespan and stored on `app.state.services`, so
+    every router shares one OllamaService (one batch queue and one pooled
+    HTTP client) and one TriageService (one preprocessor, one model load).
+    Routes get them through the dependencies below; nothing is constructed
+    per request.
+    """
+
+    def __init__(self):
+        # One scheduler in front of every inference backend: triage and
+        # documentation compete for the same accelerator
+        self.scheduler = InferenceScheduler()
+        self.ollama = OllamaService(scheduler=self.scheduler)
+        self.documentation = DocumentationService(ollama=self.ollama)
+        self.triage = TriageService(scheduler=self.scheduler)
+        self._warmup_task: Optional[asyncio.Task] = None
+
+    async def startup(self):
+        self.ollama.start()
+        # Optionally load MedGemma in the background so the first triage
+        # request doesn't pay for it; the API is serving in the meantime.
+        if os.getenv("WARM_MODELS", "false").lower() in ("1", "true", "yes"):
+            self._warmup_task = asyncio.create_task(self.triage.warmup())
+
+    async def shutdown(self):
+        if self._warmup_task is not None and not self._warmup_task.done():
+            self._warmup_task.cancel()
+        await self.ollama.close()
+
+
+def get_services(request: Request) -> ServiceContainer:
+    """
+    FastAPI dependency returning the app's ServiceContainer.
+
+    Apps that only mount a router (tests, scripts) get one created on
+    first use instead of going through the lifespan.
+    """
+    services = getattr(request.app.state, "services", None)
+    if services is None:
+        services = ServiceContainer()
+        request.app.state.services = services
+    return services
+
+
+def get_documentation_service(request: Request) -> DocumentationService:
+    return get_services(request).documentation
+
+
+def get_triage_service(request: Request) -> TriageService:
+    return get_services(request).triage
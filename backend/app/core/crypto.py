@@ -0,0 +1,214 @@
+import os
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Iterable, Any
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# Ciphertexts written in envelope mode carry one of these prefixes; anything else is Fernet.
+# "v3:" envelopes are bound to their column (AES-GCM associated data), "v2:" ones are not.
+ENVELOPE_PREFIX = "v3:"
+UNBOUND_ENVELOPE_PREFIX = "v2:"
+NONCE_SIZE = 12
+WRAPPED_KEY_SIZE = 32 + 16  # AES-256 data key + GCM tag
+# Below this many values the thread pool costs more than it saves
+PARALLEL_THRESHOLD = 32
+
+
+class FieldCipher:
+    """
+    Field-level encryption for PHI columns.
+
+    Two formats are read transparently:
+    - Fernet tokens (AES-128-CBC + HMAC), the original format.
+    - AES-256-GCM envelopes, "v3:" + base64(key nonce | wrapped data key |
+      nonce | ciphertext). Each row gets a random data key that is wrapped
+      by a master key derived from ENCRYPTION_KEY. The `context` (e.g.
+      "patientdata.ssn_encrypted") is authenticated as associated data, so a
+      ciphertext copied into another column fails to decrypt. Older "v2:"
+      envelopes were written without it and are still read.
+
+    Fernet has no associated data; `context` is ignored for Fernet tokens.
+
+    `mode` ("fernet" or "aesgcm", env ENCRYPTION_MODE) only decides how new
+    values are written. Existing ciphertext keeps working either way.
+    """
+
+    def __init__(self, key: str, mode: Optional[str] = None):
+        self.fernet = Fernet(key.encode())
+        self.mode = (mode or os.getenv("ENCRYPTION_MODE", "fernet")).lower()
+        master = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"phi-envelope-kek").derive(key.encode())
+        self._kek = AESGCM(master)
+        # Unwrapped data keys, so the fields of one row unwrap their key once
+        self._data_keys: Dict[bytes, AESGCM] = {}
+        self._lock = threading.Lock()
+
+    # -- single values --------------------------------------------------
+
+    def new_data_key(self) -> bytes:
+        return AESGCM.generate_key(bit_length=256)
+
+    def wrap_data_key(self, data_key: bytes) -> bytes:
+        key_nonce = os.urandom(NONCE_SIZE)
+        return key_nonce + self._kek.encrypt(key_nonce, data_key, None)
+
+    def encrypt(self, data: str, data_key: Optional[bytes] = None, header: Optional[bytes] = None,
+                context: Optional[str] = None) -> str:
+        if not data:
+            return data
+        if self.mode != "aesgcm":
+            return self.fernet.encrypt(data.encode()).decode()
+        data_key = data_key or self.new_data_key()
+        header = header or self.wrap_data_key(data_key)
+        nonce = os.urandom(NONCE_SIZE)
+        ciphertext = AESGCM(data_key).encrypt(nonce, data.encode(), _aad(context))
+        return ENVELOPE_PREFIX + base64.urlsafe_b64encode(header + nonce + ciphertext).decode()
+
+    def decrypt(self, data: str, context: Optional[str] = None) -> str:
+        if not data:
+            return data
+        if data.startswith(ENVELOPE_PREFIX):
+            aad = _aad(context)
+        elif data.startswith(UNBOUND_ENVELOPE_PREFIX):
+            aad = None
+        else:
+            return self.fernet.decrypt(data.encode()).decode()
+        blob = base64.urlsafe_b64decode(data[len(ENVELOPE_PREFIX):])
+        header_end = NONCE_SIZE + WRAPPED_KEY_SIZE
+        header = blob[:header_end]
+        nonce, ciphertext = blob[header_end:header_end + NONCE_SIZE], blob[header_end + NONCE_SIZE:]
+        return self._data_key(header).decrypt(nonce, ciphertext, aad).decode()
+
+    def _data_key(self, header: bytes) -> AESGCM:
+        aead = self._data_keys.get(header)
+        if aead is None:
+            key = self._kek.decrypt(header[:NONCE_SIZE], header[NONCE_SIZE:], None)
+            aead = AESGCM(key)
+            with self._lock:
+                if len(self._data_keys) > 10_000:
+                    self._data_keys.clear()
+                self._data_keys[header] = aead
+        return aead
+
+    # -- whole result sets ----------------------------------------------
+
+    def encrypt_many(self, values: Sequence[str], context: Optional[str] = None) -> List[str]:
+        return _map(lambda value: self.encrypt(value, context=context), values)
+
+    def decrypt_many(self, values: Sequence[str], context: Optional[str] = None) -> List[str]:
+        return _map(lambda value: self.decrypt(value, context), values)
+
+    def encrypt_row(self, fields: Dict[str, str], table: Optional[str] = None) -> Dict[str, str]:
+        """Encrypt one row's fields ({column: plaintext}) under a single per-row data key."""
+        data_key = self.new_data_key()
+        header = self.wrap_data_key(data_key) if self.mode == "aesgcm" else None
+        return {
+            column: self.encrypt(value, data_key, header, context=field_context(table, column))
+            for column, value in fields.items()
+        }
+
+
+def field_context(table: Optional[str], column: str) -> str:
+    """Associated data for one encrypted column: "table.column"."""
+    return f"{table}.{column}" if table else column
+
+
+def _aad(context: Optional[str]) -> Optional[bytes]:
+    return context.encode() if context else None
+
+
+CRYPTO_WORKERS = int(os.getenv("CRYPTO_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=CRYPTO_WORKERS, thread_name_prefix="phi-crypto")
+    return _executor
+
+
+def _map(fn, values: Sequence[str]) -> List[str]:
+    """
+    Apply `fn` across a thread pool in contiguous chunks (one per worker).
+    OpenSSL releases the GIL, so large result sets decrypt in parallel.
+    """
+    values = list(values)
+    if len(values) < PARALLEL_THRESHOLD:
+        return [fn(v) for v in values]
+    executor = _get_executor()
+    size = -(-len(values) // CRYPTO_WORKERS)
+    chunks = [values[i:i + size] for i in range(0, len(values), size)]
+    results: List[str] = []
+    for chunk_result in executor.map(lambda chunk: [fn(v) for v in chunk], chunks):
+        results.extend(chunk_result)
+    return results
+
+
+class CryptoSession:
+    """
+    Per-session memo of decrypted values.
+
+    The same ciphertext (e.g. a patient's name read by several properties or
+    rows) is decrypted once per session. Plaintexts are held in bytearrays
+    that are overwritten with zeros on close(). That is best effort: str
+    copies already returned to callers are outside its reach.
+    """
+
+    def __init__(self, cipher: FieldCipher):
+        self.cipher = cipher
+        # Keyed by (context, ciphertext): a ciphertext is only served from
+        # the memo for the column it was decrypted (and authenticated) for
+        self._memo: Dict[tuple, bytearray] = {}
+        self.closed = False
+
+    def decrypt(self, data: str, context: Optional[str] = None) -> str:
+        if not data or self.closed:
+            return self.cipher.decrypt(data, context)
+        buffer = self._memo.get((context, data))
+        if buffer is None:
+            buffer = self._memo[(context, data)] = bytearray(self.cipher.decrypt(data, context).encode())
+        return buffer.decode()
+
+    def decrypt_many(self, values: Sequence[str], context: Optional[str] = None) -> List[str]:
+        if self.closed:
+            return self.cipher.decrypt_many(values, context)
+        missing = list(dict.fromkeys(v for v in values if v and (context, v) not in self._memo))
+        for ciphertext, plaintext in zip(missing, self.cipher.decrypt_many(missing, context)):
+            self._memo[(context, ciphertext)] = bytearray(plaintext.encode())
+        return [self._memo[(context, v)].decode() if v else v for v in values]
+
+    def decrypt_rows(self, rows: Iterable[Any], fields: Dict[str, str], table: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Decrypt `fields` ({plain name: encrypted column}) for every row, one
+        pooled pass per column, and return plain dicts, e.g. for a
+        waiting-room list.
+        """
+        rows = list(rows)
+        plain = [{} for _ in rows]
+        for name, column in fields.items():
+            values = self.decrypt_many([getattr(row, column) for row in rows], field_context(table, column))
+            for out, value in zip(plain, values):
+                out[name] = value
+        return plain
+
+    def close(self):
+        for buffer in self._memo.values():
+            buffer[:] = b"\x00" * len(buffer)
+        self._memo.clear()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -1,33 +1,199 @@
 import os
-from typing import Optional
-from sqlmodel import SQLModel, create_engine, Session, Field
+import threading
+from typing import AsyncIterator, Callable, ClassVar, Dict, List, Optional
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import object_session
+from sqlmodel import SQLModel, create_engine, Field
+from sqlmodel.ext.asyncio.session import AsyncSession
 from cryptography.fernet import Fernet
 from dotenv import load_dotenv
+from .crypto import FieldCipher, CryptoSession, field_context
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:postgres_password@db:5432/clinical_suite")
 ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
 
-engine = create_engine(DATABASE_URL)
-cipher_suite = Fernet(ENCRYPTION_KEY.encode())
+# Opt-in for local development: when Postgres (or its driver) isn't available, use
+# SQLite instead. Off by default so PHI and audit rows never quietly land in a local file.
+SQLITE_URL = os.getenv("SQLITE_URL", "sqlite:///./clinical_suite.db")
+SQLITE_FALLBACK = os.getenv("DB_SQLITE_FALLBACK", "false").lower() in ("1", "true", "yes")
 
-def encrypt_data(data: str) -> str:
-    if not data:
-        return data
-    return cipher_suite.encrypt(data.encode()).decode()
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+# The sync pool only serves streaming exports and scripts, so it stays small
+DB_SYNC_POOL_SIZE = int(os.getenv("DB_SYNC_POOL_SIZE", "2"))
+DB_SYNC_MAX_OVERFLOW = int(os.getenv("DB_SYNC_MAX_OVERFLOW", "3"))
 
-def decrypt_data(data: str) -> str:
-    if not data:
-        return data
-    return cipher_suite.decrypt(data.encode()).decode()
+cipher = FieldCipher(ENCRYPTION_KEY)
+cipher_suite = cipher.fernet
 
-def init_db():
-    SQLModel.metadata.create_all(engine)
+def encrypt_data(data: str, context: Optional[str] = None) -> str:
+    return cipher.encrypt(data, context=context)
 
-def get_session():
-    with Session(engine) as session:
-        yield session
+def decrypt_data(data: str, context: Optional[str] = None) -> str:
+    return cipher.decrypt(data, context)
+
+# One set of engines per process, shared by every service. They are built on
+# first use so importing this module never needs a driver or a live database.
+_active_url: Optional[str] = None
+_engine: Optional[Engine] = None
+_async_engine: Optional[AsyncEngine] = None
+_session_factory: Optional[async_sessionmaker] = None
+_engine_lock = threading.Lock()
+
+def _is_sqlite(url) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+def _display(url) -> str:
+    return make_url(url).render_as_string(hide_password=True)
+
+def async_url(url) -> URL:
+    """Map a plain DATABASE_URL onto its async driver (asyncpg / aiosqlite)."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    if backend == "postgresql":
+        # Prepared statements are cached per connection by the asyncpg dialect
+        return url.set(drivername="postgresql+asyncpg").update_query_dict(
+            {"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)}
+        )
+    return url
+
+def _engine_options(url, pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW) -> dict:
+    if _is_sqlite(url):
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_pre_ping": True,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+def _configure(url: str):
+    global _active_url, _engine, _async_engine, _session_factory
+    async_engine = create_async_engine(async_url(url), **_engine_options(url))
+    _engine = None
+    _async_engine = async_engine
+    _session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+    _active_url = url
+
+def _ensure_engines():
+    if _async_engine is not None:
+        return
+    with _engine_lock:
+        if _async_engine is not None:
+            return
+        try:
+            _configure(DATABASE_URL)
+        except ImportError as e:
+            if not SQLITE_FALLBACK or _is_sqlite(DATABASE_URL):
+                raise
+            print(f"Warning: Database driver unavailable ({e}), falling back to {_display(SQLITE_URL)}")
+            _configure(SQLITE_URL)
+
+def get_async_engine() -> AsyncEngine:
+    _ensure_engines()
+    return _async_engine
+
+def get_engine() -> Engine:
+    """
+    Sync engine on the same database, for streaming exports and scripts.
+
+    StreamingResponse iterates sync generators on a worker thread, where
+    the async pool can't be used, so exports need their own connections.
+    That pool is created on first use and sized by DB_SYNC_POOL_SIZE /
+    DB_SYNC_MAX_OVERFLOW, separately from the request pool.
+    """
+    global _engine
+    _ensure_engines()
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(
+                    _active_url, **_engine_options(_active_url, DB_SYNC_POOL_SIZE, DB_SYNC_MAX_OVERFLOW)
+                )
+    return _engine
+
+def async_session() -> AsyncSession:
+    """A new AsyncSession from the shared pool; use as `async with async_session() as session:`."""
+    _ensure_engines()
+    return _session_factory()
+
+async def dispose_engines():
+    global _active_url, _engine, _async_engine, _session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _engine is not None:
+        _engine.dispose()
+    _active_url = _engine = _async_engine = _session_factory = None
+
+# DDL create_all can't express (e.g. Postgres partitioned tables). Hooks get a
+# sync Connection and run before create_all, which then skips existing tables.
+_schema_hooks: List[Callable] = []
+
+def on_init_db(hook: Callable) -> Callable:
+    _schema_hooks.append(hook)
+    return hook
+
+def _create_all(conn):
+    for hook in _schema_hooks:
+        hook(conn)
+    SQLModel.metadata.create_all(conn)
+
+async def _create_tables():
+    async with get_async_engine().begin() as conn:
+        await conn.run_sync(_create_all)
+
+async def _check_connection():
+    async with get_async_engine().connect():
+        pass
+
+async def init_db():
+    """
+    Create tables. With DB_SQLITE_FALLBACK set, switch to SQLite first if the
+    configured database can't be reached; any error after connecting (DDL,
+    schema hooks) is raised as is.
+    """
+    try:
+        await _check_connection()
+    except (OperationalError, OSError) as e:
+        if not SQLITE_FALLBACK or _active_url is None or _is_sqlite(_active_url):
+            raise
+        print(f"Warning: Could not reach {_display(_active_url)} ({e}), falling back to {_display(SQLITE_URL)}")
+        await dispose_engines()
+        with _engine_lock:
+            _configure(SQLITE_URL)
+    await _create_tables()
+
+async def get_session() -> AsyncIterator[AsyncSession]:
+    # Decrypted values are memoized for the session and zeroed when it ends
+    async with async_session() as session:
+        with CryptoSession(cipher) as crypto:
+            session.info["crypto"] = crypto
+            yield session
+
+def _crypto_for(obj) -> Optional[CryptoSession]:
+    session = object_session(obj)
+    return session.info.get("crypto") if session is not None else None
+
+def _encrypted_field(column: str) -> property:
+    # Ciphertexts are bound to "table.column", so they can't be swapped between columns
+    def getter(self):
+        crypto = _crypto_for(self)
+        value = getattr(self, column)
+        context = field_context(self.__tablename__, column)
+        return crypto.decrypt(value, context) if crypto is not None else decrypt_data(value, context)
+
+    def setter(self, value):
+        setattr(self, column, encrypt_data(value, field_context(self.__tablename__, column)))
+
+    return property(getter, setter)
 
 # Example of an Encrypted Model
 class PatientData(SQLModel, table=True):
@@ -37,12 +203,34 @@ class PatientData(SQLModel, table=True):
     ssn_encrypted: str
     medical_history_encrypted: str
 
-    @property
-    def name(self):
-        return decrypt_data(self.name_encrypted)
-    
-    @name.setter
-    def name(self, value):
-        self.name_encrypted = encrypt_data(value)
+    name = _encrypted_field("name_encrypted")
+    dob = _encrypted_field("dob_encrypted")
+    ssn = _encrypted_field("ssn_encrypted")
+    medical_history = _encrypted_field("medical_history_encrypted")
+
+    ENCRYPTED_FIELDS: ClassVar[Dict[str, str]] = {
+        "name": "name_encrypted",
+        "dob": "dob_encrypted",
+        "ssn": "ssn_encrypted",
+        "medical_history": "medical_history_encrypted",
+    }
+
+    @classmethod
+    def from_plain(cls, **values) -> "PatientData":
+        """Build a row with all PHI fields encrypted under one per-row data key."""
+        encrypted = cipher.encrypt_row({cls.ENCRYPTED_FIELDS[k]: v for k, v in values.items()}, table=cls.__tablename__)
+        return cls(**encrypted)
 
-    # Similar properties would be added for other fields
+    @classmethod
+    def bulk_decrypt(cls, rows: List["PatientData"], crypto: Optional[CryptoSession] = None) -> List[Dict[str, str]]:
+        """Decrypt every PHI field of a result set in one pooled pass, e.g. a waiting-room list."""
+        rows = list(rows)
+        crypto = crypto or (_crypto_for(rows[0]) if rows else None)
+        if crypto is None:
+            with CryptoSession(cipher) as scratch:
+                plain = scratch.decrypt_rows(rows, cls.ENCRYPTED_FIELDS, cls.__tablename__)
+        else:
+            plain = crypto.decrypt_rows(rows, cls.ENCRYPTED_FIELDS, cls.__tablename__)
+        for row, values in zip(rows, plain):
+            values["id"] = row.id
+        return plain
@@ -0,0 +1,175 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple, List
+
+# Upper bounds in seconds; stages range from sub-millisecond regex passes
+# to multi-second model calls.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Stages recorded by the app: deidentify, audit_write, cache_lookup,
+# queue_wait, preprocess, prefill, decode, json_parse, quality_checks, export.
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # counts per bucket + [sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            label_str = ",".join(f'{k}="{v}"' for k, v in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_str},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label_str},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{label_str}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{label_str}}} {series[-1]}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "er_request_duration_seconds", "End-to-end request latency.", ("route", "model")
+)
+STAGE_LATENCY = Histogram(
+    "er_stage_duration_seconds", "Latency of one processing stage within a request.", ("route", "model", "stage")
+)
+
+QUEUE_WAIT = Histogram(
+    "er_inference_queue_wait_seconds", "Time spent waiting for an inference slot, by priority class.", ("priority",)
+)
+
+
+def render_metrics() -> str:
+    """Prometheus text exposition format (version 0.0.4)."""
+    return "\n".join(REQUEST_LATENCY.render() + STAGE_LATENCY.render() + QUEUE_WAIT.render()) + "\n"
+
+
+class RequestTimings:
+    """Stage durations collected for one sampled request."""
+    __slots__ = ("model", "stages")
+
+    def __init__(self):
+        self.model = "none"
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage_name: str, seconds: float):
+        self.stages[stage_name] = self.stages.get(stage_name, 0.0) + seconds
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def sample_rate() -> float:
+    return float(os.getenv("METRICS_SAMPLE_RATE", "1.0"))
+
+
+def start_request(rate: Optional[float] = None) -> Optional[RequestTimings]:
+    """Begin collecting stage timings for this request, if it is sampled."""
+    rate = sample_rate() if rate is None else rate
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        return None
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+def finish_request(timings: RequestTimings, route: str, total_seconds: float):
+    REQUEST_LATENCY.observe((route, timings.model), total_seconds)
+    for stage_name, seconds in timings.stages.items():
+        STAGE_LATENCY.observe((route, timings.model, stage_name), seconds)
+
+
+def set_model(name: str):
+    timings = _current.get()
+    if timings is not None:
+        timings.model = name
+
+
+def record_stage(stage_name: str, seconds: float):
+    """Record a duration measured elsewhere (e.g. reported by the model server)."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(stage_name, seconds)
+
+
+@contextmanager
+def _timed(timings: RequestTimings, stage_name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage_name, time.perf_counter() - start)
+
+
+class _NoOp:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoOp()
+
+
+def stage(stage_name: str):
+    """
+    Time a block as one stage of the current request:
+
+        with stage("quality_checks"):
+            ...
+
+    Outside a sampled request this is a shared no-op context manager, so
+    unsampled requests pay one ContextVar lookup per stage.
+    """
+    timings = _current.get()
+    if timings is None:
+        return _NOOP
+    return _timed(timings, stage_name)
+
+
+class TimedCacheBackend:
+    """fastapi-cache backend wrapper that records lookups as the `cache_lookup` stage."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def get_with_ttl(self, key: str):
+        with stage("cache_lookup"):
+            return await self.backend.get_with_ttl(key)
+
+    async def get(self, key: str):
+        with stage("cache_lookup"):
+            return await self.backend.get(key)
+
+    async def set(self, key: str, value, expire: Optional[int] = None):
+        return await self.backend.set(key, value, expire)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        return await self.backend.clear(namespace, key)
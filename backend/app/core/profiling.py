@@ -0,0 +1,111 @@
+import asyncio
+import os
+import random
+import re
+import time
+import uuid
+from typing import Optional, Set
+
+from fastapi import Request
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# The request ID ends up in a file name, so only accept plain tokens from clients
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class SampledProfiler:
+    """
+    Profiles a random fraction of requests with pyinstrument and writes each
+    profile to `output_dir` as a speedscope (or HTML) file named after the
+    request ID. Responses are never modified beyond the X-Request-ID header.
+
+    Settings (env):
+    - PROFILE_SAMPLE_RATE: fraction of requests to profile (default 0, off)
+    - PROFILE_INTERVAL: sampling interval in seconds (default 5 ms)
+    - PROFILE_DIR: where profiles are written (default ./profiles)
+    - PROFILE_FORMAT: "speedscope" (default) or "html"
+    - PROFILE_ALLOW_QUERY: also profile requests carrying `?profile=1`
+    """
+
+    def __init__(
+        self,
+        sample_rate: Optional[float] = None,
+        interval: Optional[float] = None,
+        output_dir: Optional[str] = None,
+        output_format: Optional[str] = None,
+        allow_query: Optional[bool] = None
+    ):
+        self.sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0")) if sample_rate is None else sample_rate
+        self.interval = float(os.getenv("PROFILE_INTERVAL", "0.005")) if interval is None else interval
+        self.output_dir = output_dir or os.getenv("PROFILE_DIR", "./profiles")
+        self.output_format = output_format or os.getenv("PROFILE_FORMAT", "speedscope")
+        if allow_query is None:
+            allow_query = os.getenv("PROFILE_ALLOW_QUERY", "false").lower() in ("1", "true", "yes")
+        self.allow_query = allow_query
+        # pyinstrument runs one profiler per thread, and every request shares
+        # the event loop thread, so at most one request is profiled at a time.
+        self._active = False
+        self._writes: Set[asyncio.Task] = set()
+        self.skipped = 0
+
+    def _wants_profile(self, request: Request) -> bool:
+        if self.allow_query and request.query_params.get("profile"):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, request: Request, call_next):
+        request_id = request.headers.get(REQUEST_ID_HEADER, "")
+        if not _VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.state.request_id = request_id
+
+        if not self._wants_profile(request):
+            response = await call_next(request)
+        elif self._active:
+            self.skipped += 1
+            response = await call_next(request)
+        else:
+            response = await self._profiled(request, call_next, request_id)
+
+        response.headers[REQUEST_ID_HEADER] = request_id
+        return response
+
+    async def _profiled(self, request: Request, call_next, request_id: str):
+        from pyinstrument import Profiler
+
+        self._active = True
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        profiler.start()
+        try:
+            return await call_next(request)
+        finally:
+            profiler.stop()
+            self._active = False
+            route = getattr(request.scope.get("route"), "path", request.url.path)
+            # Rendering and writing happen off the request path
+            task = asyncio.create_task(asyncio.to_thread(self._write, profiler, request_id, route))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    def _write(self, profiler, request_id: str, route: str) -> Optional[str]:
+        try:
+            from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+
+            if self.output_format == "html":
+                renderer, suffix = HTMLRenderer(), "html"
+            else:
+                renderer, suffix = SpeedscopeRenderer(), "speedscope.json"
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%dT%H%M%S')}_{slug}_{request_id}.{suffix}")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(profiler.output(renderer))
+            return path
+        except Exception as e:
+            print(f"Warning: Could not write profile for request {request_id}: {e}")
+            return None
+
+    async def drain(self):
+        """Wait for pending profile writes (shutdown, tests)."""
+        if self._writes:
+            await asyncio.gather(*list(self._writes), return_exceptions=True)
@@ -0,0 +1,211 @@
+import os
+import re
+import hmac
+import time
+import threading
+import ipaddress
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Tuple
+from fastapi import HTTPException, Request
+
+from . import auth
+
+# Atomic token bucket. A hash per key holds the token count and the last
+# refill time; Redis' own clock keeps every worker on the same time base.
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# X-Department is only honoured from the proxy: requests from these addresses
+# (comma-separated IPs or CIDRs), or carrying X-Proxy-Secret = RATE_LIMIT_PROXY_SECRET.
+# With neither configured the header is ignored.
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(entry.strip(), strict=False)
+    for entry in os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "").split(",") if entry.strip()
+]
+PROXY_SECRET = os.getenv("RATE_LIMIT_PROXY_SECRET", "")
+
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """'5/minute' -> (capacity 5, refill 5/60 tokens per second)."""
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(second|minute|hour|day)s?\s*", rate)
+    if not match:
+        raise ValueError(f"Invalid rate limit '{rate}'")
+    count = int(match.group(1))
+    return count, count / _PERIODS[match.group(2)]
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    remaining: float
+    retry_after: float
+
+
+class LocalBucketStore:
+    """
+    In-process token buckets with the same semantics as the Redis script.
+
+    A bucket that has refilled completely is indistinguishable from a new
+    one, so every `sweep_interval` seconds those are dropped (the Redis
+    script gets the same effect from PEXPIRE). Memory stays proportional to
+    the callers active in the last capacity/rate seconds.
+    """
+
+    def __init__(self, sweep_interval: float = 60.0):
+        # key -> (tokens, last update, time the bucket is full again)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._lock = threading.Lock()
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def __len__(self):
+        return len(self._buckets)
+
+    async def take(self, key: str, capacity: int, rate: float, cost: float = 1) -> Decision:
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._evict_full(now)
+                self._next_sweep = now + self.sweep_interval
+            tokens, ts, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            return Decision(allowed, tokens, 0.0 if allowed else (cost - tokens) / rate)
+
+    def _evict_full(self, now: float):
+        for key in [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+
+
+class RedisBucketStore:
+    """Token buckets shared by every worker through one Lua script (one round trip per check)."""
+
+    def __init__(self, redis, prefix: str = "ratelimit"):
+        self.redis = redis
+        self.prefix = prefix
+        self._script = redis.register_script(TOKEN_BUCKET_LUA)
+
+    async def take(self, key: str, capacity: int, rate: float, cost: float = 1) -> Decision:
+        allowed, remaining, retry_after = await self._script(keys=[f"{self.prefix}:{key}"], args=[capacity, rate, cost])
+        return Decision(bool(int(allowed)), float(remaining), float(retry_after))
+
+
+def from_trusted_proxy(request: Request) -> bool:
+    """True for requests from RATE_LIMIT_TRUSTED_PROXIES or carrying the proxy's shared secret."""
+    secret = request.headers.get("x-proxy-secret")
+    if PROXY_SECRET and secret and hmac.compare_digest(secret, PROXY_SECRET):
+        return True
+    if not TRUSTED_PROXIES or request.client is None:
+        return False
+    try:
+        address = ipaddress.ip_address(request.client.host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def rate_limit_key(request: Request) -> str:
+    """
+    Bucket owner: the authenticated user, else the department the proxy
+    stamps on the request, else the client IP. Behind the Next.js proxy
+    every clinician shares one IP, so the IP is only a last resort.
+    X-Department from anyone but the proxy is ignored, otherwise each
+    made-up department would be a fresh bucket.
+    """
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            subject = auth.decode_access_token(authorization[7:]).get("sub")
+            if subject:
+                return f"user:{subject}"
+        except auth.JWTError:
+            pass
+    department = request.headers.get("x-department")
+    if department and from_trusted_proxy(request):
+        return f"dept:{department}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+class TokenBucketLimiter:
+    """
+    Per-user token buckets, one per named limit (e.g. "triage": "5/minute").
+
+    Storage is Redis when available (`use_redis`), otherwise in-process.
+    Redis errors fall back to the local buckets rather than failing the
+    request. Requests in the priority lane (ESI 1-2) are never throttled;
+    they are only counted.
+    """
+
+    def __init__(self, limits: Dict[str, str], store=None):
+        self.limits = {name: parse_rate(rate) for name, rate in limits.items()}
+        self.local = LocalBucketStore()
+        self.store = store or self.local
+        self.priority_passed = 0
+        self.throttled = 0
+
+    def use_redis(self, redis):
+        self.store = RedisBucketStore(redis)
+
+    async def hit(self, name: str, key: str, priority: bool = False) -> Decision:
+        capacity, rate = self.limits[name]
+        if priority:
+            self.priority_passed += 1
+            return Decision(True, float(capacity), 0.0)
+        try:
+            decision = await self.store.take(f"{name}:{key}", capacity, rate)
+        except Exception as e:
+            if self.store is self.local:
+                raise
+            print(f"Warning: Rate limit store unavailable, using local buckets: {e}")
+            decision = await self.local.take(f"{name}:{key}", capacity, rate)
+        if not decision.allowed:
+            self.throttled += 1
+        return decision
+
+    def limit(self, name: str) -> Callable[[Request], Awaitable[None]]:
+        """
+        The check for `name` as a FastAPI dependency. Dependencies run before
+        the endpoint and any decorator around it, so a response cache in
+        front of the handler can't skip the bucket.
+        """
+        async def dependency(request: Request):
+            await self.check(name, request)
+        return dependency
+
+    async def check(self, name: str, request: Request, priority: bool = False):
+        """Raise 429 with Retry-After when the caller's bucket for `name` is empty."""
+        decision = await self.hit(name, rate_limit_key(request), priority)
+        if not decision.allowed:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Rate limit exceeded for {name}",
+                headers={"Retry-After": str(max(1, int(decision.retry_after + 0.999)))},
+            )
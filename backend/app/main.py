@@ -1,41 +1,83 @@
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Request
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
+from contextlib import asynccontextmanager
 import json
 import base64
+import logging
 import uvicorn
 import os
 import time
-from redis import asyncio as aioredis
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
-from fastapi_cache.decorator import cache
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from pyinstrument import Profiler
-from fastapi.responses import HTMLResponse
+from fastapi.responses import PlainTextResponse
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-from app.services.ollama_service import OllamaService
-from app.services.documentation_service import DocumentationService
-from app.services.triage_service import TriageService
-from app.services.privacy import deidentify_text
-from app.services.audit import log_audit_event, engine
-from sqlmodel import SQLModel
+# Relative imports keep a single copy of each module (and of every SQLModel
+# table) whether the app is loaded as `app.main` or `backend.app.main`.
+from .core.container import ServiceContainer, get_services
+from .core import metrics
+from .core import auth
+from .core.rate_limit import TokenBucketLimiter
+from .services.triage_rules import is_emergent
+from .services.inference_scheduler import SchedulerOverloaded
+from .core.profiling import SampledProfiler
+from .services.privacy import deidentify_text
+from .core.database import init_db, dispose_engines
+from .services.audit import log_audit_event
+from .api import audit as audit_api
+from .api import triage as triage_api
+from .api import documentation as documentation_api
+
+logger = logging.getLogger(__name__)
 
 # Placeholder for MultimodalPreprocessor and SOAPResponse if they are new types
 # from backend.app.services.multimodal_preprocessor import MultimodalPreprocessor
 # class SOAPResponse(BaseModel):
 #     ...
 
+# Caching, Database and Service Initialization
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await init_db()
+    except Exception as e:
+        print(f"Warning: Could not initialize database: {e}")
+        
+    try:
+        # Redis client libraries are only needed once the app actually starts
+        from redis import asyncio as aioredis
+        from fastapi_cache.backends.redis import RedisBackend
+
+        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+        redis = aioredis.from_url(redis_url, encoding="utf8", decode_responses=True)
+        FastAPICache.init(metrics.TimedCacheBackend(RedisBackend(redis)), prefix="fastapi-cache")
+        # Buckets shared by all workers
+        limiter.use_redis(redis)
+    except Exception as e:
+        print(f"Warning: Could not initialize cache: {e}")
+
+    # Services are created once per process and shared by all routes
+    app.state.services = ServiceContainer()
+    await app.state.services.startup()
+    if auth.jwks_cache is not None:
+        auth.jwks_cache.start()
+    yield
+    if auth.jwks_cache is not None:
+        await auth.jwks_cache.close()
+    await app.state.services.shutdown()
+    await profiler.drain()
+    await dispose_engines()
+
 # Rate Limiter
-limiter = Limiter(key_func=get_remote_address)
-app = FastAPI(title="ER Clinical Intelligence Suite")
+# Token buckets per authenticated user (or department); see core/rate_limit.py
+limiter = TokenBucketLimiter({
+    "triage": os.getenv("RATE_LIMIT_TRIAGE", "5/minute"),
+    "generate_note": os.getenv("RATE_LIMIT_NOTE", "10/minute"),
+})
+app = FastAPI(title="ER Clinical Intelligence Suite", lifespan=lifespan)
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -47,41 +89,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Caching Initialization and Database Initialization
-@app.on_event("startup")
-async def startup_event():
-    try:
-        SQLModel.metadata.create_all(engine)
-    except Exception as e:
-        print(f"Warning: Could not initialize database: {e}")
-        
-    try:
-        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
-        redis = aioredis.from_url(redis_url, encoding="utf8", decode_responses=True)
-        FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
-    except Exception as e:
-        print(f"Warning: Could not initialize cache: {e}")
-
-# Profiling Middleware
+# Per-stage latency metrics (METRICS_SAMPLE_RATE, default every request)
 @app.middleware("http")
-async def profile_request(request: Request, call_next):
-    if request.query_params.get("profile"):
-        profiler = Profiler(interval=0.0001)
-        profiler.start()
-        response = await call_next(request)
-        profiler.stop()
-        return HTMLResponse(profiler.output_html())
-    return await call_next(request)
+async def collect_metrics(request: Request, call_next):
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    timings = metrics.start_request()
+    if timings is None:
+        return await call_next(request)
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not raw path, to keep label cardinality bounded
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.finish_request(timings, route, time.perf_counter() - start)
+    return response
+
+# Sampled profiling (PROFILE_SAMPLE_RATE); profiles go to PROFILE_DIR, keyed by X-Request-ID
+profiler = SampledProfiler()
+app.middleware("http")(profiler)
 
 # Global instances
 # Assuming MultimodalPreprocessor is defined elsewhere or will be added
 # preprocessor = MultimodalPreprocessor()
 
-# Initialize Services
-ollama = OllamaService()
-doc_service = DocumentationService()
-triage_service = TriageService()
-
 
 class Vitals(BaseModel):
     hr: int = Field(..., ge=0, le=300, description="Heart Rate")
@@ -99,6 +129,11 @@ class TriageResponse(BaseModel):
     follow_up_questions: List[str]
     recommended_next_steps: List[str]
     patient_explanation: str
+    # The model refinement running in the background (see api/triage.py)
+    triage_id: Optional[str] = None
+    status: Optional[str] = None
+    poll_url: Optional[str] = None
+    events_url: Optional[str] = None
 
 class TriageRequest(BaseModel):
     chief_complaint: str
@@ -109,28 +144,45 @@ class NoteRequest(BaseModel):
     encounter_text: str
     patient_context: Optional[str] = None
     encounter_type: str = "Emergency"
+    formats: Optional[List[str]] = None
+
+# Audit trail browsing and export (authenticated, and audited themselves)
+app.include_router(audit_api.router, prefix="/api")
+# Polling / SSE for the model refinement /api/triage starts in the background
+app.include_router(triage_api.refinement_router, prefix="/api")
+# FHIR-only note generation and the bulk note export; /api/generate-note itself is below
+app.include_router(documentation_api.export_router, prefix="/api")
 
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "service": "ER Clinical Intelligence Suite"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
+# Not cached: the rule-based answer is cheaper than a cache lookup, and each
+# call starts (and audits) its own refinement
 @app.post("/api/triage", response_model=TriageResponse)
-@limiter.limit("5/minute")
-@cache(expire=60)
 async def multimodal_triage(
     request: Request,
-    payload: TriageRequest
+    payload: TriageRequest,
+    services: ServiceContainer = Depends(get_services)
 ):
+    # ESI 1-2 presentations go through the priority lane and are never throttled
+    await limiter.check("triage", request, priority=is_emergent(payload.chief_complaint, payload.vitals.dict()))
     try:
         # Log the action (HIPAA requirement)
-        log_audit_event(user_id="anonymous_er_staff", action="TRIAGE_MULTIMODAL")
+        await log_audit_event(user_id="anonymous_er_staff", action="TRIAGE_MULTIMODAL")
         
         # De-identify clinical notes before processing
-        scrubbed_text = deidentify_text(payload.chief_complaint)
+        with metrics.stage("deidentify"):
+            scrubbed_text = deidentify_text(payload.chief_complaint)
         
-        # Simulate or call TriageService
-        # For the test suite, we want consistent results
-        result = await triage_service.process_triage(scrubbed_text, payload.vitals.dict(), payload.image_base64)
+        # Rule-based ESI now; MedGemma refines it in the background, so the
+        # answer never waits on the model. Clients follow poll_url/events_url.
+        result = await services.triage.start_triage(scrubbed_text, payload.vitals.dict(), payload.image_base64)
+        triage_id = result["triage_id"]
         
         # Map TriageService output (nested) to API Model (flat)
         clinical = result.get("clinical_json", {})
@@ -142,27 +194,43 @@ async def multimodal_triage(
             "red_flags": clinical.get("red_flag_conditions", []),
             "follow_up_questions": clinical.get("suggested_follow_up", []),
             "recommended_next_steps": clinical.get("recommended_next_steps", []),
-            "patient_explanation": result.get("patient_text", "")
+            "patient_explanation": result.get("patient_text", ""),
+            "triage_id": triage_id,
+            "status": result["status"],
+            "poll_url": str(request.url_for("get_triage_refinement", triage_id=triage_id)),
+            "events_url": str(request.url_for("stream_triage_refinement", triage_id=triage_id)),
         }
         
+    except SchedulerOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/generate-note")
-@limiter.limit("10/minute")
-@cache(expire=300)
-async def generate_note(request: Request, payload: NoteRequest):
+# The limit is a dependency, so it runs before the handler and anything wrapped
+# around it. Not cached: fastapi-cache never caches POSTs, and 0.2.1 fails on
+# them once the cache is initialized.
+@app.post("/api/generate-note", dependencies=[Depends(limiter.limit("generate_note"))])
+async def generate_note(
+    payload: NoteRequest,
+    services: ServiceContainer = Depends(get_services)
+):
     try:
-        log_audit_event(user_id="anonymous_er_staff", action="GENERATE_SOAP")
+        await log_audit_event(user_id="anonymous_er_staff", action="GENERATE_SOAP")
         
         # De-identify clinical notes
-        scrubbed_text = deidentify_text(payload.encounter_text)
+        with metrics.stage("deidentify"):
+            scrubbed_text = deidentify_text(payload.encounter_text)
         
         patient_context = {"patient_id": "P-123"} # Default or parsed from payload.patient_context
         if payload.patient_context:
              patient_context["context"] = payload.patient_context
 
-        return await doc_service.generate_note(scrubbed_text, patient_context, payload.encounter_type)
+        return await services.documentation.generate_note(scrubbed_text, patient_context, payload.encounter_type, payload.formats)
+    except SchedulerOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except ValueError as e:
+        # Unknown note format(s) from validate_formats
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         logger.error(f"Note generation failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,12 +1,21 @@
-from datetime import datetime
-from typing import Optional
-from sqlmodel import SQLModel, Field, Session, create_engine
 import os
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import Index, text
+from sqlmodel import SQLModel, Field
+from ..core.database import async_session, on_init_db
+from ..core.metrics import stage
 
-DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:postgres_password@db:5432/clinical_suite")
-engine = create_engine(DATABASE_URL)
+# Monthly partitions created ahead of time; inserts past them land in the default partition
+AUDIT_PARTITIONS_AHEAD = int(os.getenv("AUDIT_PARTITIONS_AHEAD", "3"))
 
 class AuditLog(SQLModel, table=True):
+    # Compliance queries filter by time range, then user and/or action
+    __table_args__ = (
+        Index("ix_auditlog_timestamp_user_action", "timestamp", "user_id", "action"),
+        Index("ix_auditlog_user_timestamp", "user_id", "timestamp"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     user_id: str
@@ -15,18 +24,121 @@ class AuditLog(SQLModel, table=True):
     ip_address: Optional[str] = None
     details: Optional[str] = None
 
-def log_audit_event(user_id: str, action: str, resource_id: Optional[str] = None, ip_address: Optional[str] = None, details: Optional[str] = None):
+# Column order for Parquet/CSV output (archives and exports)
+AUDIT_COLUMNS = ["id", "timestamp", "user_id", "action", "resource_id", "ip_address", "details"]
+
+def audit_arrow_schema():
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise RuntimeError(f"pyarrow is required for Parquet audit output: {e}")
+    return pa.schema([
+        ("id", pa.int64()),
+        ("timestamp", pa.timestamp("us")),
+        ("user_id", pa.string()),
+        ("action", pa.string()),
+        ("resource_id", pa.string()),
+        ("ip_address", pa.string()),
+        ("details", pa.string()),
+    ])
+
+def to_record_batch(rows, schema):
+    """Rows of AUDIT_COLUMNS tuples -> one Arrow RecordBatch."""
+    import pyarrow as pa
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    return pa.RecordBatch.from_arrays([pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema)
+
+# On Postgres the table is range-partitioned by month, so retention can drop
+# whole partitions instead of deleting rows. The primary key has to include the
+# partition column there; the ORM still identifies rows by id alone.
+PARTITIONED_AUDIT_DDL = """
+CREATE TABLE IF NOT EXISTS auditlog (
+    id BIGSERIAL,
+    timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    user_id VARCHAR NOT NULL,
+    action VARCHAR NOT NULL,
+    resource_id VARCHAR,
+    ip_address VARCHAR,
+    details VARCHAR,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp)
+"""
+
+def month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1)
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+DEFAULT_PARTITION = "auditlog_default"
+
+def partition_name(month: datetime) -> str:
+    return f"auditlog_p{month:%Y_%m}"
+
+def is_partitioned(conn) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    relkind = conn.execute(text("SELECT relkind FROM pg_class WHERE relname = 'auditlog'")).scalar()
+    return relkind == "p"
+
+def ensure_partitions(conn, months_ahead: int = AUDIT_PARTITIONS_AHEAD, now: Optional[datetime] = None) -> List[str]:
+    """
+    Create this month's partition and `months_ahead` following ones (Postgres only).
+
+    Postgres refuses to create a partition while the default partition holds
+    rows in its range, so any such rows are moved into the new partition
+    before it is attached.
+    """
+    if not is_partitioned(conn):
+        return []
+    current = month_start(now or datetime.utcnow())
+    has_default = conn.execute(text(f"SELECT to_regclass('{DEFAULT_PARTITION}')")).scalar() is not None
+    created = []
+    for offset in range(months_ahead + 1):
+        start = add_months(current, offset)
+        name = partition_name(start)
+        created.append(name)
+        if conn.execute(text(f"SELECT to_regclass('{name}')")).scalar() is not None:
+            continue
+        bounds = f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{add_months(start, 1):%Y-%m-%d}')"
+        if not has_default:
+            conn.execute(text(f"CREATE TABLE {name} PARTITION OF auditlog {bounds}"))
+            continue
+        conn.execute(text(f"CREATE TABLE {name} (LIKE auditlog INCLUDING DEFAULTS)"))
+        conn.execute(text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ), {"start": start, "end": add_months(start, 1)})
+        conn.execute(text(f"ALTER TABLE auditlog ATTACH PARTITION {name} {bounds}"))
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF auditlog DEFAULT"))
+    return created
+
+@on_init_db
+def create_partitioned_audit_table(conn):
+    if conn.dialect.name != "postgresql":
+        return
+    exists = conn.execute(text("SELECT to_regclass('auditlog')")).scalar()
+    if exists is None:
+        conn.execute(text(PARTITIONED_AUDIT_DDL))
+        # create_all skips the indexes of a table that already exists
+        for index in AuditLog.__table__.indexes:
+            index.create(conn, checkfirst=True)
+    ensure_partitions(conn)
+
+async def log_audit_event(user_id: str, action: str, resource_id: Optional[str] = None, ip_address: Optional[str] = None, details: Optional[str] = None):
     try:
-        with Session(engine) as session:
-            log_entry = AuditLog(
-                user_id=user_id,
-                action=action,
-                resource_id=resource_id,
-                ip_address=ip_address,
-                details=details
-            )
-            session.add(log_entry)
-            session.commit()
+        with stage("audit_write"):
+            async with async_session() as session:
+                log_entry = AuditLog(
+                    user_id=user_id,
+                    action=action,
+                    resource_id=resource_id,
+                    ip_address=ip_address,
+                    details=details
+                )
+                session.add(log_entry)
+                await session.commit()
     except Exception as e:
         # Fallback for local testing without DB
         print(f"[AUDIT LOG FAILURE] Action: {action}, Details: {e}")
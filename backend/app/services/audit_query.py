@@ -0,0 +1,141 @@
+import io
+import csv
+import base64
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.engine import Engine
+
+from ..core.database import get_engine
+from .audit import AUDIT_COLUMNS, AuditLog, audit_arrow_schema, to_record_batch
+
+EXPORT_BATCH_SIZE = 10_000
+
+Cursor = Tuple[datetime, int]
+
+
+@dataclass
+class AuditFilters:
+    user_id: Optional[str] = None
+    actions: Sequence[str] = ()
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def audit_query(filters: AuditFilters, after: Optional[Cursor] = None, limit: Optional[int] = None, ascending: bool = False):
+    """
+    Keyset-paginated query over AuditLog, ordered by (timestamp, id).
+
+    Each page starts strictly after the last (timestamp, id) seen, so the
+    database seeks straight into the (timestamp, ...) / (user_id, timestamp)
+    indexes; page 10,000 costs the same as page 1 (no OFFSET scan).
+    """
+    table = AuditLog.__table__
+    statement = select(*(table.c[name] for name in AUDIT_COLUMNS))
+    if filters.user_id is not None:
+        statement = statement.where(table.c.user_id == filters.user_id)
+    if filters.actions:
+        statement = statement.where(table.c.action.in_(list(filters.actions)))
+    if filters.since is not None:
+        statement = statement.where(table.c.timestamp >= filters.since)
+    if filters.until is not None:
+        statement = statement.where(table.c.timestamp < filters.until)
+
+    key = tuple_(table.c.timestamp, table.c.id)
+    if after is not None:
+        statement = statement.where(key > tuple_(*after) if ascending else key < tuple_(*after))
+    if ascending:
+        statement = statement.order_by(table.c.timestamp, table.c.id)
+    else:
+        statement = statement.order_by(table.c.timestamp.desc(), table.c.id.desc())
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
+
+
+def iter_audit_batches(filters: AuditFilters, batch_size: int = EXPORT_BATCH_SIZE, engine: Optional[Engine] = None) -> Iterator[List[tuple]]:
+    """
+    Yield matching rows oldest first, `batch_size` at a time.
+
+    Every batch is its own short keyset query, so a long export holds no
+    transaction or cursor open while the client is reading.
+    """
+    engine = engine or get_engine()
+    after = None
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(audit_query(filters, after, batch_size, ascending=True)).all()
+        if rows:
+            yield [tuple(row) for row in rows]
+        if len(rows) < batch_size:
+            return
+        after = (rows[-1].timestamp, rows[-1].id)
+
+
+def stream_csv(batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(AUDIT_COLUMNS)
+    for batch in batches:
+        writer.writerows((row[0], row[1].isoformat(), *row[2:]) for row in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        chunk, self._chunks = b"".join(self._chunks), []
+        return chunk
+
+
+def stream_parquet(batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """One zstd row group per batch, sent as soon as it is encoded; the footer goes last."""
+    schema = audit_arrow_schema()
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for batch in batches:
+            writer.write_batch(to_record_batch(batch, schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,174 @@
+import os
+import argparse
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Engine
+
+from ..core.database import get_engine
+from .audit import (
+    AUDIT_COLUMNS, DEFAULT_PARTITION, AuditLog, add_months, audit_arrow_schema,
+    ensure_partitions, is_partitioned, month_start, to_record_batch,
+)
+
+# HIPAA expects audit records to be kept for six years
+AUDIT_RETENTION_DAYS = int(os.getenv("AUDIT_RETENTION_DAYS", str(6 * 365)))
+AUDIT_ARCHIVE_DIR = os.getenv("AUDIT_ARCHIVE_DIR", "./audit_archive")
+ARCHIVE_BATCH_SIZE = 50_000
+
+
+def expired_months(conn, cutoff: datetime) -> List[Tuple[datetime, Optional[str]]]:
+    """
+    (month start, partition name or None) for every month that ends on or
+    before `cutoff`. Partitioned Postgres tables list their monthly
+    partitions, plus each expired month with rows in the default partition
+    (those can't overlap a monthly partition); anything else is bucketed by
+    month from the oldest row.
+    """
+    if not is_partitioned(conn):
+        oldest = conn.execute(select(func.min(AuditLog.timestamp))).scalar()
+        if oldest is None:
+            return []
+        months, month = [], month_start(oldest)
+        while add_months(month, 1) <= cutoff:
+            months.append((month, None))
+            month = add_months(month, 1)
+        return months
+
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'auditlog'"
+    )).scalars().all()
+    months = []
+    for name in names:
+        try:
+            start = datetime.strptime(name, "auditlog_p%Y_%m")
+        except ValueError:
+            continue  # the default partition
+        if add_months(start, 1) <= cutoff:
+            months.append((start, name))
+    if DEFAULT_PARTITION in names:
+        # Rows outside the partition window (backfills, clock skew) land in the default partition
+        stranded = conn.execute(text(
+            f"SELECT DISTINCT date_trunc('month', timestamp) FROM {DEFAULT_PARTITION} WHERE timestamp < :cutoff"
+        ), {"cutoff": cutoff}).scalars().all()
+        months.extend((month, DEFAULT_PARTITION) for month in stranded)
+    return sorted(months)
+
+
+def _publish(partial: str, path: str) -> str:
+    """
+    Give a finished file its final name without ever replacing an archive:
+    a month archived again (late rows, the default partition) gets
+    `auditlog_YYYY_MM.1.parquet`, `.2`, ... next to the earlier parts.
+    """
+    stem, ext = os.path.splitext(path)
+    candidate, part = path, 0
+    while True:
+        try:
+            os.link(partial, candidate)  # fails instead of overwriting
+            break
+        except FileExistsError:
+            part += 1
+            candidate = f"{stem}.{part}{ext}"
+    os.remove(partial)
+    return candidate
+
+
+def archive_month(conn, start: datetime, path: str) -> Tuple[int, Optional[str]]:
+    """
+    Stream one month of audit rows into a zstd-compressed Parquet file.
+    Returns the row count and the file written: `path`, the next free part
+    name if `path` already exists, or None for a month with no rows.
+    """
+    schema = audit_arrow_schema()
+    import pyarrow.parquet as pq
+
+    table = AuditLog.__table__
+    statement = (
+        select(*(table.c[name] for name in AUDIT_COLUMNS))
+        .where(table.c.timestamp >= start, table.c.timestamp < add_months(start, 1))
+        .order_by(table.c.timestamp)
+    )
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    partial = f"{path}.{os.getpid()}.partial"
+    rows = 0
+    with pq.ParquetWriter(partial, schema, compression="zstd") as writer:
+        result = conn.execution_options(stream_results=True, yield_per=ARCHIVE_BATCH_SIZE).execute(statement)
+        for batch in result.partitions(ARCHIVE_BATCH_SIZE):
+            writer.write_batch(to_record_batch(batch, schema))
+            rows += len(batch)
+    if not rows:
+        os.remove(partial)
+        return 0, None
+    # Only a complete file takes the final name
+    return rows, _publish(partial, path)
+
+
+def drop_month(conn, start: datetime, partition: Optional[str]):
+    """Drop a monthly partition whole; rows of an unpartitioned table or the default partition are bulk deleted."""
+    if partition is not None and partition != DEFAULT_PARTITION:
+        conn.execute(text(f"ALTER TABLE auditlog DETACH PARTITION {partition}"))
+        conn.execute(text(f"DROP TABLE {partition}"))
+    else:
+        table = AuditLog.__table__
+        conn.execute(table.delete().where(table.c.timestamp >= start, table.c.timestamp < add_months(start, 1)))
+
+
+def run_retention(
+    older_than_days: int = AUDIT_RETENTION_DAYS,
+    archive_dir: Optional[str] = AUDIT_ARCHIVE_DIR,
+    engine: Optional[Engine] = None,
+    now: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Archive and drop every whole month older than `older_than_days`.
+
+    Each month is written to `<archive_dir>/auditlog_YYYY_MM.parquet` (or
+    the next free part name) and dropped in the same transaction, so only
+    rows that made it into the file are removed: on Postgres the
+    transaction runs at REPEATABLE READ, after locking a monthly partition
+    against inserts, and the delete sees exactly the archived snapshot.
+    `archive_dir=None` drops without archiving. Partitions for the coming
+    months are created on the way, so the job also keeps the partition
+    window rolling.
+    """
+    engine = engine or get_engine()
+    now = now or datetime.utcnow()
+    cutoff = month_start(now - timedelta(days=older_than_days))
+    report = []
+
+    with engine.begin() as conn:
+        ensure_partitions(conn, now=now)
+        months = expired_months(conn, cutoff)
+
+    for start, partition in months:
+        entry: Dict[str, Any] = {"month": f"{start:%Y-%m}", "partition": partition, "rows": None, "archive": None}
+        with engine.connect() as conn:
+            if conn.dialect.name == "postgresql":
+                conn = conn.execution_options(isolation_level="REPEATABLE READ")
+            with conn.begin():
+                if partition is not None and partition != DEFAULT_PARTITION:
+                    # Taken before the snapshot: nothing can land in the partition between archive and drop
+                    conn.execute(text(f"LOCK TABLE {partition} IN SHARE MODE"))
+                if archive_dir is not None:
+                    path = os.path.join(archive_dir, f"auditlog_{start:%Y_%m}.parquet")
+                    entry["rows"], entry["archive"] = archive_month(conn, start, path)
+                drop_month(conn, start, partition)
+        report.append(entry)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive and drop expired audit log months")
+    parser.add_argument("--days", type=int, default=AUDIT_RETENTION_DAYS)
+    parser.add_argument("--archive-dir", default=AUDIT_ARCHIVE_DIR)
+    parser.add_argument("--no-archive", action="store_true", help="Drop expired months without writing Parquet")
+    args = parser.parse_args()
+
+    for entry in run_retention(args.days, None if args.no_archive else args.archive_dir):
+        archived = f", {entry['rows']} rows archived to {entry['archive']}" if entry["archive"] else ""
+        print(f"{entry['month']}: dropped{archived}")
@@ -1,54 +1,91 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from .templates import get_template
 from .quality_checks import QualityChecker
-from .export_service import ExportService
+from .export_service import ExportService, validate_formats
 from .ollama_service import OllamaService
+from .note_store import save_note
+from .terminology import CodeIndex, get_code_index
+from models.prompt_templates import PROMPTS
+from ..core.metrics import stage, set_model
 import json
 
 class DocumentationService:
-    def __init__(self):
-        self.ollama = OllamaService()
+    def __init__(self, ollama: Optional[OllamaService] = None, code_index: Optional[CodeIndex] = None):
+        # Share the app-wide OllamaService when given one, so there is a
+        # single batch queue in front of the model server.
+        self.ollama = ollama or OllamaService()
+        self._code_index = code_index
 
-    async def generate_note(self, encounter_text: str, patient_context: Dict[str, Any], encounter_type: str) -> Dict[str, Any]:
+    @property
+    def code_index(self) -> CodeIndex:
+        if self._code_index is None:
+            self._code_index = get_code_index()
+        return self._code_index
+
+    async def generate_note(
+        self,
+        encounter_text: str,
+        patient_context: Dict[str, Any],
+        encounter_type: str,
+        formats: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Generate a note and render only the requested export formats (default: all)."""
+        # Reject unknown formats before spending a model call
+        formats = validate_formats(formats)
+        note = await self.build_note(encounter_text, patient_context, encounter_type)
+        with stage("export"):
+            return ExportService.format_all(note, patient_context, formats)
+
+    async def build_note(self, encounter_text: str, patient_context: Dict[str, Any], encounter_type: str) -> Dict[str, Any]:
         template = get_template(encounter_type)
+        set_model(self.ollama.model)
         
         # Construct Clinical Prompt
-        prompt = f"""
-        Generate a structured SOAP note for the following ER encounter.
-        Patient Context: {json.dumps(patient_context)}
-        Encounter Type: {encounter_type}
-        Clinical Notes: {encounter_text}
-        
-        Requirements:
-        - Output MUST be valid JSON.
-        - Include sections: subjective, objective, assessment, plan.
-        - Provide relevant ICD-10 and CPT codes.
-        - Include a brief handoff summary.
-        - Create a 'patient_handout' summary written at a 6th-grade reading level.
-        """
+        prompt = PROMPTS.get("soap_note").render(
+            vignette=template["prompt_vignette"],
+            patient_context=json.dumps(patient_context),
+            encounter_type=encounter_type,
+            encounter_text=encounter_text
+        )
         
         system_prompt = "You are a clinical documentation assistant using the MedGemma model. Output only JSON."
 
         try:
             raw_response = await self.ollama.generate_completion(prompt, system_prompt)
             # Find JSON block in response if model includes conversational filler
-            json_start = raw_response.find('{')
-            json_end = raw_response.rfind('}') + 1
-            if json_start != -1 and json_end != -1:
-                generated_data = json.loads(raw_response[json_start:json_end])
-            else:
-                raise ValueError("Could not find JSON in model response")
+            with stage("json_parse"):
+                json_start = raw_response.find('{')
+                json_end = raw_response.rfind('}') + 1
+                if json_start != -1 and json_end != -1:
+                    generated_data = json.loads(raw_response[json_start:json_end])
+                else:
+                    raise ValueError("Could not find JSON in model response")
         except Exception as e:
             # Fallback to mock/emergency template if inference fails
             print(f"Inference failed: {e}")
             generated_data = self._mock_medgemma_inference(encounter_text, template)
         
-        quality_results = QualityChecker.run_all(generated_data.get("soap_note", {}), template["quality_requirements"])
-        
+        soap_note = generated_data.get("soap_note", {})
+        with stage("quality_checks"):
+            quality_results = QualityChecker.run_all(soap_note, template["quality_requirements"], self.code_index)
+
+            # Only keep codes that exist in the local index; report the rest,
+            # skipping codes run_all already reported from the note text
+            icd10, invalid_icd10 = self.code_index.partition("ICD10", generated_data.get("icd10", []))
+            cpt, invalid_cpt = self.code_index.partition("CPT", generated_data.get("cpt", []))
+            code_issues = [f"Unrecognized ICD-10 code: {code}" for code in invalid_icd10]
+            code_issues += [f"Unrecognized CPT code: {code}" for code in invalid_cpt]
+            reported = set(quality_results["issues"])
+            quality_results["issues"] += [issue for issue in dict.fromkeys(code_issues) if issue not in reported]
+
         full_response = {
-            "soap_note": generated_data.get("soap_note", {}),
-            "icd10": generated_data.get("icd10", []),
-            "cpt": generated_data.get("cpt", []),
+            "soap_note": soap_note,
+            "icd10": icd10,
+            "cpt": cpt,
+            "suggested_icd10": [] if icd10 else [
+                {"code": code, "description": description}
+                for code, description in self.code_index.suggest(f"{soap_note.get('assessment', '')} {encounter_text}", limit=3)
+            ],
             "handoff": generated_data.get("handoff", ""),
             "patient_handout": generated_data.get("patient_handout", ""),
             "quality_checks": quality_results,
@@ -58,8 +95,10 @@ class DocumentationService:
                 "model": self.ollama.model
             }
         }
-        
-        return ExportService.format_all(full_response, patient_context)
+
+        # Persist for later bulk export (shift handoffs, EHR back-loads)
+        await save_note(full_response, patient_context)
+        return full_response
 
     def _mock_medgemma_inference(self, text: str, template: Dict[str, Any]) -> Dict[str, Any]:
         """Mock MedGemma processing for demonstration or fallback purposes."""
@@ -70,8 +109,9 @@ class DocumentationService:
                 "assessment": "Acute presentation (Fallback mode).",
                 "plan": "Follow-up as per standard of care."
             },
-            "icd10": ["R10.9"],
-            "cpt": ["99283"],
+            # No codes in fallback mode; build_note offers suggestions instead
+            "icd10": [],
+            "cpt": [],
             "handoff": "Patient stable, awaiting further evaluation.",
             "patient_handout": "We have evaluated you for your symptoms. Your vital signs are stable. Please follow up with your primary care physician in 2-3 days. Return to ER if symptoms worsen."
         }
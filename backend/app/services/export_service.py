@@ -1,23 +1,48 @@
 import json
 from datetime import datetime
-from typing import Dict, Any
+from functools import cached_property
+from typing import Dict, Any, Iterable, Iterator, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+EXPORT_FORMATS = ("json", "plain_text", "patient_handout", "fhir")
+
+def validate_formats(formats: Optional[Iterable[str]]) -> tuple:
+    """Normalize a `formats=` argument; None means every format."""
+    if formats is None:
+        return EXPORT_FORMATS
+    formats = tuple(formats)
+    unknown = set(formats) - set(EXPORT_FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown export format(s): {', '.join(sorted(unknown))}")
+    return formats
 
 class ExportService:
     @staticmethod
-    def to_plain_text(note: Dict[str, Any]) -> str:
-        text = f"CLINICAL NOTE - {datetime.now().isoformat()}\n"
-        text += "="*40 + "\n"
+    def to_plain_text(note: Dict[str, Any], timestamp: Optional[str] = None) -> str:
+        parts = [f"CLINICAL NOTE - {timestamp or datetime.now().isoformat()}\n", "=" * 40, "\n"]
         soap = note.get("soap_note", {})
         for section, content in soap.items():
-            text += f"{section.upper()}:\n{content}\n\n"
-        
-        text += "ICD-10 CODES:\n" + ", ".join(note.get("icd10", [])) + "\n\n"
-        text += "CPT CODES:\n" + ", ".join(note.get("cpt", [])) + "\n\n"
-        text += "HANDOFF SUMMARY:\n" + note.get("handoff", "")
-        return text
+            parts.append(f"{section.upper()}:\n{content}\n\n")
+
+        parts.append("ICD-10 CODES:\n" + ", ".join(note.get("icd10", [])) + "\n\n")
+        parts.append("CPT CODES:\n" + ", ".join(note.get("cpt", [])) + "\n\n")
+        parts.append("HANDOFF SUMMARY:\n" + note.get("handoff", ""))
+        return "".join(parts)
 
     @staticmethod
-    def to_fhir(note: Dict[str, Any], patient_context: Dict[str, Any]) -> Dict[str, Any]:
+    def to_fhir(
+        note: Dict[str, Any],
+        patient_context: Dict[str, Any],
+        plain_text: Optional[str] = None,
+        timestamp: Optional[str] = None
+    ) -> Dict[str, Any]:
+        # Reuse an already rendered plain-text body when the caller has one
+        if plain_text is None:
+            plain_text = ExportService.to_plain_text(note, timestamp)
         # Simplified FHIR Composition resource
         return {
             "resourceType": "Composition",
@@ -28,7 +53,7 @@ class ExportService:
             "subject": {
                 "display": f"Patient ID: {patient_context.get('patient_id', 'Unknown')}"
             },
-            "date": datetime.now().isoformat(),
+            "date": timestamp or datetime.now().isoformat(),
             "author": [{"display": "MedGemma AI Generator"}],
             "title": "Clinical Encounter Note",
             "section": [
@@ -36,17 +61,97 @@ class ExportService:
                     "title": "SOAP Note",
                     "text": {
                         "status": "generated",
-                        "div": f"<div xmlns='http://www.w3.org/1999/xhtml'>{ExportService.to_plain_text(note).replace(chr(10), '<br/>')}</div>"
+                        "div": f"<div xmlns='http://www.w3.org/1999/xhtml'>{plain_text.replace(chr(10), '<br/>')}</div>"
                     }
                 }
             ]
         }
 
     @classmethod
-    def format_all(cls, note: Dict[str, Any], patient_context: Dict[str, Any]) -> Dict[str, Any]:
-        return {
-            "json": note,
-            "plain_text": cls.to_plain_text(note),
-            "patient_handout": note.get("patient_handout", ""),
-            "fhir": cls.to_fhir(note, patient_context)
-        }
+    def export(cls, note: Dict[str, Any], patient_context: Dict[str, Any]) -> "NoteExport":
+        return NoteExport(note, patient_context)
+
+    @classmethod
+    def format_all(
+        cls,
+        note: Dict[str, Any],
+        patient_context: Dict[str, Any],
+        formats: Optional[Iterable[str]] = None
+    ) -> Dict[str, Any]:
+        """Render the requested formats (all of them by default)."""
+        return cls.export(note, patient_context).render(formats)
+
+    @staticmethod
+    def stream_ndjson(exports: Iterable["NoteExport"], chunk_size: int = 100) -> Iterator[bytes]:
+        """
+        FHIR Bulk Data style NDJSON: one Composition per line.
+
+        Consumes `exports` lazily and yields a chunk every `chunk_size`
+        resources, so the full set is never held in memory.
+        """
+        chunk = []
+        for export in exports:
+            chunk.append(export.fhir_bytes)
+            if len(chunk) >= chunk_size:
+                yield b"\n".join(chunk) + b"\n"
+                chunk = []
+        if chunk:
+            yield b"\n".join(chunk) + b"\n"
+
+    @staticmethod
+    def stream_bundle(exports: Iterable["NoteExport"], chunk_size: int = 100) -> Iterator[bytes]:
+        """Same as stream_ndjson, framed as a single FHIR `collection` Bundle."""
+        yield b'{"resourceType":"Bundle","type":"collection","entry":['
+        chunk = []
+        separator = b""
+        for export in exports:
+            chunk.append(separator + b'{"resource":' + export.fhir_bytes + b"}")
+            separator = b","
+            if len(chunk) >= chunk_size:
+                yield b"".join(chunk)
+                chunk = []
+        if chunk:
+            yield b"".join(chunk)
+        yield b"]}"
+
+
+class NoteExport:
+    """
+    Lazily rendered export formats for one note.
+
+    Each format is built on first access and memoized, and all formats share
+    one timestamp, so the plain-text body is rendered once even when both
+    `plain_text` and `fhir` are requested. Stored notes pass their creation
+    time as `timestamp`.
+    """
+
+    def __init__(self, note: Dict[str, Any], patient_context: Dict[str, Any], timestamp: Optional[str] = None):
+        self.note = note
+        self.patient_context = patient_context
+        self.timestamp = timestamp or datetime.now().isoformat()
+
+    @property
+    def json(self) -> Dict[str, Any]:
+        return self.note
+
+    @property
+    def patient_handout(self) -> str:
+        return self.note.get("patient_handout", "")
+
+    @cached_property
+    def plain_text(self) -> str:
+        return ExportService.to_plain_text(self.note, self.timestamp)
+
+    @cached_property
+    def fhir(self) -> Dict[str, Any]:
+        return ExportService.to_fhir(self.note, self.patient_context, self.plain_text, self.timestamp)
+
+    @cached_property
+    def fhir_bytes(self) -> bytes:
+        """Serialized FHIR resource, ready to send as a response body."""
+        if orjson is not None:
+            return orjson.dumps(self.fhir)
+        return json.dumps(self.fhir, separators=(",", ":")).encode()
+
+    def render(self, formats: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in validate_formats(formats)}
@@ -0,0 +1,165 @@
+import os
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+
+from ..core.metrics import QUEUE_WAIT, record_stage
+from .triage_rules import vitals_esi
+
+# Highest first. "critical" is strict priority; the rest share slots by weight.
+PRIORITY_CLASSES = ("critical", "emergent", "urgent", "routine")
+DEFAULT_WEIGHTS = {"emergent": 8, "urgent": 4, "routine": 1}
+
+INFERENCE_CONCURRENCY = int(os.getenv("INFERENCE_CONCURRENCY", "4"))
+INFERENCE_MAX_QUEUED = int(os.getenv("INFERENCE_MAX_QUEUED", "64"))
+
+
+class SchedulerOverloaded(Exception):
+    """The queue is full, or a queued request was preempted by higher-priority work."""
+
+
+def priority_for_esi(esi_level: int) -> str:
+    return {1: "critical", 2: "emergent", 3: "urgent"}.get(esi_level, "routine")
+
+
+def priority_from_vitals(vitals: Dict[str, Any]) -> str:
+    """Fast vitals-only pre-score, so a hypoxic patient is queued as critical before any model runs."""
+    return priority_for_esi(vitals_esi(vitals)[0])
+
+
+class _Ticket:
+    __slots__ = ("priority", "future", "enqueued_at")
+
+    def __init__(self, priority: str, future: asyncio.Future):
+        self.priority = priority
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class InferenceScheduler:
+    """
+    Admission to the inference backends by priority class.
+
+    At most `max_concurrency` calls run at once. When all slots are busy:
+    - critical (ESI 1) requests are served before anything else;
+    - emergent / urgent / routine share slots by weighted fair queuing
+      (stride scheduling on per-class virtual time), so routine SOAP notes
+      still progress but can't hold up emergent triage;
+    - once `max_queued` requests wait, a new request preempts the newest
+      queued request of a lower class, which fails with
+      SchedulerOverloaded. Work that already holds a slot is never interrupted.
+
+    Queue wait per class goes to the `er_inference_queue_wait_seconds`
+    histogram, the request's `queue_wait` stage, and `stats()`.
+
+    Example:
+        >>> async with scheduler.slot("emergent"):
+        ...     text = await backend.generate(prompt)
+    """
+
+    def __init__(self, max_concurrency: int = INFERENCE_CONCURRENCY, weights: Optional[Dict[str, float]] = None,
+                 max_queued: int = INFERENCE_MAX_QUEUED):
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.running = 0
+        self._queues: Dict[str, Deque[_Ticket]] = {p: deque() for p in PRIORITY_CLASSES}
+        self._pass: Dict[str, float] = {p: 0.0 for p in self.weights}
+        self._virtual_time = 0.0
+        self._stats = {p: {"served": 0, "preempted": 0, "wait_total": 0.0, "wait_max": 0.0} for p in PRIORITY_CLASSES}
+
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "routine"):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, priority: str = "routine"):
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority class '{priority}'")
+        if self.running < self.max_concurrency and not self.queued():
+            self.running += 1
+            self._record_wait(priority, 0.0)
+            return
+        if self.queued() >= self.max_queued:
+            self._preempt_below(priority)
+
+        ticket = _Ticket(priority, asyncio.get_running_loop().create_future())
+        if priority in self._pass and not self._queues[priority]:
+            # A class returning from idle starts at the current virtual time
+            # instead of spending credit it built up while it had no work
+            self._pass[priority] = max(self._pass[priority], self._virtual_time)
+        self._queues[priority].append(ticket)
+        try:
+            await ticket.future
+        except BaseException:
+            if ticket.future.done() and not ticket.future.cancelled() and ticket.future.exception() is None:
+                # Cancelled right after being granted a slot: hand it on
+                self.release()
+            elif ticket in self._queues[priority]:
+                self._queues[priority].remove(ticket)
+            raise
+        self._record_wait(priority, time.perf_counter() - ticket.enqueued_at)
+
+    def release(self):
+        self.running -= 1
+        while self.running < self.max_concurrency:
+            ticket = self._next()
+            if ticket is None:
+                return
+            if ticket.future.done():
+                continue
+            self.running += 1
+            ticket.future.set_result(None)
+
+    def _next(self) -> Optional[_Ticket]:
+        if self._queues["critical"]:
+            return self._queues["critical"].popleft()
+        active = [p for p in self._pass if self._queues[p]]
+        if not active:
+            return None
+        chosen = min(active, key=lambda p: (self._pass[p], PRIORITY_CLASSES.index(p)))
+        self._virtual_time = self._pass[chosen]
+        self._pass[chosen] += 1.0 / self.weights[chosen]
+        return self._queues[chosen].popleft()
+
+    def _preempt_below(self, priority: str):
+        rank = PRIORITY_CLASSES.index(priority)
+        for lower in reversed(PRIORITY_CLASSES[rank + 1:]):
+            if self._queues[lower]:
+                victim = self._queues[lower].pop()
+                self._stats[lower]["preempted"] += 1
+                victim.future.set_exception(SchedulerOverloaded(f"Preempted by {priority} inference request"))
+                return
+        raise SchedulerOverloaded(f"Inference queue full ({self.max_queued} waiting)")
+
+    def _record_wait(self, priority: str, seconds: float):
+        stats = self._stats[priority]
+        stats["served"] += 1
+        stats["wait_total"] += seconds
+        stats["wait_max"] = max(stats["wait_max"], seconds)
+        QUEUE_WAIT.observe((priority,), seconds)
+        record_stage("queue_wait", seconds)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "max_concurrency": self.max_concurrency,
+            "classes": {
+                p: {
+                    "queued": len(self._queues[p]),
+                    "served": s["served"],
+                    "preempted": s["preempted"],
+                    "mean_wait_ms": round(1000 * s["wait_total"] / s["served"], 3) if s["served"] else 0.0,
+                    "max_wait_ms": round(1000 * s["wait_max"], 3),
+                }
+                for p, s in self._stats.items()
+            },
+        }
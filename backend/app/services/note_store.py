@@ -0,0 +1,52 @@
+import json
+from datetime import datetime
+from typing import Optional, Dict, Any, Iterator, Tuple
+from sqlmodel import SQLModel, Field, Session, select
+from ..core.database import async_session, get_engine, encrypt_data, decrypt_data
+
+class ClinicalNote(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    patient_id: str = Field(index=True)
+    encounter_type: str
+    note_encrypted: str  # Generated note JSON, encrypted at rest
+
+async def save_note(note: Dict[str, Any], patient_context: Dict[str, Any]) -> Optional[int]:
+    try:
+        async with async_session() as session:
+            record = ClinicalNote(
+                patient_id=str(patient_context.get("patient_id", "Unknown")),
+                encounter_type=note.get("metadata", {}).get("encounter_type", ""),
+                note_encrypted=encrypt_data(json.dumps(note))
+            )
+            session.add(record)
+            await session.commit()
+            return record.id
+    except Exception as e:
+        # Fallback for local testing without DB
+        print(f"[NOTE STORE FAILURE] Patient: {patient_context.get('patient_id')}, Details: {e}")
+        return None
+
+def iter_notes(
+    since: Optional[datetime] = None,
+    patient_id: Optional[str] = None,
+    batch_size: int = 500
+) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any], str]]:
+    """
+    Yield (note, patient_context, created_at) for stored notes in id order.
+
+    Rows are fetched through a server-side cursor `batch_size` at a time, so
+    memory stays flat and the database is only read as fast as the consumer
+    pulls from this generator.
+    """
+    statement = select(ClinicalNote).order_by(ClinicalNote.id)
+    if since is not None:
+        statement = statement.where(ClinicalNote.created_at >= since)
+    if patient_id is not None:
+        statement = statement.where(ClinicalNote.patient_id == patient_id)
+
+    # Sync on purpose: StreamingResponse pulls this from a worker thread
+    with Session(get_engine()) as session:
+        for row in session.exec(statement.execution_options(yield_per=batch_size)):
+            note = json.loads(decrypt_data(row.note_encrypted))
+            yield note, {"patient_id": row.patient_id}, row.created_at.isoformat()
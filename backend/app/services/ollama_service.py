@@ -3,19 +3,65 @@ import json
 import os
 import asyncio
 from typing import Dict, Any, List, Optional
+from ..core.metrics import record_stage
+from .inference_scheduler import InferenceScheduler
 
 class OllamaService:
-    def __init__(self):
+    def __init__(self, scheduler: Optional[InferenceScheduler] = None):
+        # Decides which waiting request gets to Ollama next; shared with
+        # TriageService by the ServiceContainer
+        self.scheduler = scheduler or InferenceScheduler(max_concurrency=5)
         self.host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
         self.model = os.getenv("MODEL_NAME", "medgemma:7b-q4_k_m")
         self.queue = asyncio.Queue()
         self.batch_size = 5
         self.wait_time = 0.1  # seconds
-        try:
-            asyncio.create_task(self._batch_worker())
-        except RuntimeError:
-            # No event loop running (common during test collection or script execution)
-            pass
+        self._worker: Optional[asyncio.Task] = None
+        self._worker_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Shared AsyncClient so requests reuse keep-alive connections to Ollama
+        instead of opening a new connection pool per call.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                timeout=60.0,
+                limits=httpx.Limits(max_connections=self.batch_size * 2, max_keepalive_connections=self.batch_size)
+            )
+            self._client_loop = loop
+        return self._client
+
+    def start(self):
+        """
+        Start the batch worker on the running event loop.
+
+        Called from the app lifespan, and lazily on first use so services
+        can be constructed outside an event loop (imports, tests, scripts).
+        """
+        loop = asyncio.get_running_loop()
+        if self._worker is not None and not self._worker.done() and self._worker_loop is loop:
+            return
+        # A queue is tied to the loop that first uses it; start fresh per loop
+        self.queue = asyncio.Queue()
+        self._worker_loop = loop
+        self._worker = loop.create_task(self._batch_worker())
+
+    async def close(self):
+        """Stop the batch worker and close pooled connections."""
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+        if self._client is not None and self._client_loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
 
     async def _batch_worker(self):
         while True:
@@ -44,12 +90,12 @@ class OllamaService:
 
     async def _process_single(self, prompt, system_prompt, future):
         try:
-            res = await self._generate_completion_direct(prompt, system_prompt)
+            res = await self._generate_raw(prompt, system_prompt)
             future.set_result(res)
         except Exception as e:
             future.set_exception(e)
 
-    async def _generate_completion_direct(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+    async def _generate_raw(self, prompt: str, system_prompt: Optional[str] = None) -> Dict[str, Any]:
         url = f"{self.host}/api/generate"
         payload = {
             "model": self.model,
@@ -59,18 +105,29 @@ class OllamaService:
         if system_prompt:
             payload["system"] = system_prompt
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(url, json=payload)
-            response.raise_for_status()
-            data = response.json()
-            return data.get("response", "")
+        response = await self._get_client().post(url, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _record_timings(data: Dict[str, Any]):
+        # Ollama reports its own prompt-eval (prefill) and eval (decode) time
+        # in nanoseconds; recorded here, in the request's context, not the worker's
+        if "prompt_eval_duration" in data:
+            record_stage("prefill", data["prompt_eval_duration"] / 1e9)
+        if "eval_duration" in data:
+            record_stage("decode", data["eval_duration"] / 1e9)
 
-    async def generate_completion(self, prompt: str, system_prompt: Optional[str] = None) -> str:
-        future = asyncio.get_event_loop().create_future()
-        await self.queue.put((prompt, system_prompt, future))
-        return await future
+    async def generate_completion(self, prompt: str, system_prompt: Optional[str] = None, priority: str = "routine") -> str:
+        self.start()
+        async with self.scheduler.slot(priority):
+            future = asyncio.get_running_loop().create_future()
+            await self.queue.put((prompt, system_prompt, future))
+            data = await future
+        self._record_timings(data)
+        return data.get("response", "")
 
-    async def generate_chat(self, messages: List[Dict[str, str]]) -> str:
+    async def generate_chat(self, messages: List[Dict[str, str]], priority: str = "routine") -> str:
         url = f"{self.host}/api/chat"
         payload = {
             "model": self.model,
@@ -78,8 +135,10 @@ class OllamaService:
             "stream": False
         }
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(url, json=payload)
+        # Chat goes to the same Ollama, so it waits its turn like completions
+        async with self.scheduler.slot(priority):
+            response = await self._get_client().post(url, json=payload)
             response.raise_for_status()
             data = response.json()
-            return data.get("message", {}).get("content", "")
+        self._record_timings(data)
+        return data.get("message", {}).get("content", "")
@@ -1,5 +1,5 @@
 import re
-from typing import List
+from typing import Any, Dict, List, Optional
 
 # Simple PII regex patterns for demonstration
 # In production, use specialized libraries like Presidio or scrubadub
@@ -19,13 +19,16 @@ def deidentify_text(text: str) -> str:
         scrubbed_text = re.sub(pattern, placeholder, scrubbed_text)
     return scrubbed_text
 
-def apply_retention_policy(older_than_days: int = 30):
+def apply_retention_policy(older_than_days: Optional[int] = None, archive_dir: Optional[str] = None) -> List[Dict[str, Any]]:
     """
-    Stub for background task to delete old data according to hospital policy.
+    Enforce the audit log retention window (AUDIT_RETENTION_DAYS by default).
+    Whole expired months are archived to Parquet, then dropped.
     """
-    # In a real implementation, this would query the DB and delete old records
-    print(f"Applying data retention policy: Scrambling/Deleting data older than {older_than_days} days.")
-    pass
+    from .audit_retention import AUDIT_ARCHIVE_DIR, AUDIT_RETENTION_DAYS, run_retention
+
+    days = AUDIT_RETENTION_DAYS if older_than_days is None else older_than_days
+    print(f"Applying data retention policy: archiving and dropping audit data older than {days} days.")
+    return run_retention(days, archive_dir or AUDIT_ARCHIVE_DIR)
 
 def flag_sensitive_content(text: str) -> List[str]:
     """
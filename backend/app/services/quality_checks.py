@@ -1,33 +1,122 @@
-from typing import List, Dict, Any
+import re
+import time
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple, Optional
+from .terminology import CodeIndex, get_code_index
+
+SOAP_SECTIONS = ["subjective", "objective", "assessment", "plan"]
+MIN_SECTION_LENGTH = 10
+
+# Code mentions inside the note text. ICD-10 codes are only recognised in
+# their dotted form and CPT codes only after a "CPT" label, so vitals and
+# lab values ("WBC 12000", "B12") are not mistaken for codes.
+ICD10_PATTERN = r"\b(?P<icd10>[A-Z]\d{2}\.[0-9A-Z]{1,4})\b"
+CPT_PATTERN = r"\bCPT[\s:#-]*(?P<cpt>\d{5})\b"
+
+
+def _phrase_pattern(phrase: str) -> str:
+    words = r"\s+".join(re.escape(word) for word in phrase.split())
+    return rf"(?i:\b{words}\b)"
+
+
+class QualityRuleSet:
+    """
+    A template's `quality_requirements` plus code detection compiled into
+    one regex, so a note is scanned once for all of them.
+
+    Every rule is a zero-width lookahead tried at each word start, so
+    overlapping mentions are all reported: "chest pain" satisfies both the
+    "chest pain" and the "pain" requirement. A leading alternation of all
+    rules skips word starts where nothing can match.
+    """
+
+    def __init__(self, requirements: Tuple[str, ...]):
+        self.requirements = requirements
+        rules = [(f"req{i}", _phrase_pattern(req)) for i, req in enumerate(requirements)]
+        rules += [("icd10", ICD10_PATTERN), ("cpt", CPT_PATTERN)]
+        any_rule = "|".join(f"(?:{pattern})" for _, pattern in rules).replace("(?P<icd10>", "(?:").replace("(?P<cpt>", "(?:")
+        captures = "".join(
+            f"(?:(?=(?P<{name}>{pattern})))?" if name.startswith("req") else f"(?:(?={pattern}))?"
+            for name, pattern in rules
+        )
+        self.matcher = re.compile(rf"\b(?=(?:{any_rule})){captures}")
+
+    def scan(self, text: str) -> Tuple[set, List[str], List[str]]:
+        """Return (indices of requirements found, ICD-10 mentions, CPT mentions)."""
+        found, icd10, cpt = set(), [], []
+        for match in self.matcher.finditer(text):
+            for group, value in match.groupdict().items():
+                if value is None:
+                    continue
+                if group == "icd10":
+                    icd10.append(value)
+                elif group == "cpt":
+                    cpt.append(value)
+                else:
+                    found.add(int(group[3:]))
+        return found, icd10, cpt
+
+
+@lru_cache(maxsize=64)
+def compile_rules(requirements: Tuple[str, ...]) -> QualityRuleSet:
+    return QualityRuleSet(requirements)
+
 
 class QualityChecker:
+    @staticmethod
+    def _normalize(note: Dict[str, str]) -> str:
+        return " ".join(str(value) for value in note.values())
+
     @staticmethod
     def check_completeness(note: Dict[str, str], requirements: List[str]) -> List[str]:
         issues = []
-        soap_sections = ["subjective", "objective", "assessment", "plan"]
-        for section in soap_sections:
-            if not note.get(section) or len(note[section].strip()) < 10:
+        for section in SOAP_SECTIONS:
+            if not note.get(section) or len(note[section].strip()) < MIN_SECTION_LENGTH:
                 issues.append(f"Missing or incomplete {section.capitalize()} section.")
-        
-        # Check specific requirements from template
-        for req in requirements:
-            # Simple heuristic for requirement check
-            combined_note = " ".join(note.values()).lower()
-            if req.lower() not in combined_note:
-                 # This is a very basic check, would normally use NLP/MedGemma
-                 pass 
-        
         return issues
 
     @staticmethod
-    def check_terminology(note: Dict[str, str]) -> List[str]:
-        # Placeholder for medical terminology validation
-        # In a real system, we'd use a medical NER model or SNOMED-CT lookup
-        return []
+    def _terminology_issues(index: CodeIndex, icd10: List[str], cpt: List[str]) -> List[str]:
+        issues = [f"Unrecognized ICD-10 code: {code}" for code in dict.fromkeys(icd10) if not index.is_valid("ICD10", code)]
+        issues += [f"Unrecognized CPT code: {code}" for code in dict.fromkeys(cpt) if not index.is_valid("CPT", code)]
+        return issues
+
+    @classmethod
+    def check_terminology(cls, note: Dict[str, str], code_index: Optional[CodeIndex] = None) -> List[str]:
+        # Validate code mentions against the local ICD-10/CPT index
+        _, icd10, cpt = compile_rules(()).scan(cls._normalize(note))
+        return cls._terminology_issues(code_index or get_code_index(), icd10, cpt)
 
     @classmethod
-    def run_all(cls, note: Dict[str, str], requirements: List[str]) -> Dict[str, Any]:
+    def run_all(cls, note: Dict[str, str], requirements: List[str], code_index: Optional[CodeIndex] = None) -> Dict[str, Any]:
+        """
+        Completeness, required-term and terminology checks in one pass over
+        the note, with per-stage timings in milliseconds.
+        """
+        timings = {}
+        start = time.perf_counter()
+
+        text = cls._normalize(note)
+        timings["normalize"] = time.perf_counter() - start
+
+        stage = time.perf_counter()
+        completeness_issues = cls.check_completeness(note, requirements)
+        timings["completeness"] = time.perf_counter() - stage
+
+        stage = time.perf_counter()
+        rules = compile_rules(tuple(requirements))
+        found, icd10, cpt = rules.scan(text)
+        missing = [req for i, req in enumerate(rules.requirements) if i not in found]
+        timings["required_terms"] = time.perf_counter() - stage
+
+        stage = time.perf_counter()
+        terminology_issues = cls._terminology_issues(code_index or get_code_index(), icd10, cpt)
+        timings["terminology"] = time.perf_counter() - stage
+
+        timings["total"] = time.perf_counter() - start
         return {
-            "is_complete": len(cls.check_completeness(note, requirements)) == 0,
-            "issues": cls.check_completeness(note, requirements) + cls.check_terminology(note)
+            "is_complete": len(completeness_issues) == 0,
+            "issues": completeness_issues + terminology_issues,
+            "missing_requirements": missing,
+            "timings_ms": {name: round(seconds * 1000, 3) for name, seconds in timings.items()}
         }
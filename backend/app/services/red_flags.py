@@ -0,0 +1,214 @@
+import os
+import re
+import json
+import bisect
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+DEFAULT_LEXICON_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "red_flag_lexicon.json")
+
+# Words plus the punctuation that ends a negation scope
+_TOKEN = re.compile(r"[a-z0-9]+|[.,;!?]")
+
+# Pseudo-categories for negation cues, pseudo-negations and scope terminators,
+# matched in the same pass as the terms
+_NEGATION = "__negation__"
+_PSEUDO = "__pseudo__"
+_TERMINATOR = "__terminator__"
+
+
+def tokenize(text: str) -> List[Tuple[str, int, int]]:
+    """(token, start, end) over the lower-cased text; offsets index into `text`."""
+    return [(m.group(), m.start(), m.end()) for m in _TOKEN.finditer(text.lower())]
+
+
+class RedFlagMatch(NamedTuple):
+    term: str
+    category: str
+    start: int  # character offsets into the scanned text
+    end: int
+    negated: bool
+
+
+class RedFlagScan(NamedTuple):
+    """Everything the lexicon found in one complaint."""
+
+    matches: Tuple[RedFlagMatch, ...]
+    labels: Dict[str, str]
+    esi: Dict[str, int]
+
+    @property
+    def categories(self) -> List[str]:
+        """Categories with at least one affirmed (non-negated) term, in order of first mention."""
+        return list(dict.fromkeys(m.category for m in self.matches if not m.negated))
+
+    @property
+    def negated(self) -> List[str]:
+        """Categories that were only ever mentioned as denied ("denies chest pain")."""
+        affirmed = set(self.categories)
+        return list(dict.fromkeys(m.category for m in self.matches if m.negated and m.category not in affirmed))
+
+    def has(self, *categories: str) -> bool:
+        affirmed = self.categories
+        return any(c in affirmed for c in categories)
+
+    def red_flags(self) -> List[str]:
+        """Labels of the affirmed categories that carry an ESI ceiling."""
+        return [self.labels[c] for c in self.categories if c in self.esi]
+
+    def esi_ceiling(self) -> Optional[int]:
+        """Most urgent ESI level any affirmed red flag calls for, or None."""
+        levels = [self.esi[c] for c in self.categories if c in self.esi]
+        return min(levels) if levels else None
+
+
+class RedFlagMatcher:
+    """
+    Aho-Corasick automaton over word tokens, built once from the red-flag
+    lexicon. `scan` finds every term of every category, plus negation cues
+    and scope terminators, in a single left-to-right pass over the text, so
+    its cost doesn't grow with the size of the lexicon.
+
+    A term is negated when a negation cue ends within `window` tokens before
+    it and no terminator ("but", ",", "presents with", ...) comes in between:
+    "no fever or cough" negates cough, "no fever, cough" and "no fever but
+    cough" don't. Cues inside a pseudo-negation ("no PMH", "no relief")
+    negate nothing. Categories with an ESI ceiling are stricter: only a cue
+    directly in front of the term negates them ("denies chest pain"), so a
+    missed scope boundary can't downgrade a red flag.
+    """
+
+    def __init__(self, categories: Dict[str, Dict[str, Any]], cues: Iterable[str] = (),
+                 terminators: Iterable[str] = (), window: int = 5, version: str = "unversioned",
+                 pseudo: Iterable[str] = ()):
+        self.version = version
+        self.window = window
+        self.labels = {name: spec.get("label", name) for name, spec in categories.items()}
+        self.esi = {name: int(spec["esi"]) for name, spec in categories.items() if spec.get("esi") is not None}
+
+        # Trie: goto[state][token] -> state; out[state] -> [(category, term, length in tokens)]
+        self._goto: List[Dict[str, int]] = [{}]
+        self._out: List[List[Tuple[str, str, int]]] = [[]]
+        self.terms = 0
+        for name, spec in categories.items():
+            for term in spec.get("terms", ()):
+                self.terms += self._add(term, name)
+        for cue in cues:
+            self._add(cue, _NEGATION)
+        for phrase in pseudo:
+            self._add(phrase, _PSEUDO)
+        for terminator in terminators:
+            self._add(terminator, _TERMINATOR)
+        self._fail = self._link()
+        self._vocabulary = frozenset(token for edges in self._goto for token in edges)
+
+    def _add(self, term: str, category: str) -> int:
+        tokens = [token for token, _, _ in tokenize(term)]
+        if not tokens:
+            return 0
+        state = 0
+        for token in tokens:
+            nxt = self._goto[state].get(token)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][token] = nxt
+                self._goto.append({})
+                self._out.append([])
+            state = nxt
+        if any(c == category for c, _, _ in self._out[state]):
+            return 0  # spelling variant of a term already in the category ("one-sided" / "one sided")
+        self._out[state].append((category, term, len(tokens)))
+        return 1
+
+    def _link(self) -> List[int]:
+        """Breadth-first failure links; each state also inherits the outputs of its failure state."""
+        fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and token not in self._goto[f]:
+                    f = fail[f]
+                fail[nxt] = self._goto[f].get(token, 0)
+                self._out[nxt] = self._out[nxt] + self._out[fail[nxt]]
+        return fail
+
+    def scan(self, text: str) -> RedFlagScan:
+        goto, fail, out, vocabulary = self._goto, self._fail, self._out, self._vocabulary
+        found: List[Tuple[int, int, str, str]] = []  # (first token, last token, category, term)
+        cue_ends: List[int] = []
+        pseudo: List[Tuple[int, int]] = []  # (first token, last token)
+        terminator_at: List[int] = []
+        spans: List[Tuple[int, int]] = []
+
+        state = 0
+        for i, m in enumerate(_TOKEN.finditer(text.lower())):
+            spans.append(m.span())
+            token = m.group()
+            if token not in vocabulary:
+                # Most words in a complaint aren't in any term: straight back to the root
+                state = 0
+                continue
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for category, term, length in out[state]:
+                if category == _NEGATION:
+                    cue_ends.append(i)
+                elif category == _PSEUDO:
+                    pseudo.append((i - length + 1, i))
+                elif category == _TERMINATOR:
+                    terminator_at.append(i)
+                else:
+                    found.append((i - length + 1, i, category, term))
+
+        if pseudo:
+            # "no" in "no relief from nitro" isn't negating anything
+            cue_ends = [cue for cue in cue_ends if not any(start <= cue <= end for start, end in pseudo)]
+        matches = [
+            RedFlagMatch(term, category, spans[first][0], spans[last][1],
+                         self._negated(first, cue_ends, terminator_at, category in self.esi))
+            for first, last, category, term in found
+        ]
+        matches.sort(key=lambda m: (m.start, -m.end))
+        return RedFlagScan(tuple(matches), self.labels, self.esi)
+
+    def _negated(self, first: int, cue_ends: List[int], terminator_at: List[int], ceiling: bool) -> bool:
+        k = bisect.bisect_left(cue_ends, first)
+        if not k:
+            return False
+        cue = cue_ends[k - 1]
+        if first - cue > (1 if ceiling else self.window):
+            return False
+        k = bisect.bisect_left(terminator_at, first)
+        return not k or terminator_at[k - 1] < cue
+
+
+def load_lexicon(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        lexicon = json.load(f)
+    if "version" not in lexicon or "categories" not in lexicon:
+        raise ValueError(f"Red-flag lexicon {path} needs 'version' and 'categories'")
+    return lexicon
+
+
+@lru_cache(maxsize=4)
+def get_matcher(path: Optional[str] = None) -> RedFlagMatcher:
+    """The compiled matcher for `path` (default: RED_FLAG_LEXICON or the bundled lexicon), built once."""
+    lexicon = load_lexicon(path or os.getenv("RED_FLAG_LEXICON", DEFAULT_LEXICON_FILE))
+    negation = lexicon.get("negation", {})
+    return RedFlagMatcher(
+        lexicon["categories"],
+        cues=negation.get("cues", ()),
+        pseudo=negation.get("pseudo", ()),
+        terminators=negation.get("terminators", ()),
+        window=int(negation.get("window", 5)),
+        version=str(lexicon["version"]),
+    )
+
+
+def scan_complaint(text: str) -> RedFlagScan:
+    return get_matcher().scan(text)
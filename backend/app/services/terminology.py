@@ -0,0 +1,201 @@
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Iterable
+
+import numpy as np
+
+DEFAULT_CODE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "terminology_codes.tsv")
+SYSTEMS = ("ICD10", "CPT")
+
+_WORD = re.compile(r"[a-z0-9]+")
+# Words too common in code descriptors to say anything about a match
+_STOPWORDS = frozenset({
+    "and", "or", "of", "the", "with", "without", "other", "unspecified", "to", "in",
+    "on", "by", "for", "a", "an", "not", "elsewhere", "classified", "level", "visit"
+})
+
+
+def normalize_code(system: str, code: str) -> str:
+    """Uppercase, strip whitespace, and restore the dot in ICD-10 codes ("R109" -> "R10.9")."""
+    code = code.strip().upper()
+    if system == "ICD10" and len(code) > 3 and "." not in code:
+        code = f"{code[:3]}.{code[3:]}"
+    return code
+
+
+class _CodeTable:
+    """
+    One code system as three compact arrays: sorted fixed-width codes,
+    description offsets, and all descriptions as one UTF-8 blob. Lookups
+    are binary searches over `codes`, so the arrays can be memory-mapped
+    straight from disk.
+    """
+
+    def __init__(self, codes: np.ndarray, offsets: np.ndarray, blob: np.ndarray):
+        self.codes = codes
+        self.offsets = offsets
+        self.blob = blob
+        self._words = None
+
+    @classmethod
+    def build(cls, entries: Dict[str, str]) -> "_CodeTable":
+        keys = sorted(entries)
+        width = max((len(k) for k in keys), default=1)
+        encoded = [entries[k].encode("utf-8") for k in keys]
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return cls(
+            np.array([k.encode("ascii") for k in keys], dtype=f"S{width}"),
+            offsets,
+            np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        )
+
+    def __len__(self):
+        return len(self.codes)
+
+    def find(self, code: str) -> int:
+        if not code.isascii():
+            return -1  # codes are ASCII; dropping the other characters would turn "R10.9é" into a match
+        key = code.encode("ascii")
+        i = int(np.searchsorted(self.codes, key))
+        if i < len(self.codes) and self.codes[i] == key:
+            return i
+        return -1
+
+    def code(self, i: int) -> str:
+        return self.codes[i].decode("ascii")
+
+    def description(self, i: int) -> str:
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        if not prefix.isascii():
+            return 0, 0
+        key = prefix.encode("ascii")
+        start = int(np.searchsorted(self.codes, key, side="left"))
+        # Every code with this prefix sorts below prefix + 0xFF
+        end = int(np.searchsorted(self.codes, key + b"\xff", side="left"))
+        return start, end
+
+    def word_index(self) -> Dict[str, List[int]]:
+        # Inverted index over descriptor words, built on first suggest()
+        if self._words is None:
+            words: Dict[str, List[int]] = {}
+            for i in range(len(self)):
+                for word in set(_WORD.findall(self.description(i).lower())) - _STOPWORDS:
+                    words.setdefault(word, []).append(i)
+            self._words = words
+        return self._words
+
+
+class CodeIndex:
+    """
+    Offline ICD-10 / CPT code lookup.
+
+    Loaded either from a TSV file (`system<TAB>code<TAB>description`, '#'
+    for comments) or from a directory written by `save()`, whose arrays are
+    opened with `mmap_mode="r"` so large code sets cost no load time.
+    Validation, description lookup and prefix search are O(log n).
+    """
+
+    def __init__(self, tables: Dict[str, _CodeTable]):
+        self.tables = tables
+
+    @classmethod
+    def from_codes(cls, codes: Dict[str, Dict[str, str]]) -> "CodeIndex":
+        tables = {}
+        for system, entries in codes.items():
+            tables[system] = _CodeTable.build({normalize_code(system, c): d for c, d in entries.items()})
+        return cls(tables)
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "CodeIndex":
+        path = path or DEFAULT_CODE_FILE
+        if os.path.isdir(path):
+            return cls.open(path)
+        codes: Dict[str, Dict[str, str]] = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                system, code, description = line.rstrip("\n").split("\t", 2)
+                codes.setdefault(system, {})[code] = description
+        return cls.from_codes(codes)
+
+    @classmethod
+    def open(cls, directory: str) -> "CodeIndex":
+        tables = {}
+        for system in SYSTEMS:
+            codes_path = os.path.join(directory, f"{system}.codes.npy")
+            if not os.path.exists(codes_path):
+                continue
+            tables[system] = _CodeTable(
+                np.load(codes_path, mmap_mode="r"),
+                np.load(os.path.join(directory, f"{system}.offsets.npy"), mmap_mode="r"),
+                np.load(os.path.join(directory, f"{system}.desc.npy"), mmap_mode="r")
+            )
+        return cls(tables)
+
+    def save(self, directory: str):
+        """Write the compiled arrays so `load(directory)` can memory-map them."""
+        os.makedirs(directory, exist_ok=True)
+        for system, table in self.tables.items():
+            np.save(os.path.join(directory, f"{system}.codes.npy"), np.asarray(table.codes))
+            np.save(os.path.join(directory, f"{system}.offsets.npy"), np.asarray(table.offsets))
+            np.save(os.path.join(directory, f"{system}.desc.npy"), np.asarray(table.blob))
+
+    def _table(self, system: str) -> Optional[_CodeTable]:
+        return self.tables.get(system)
+
+    def is_valid(self, system: str, code: str) -> bool:
+        table = self._table(system)
+        return table is not None and table.find(normalize_code(system, code)) >= 0
+
+    def describe(self, system: str, code: str) -> Optional[str]:
+        table = self._table(system)
+        if table is None:
+            return None
+        i = table.find(normalize_code(system, code))
+        return table.description(i) if i >= 0 else None
+
+    def prefix_search(self, system: str, prefix: str, limit: int = 20) -> List[Tuple[str, str]]:
+        """(code, description) pairs whose code starts with `prefix`, in code order."""
+        table = self._table(system)
+        if table is None:
+            return []
+        start, end = table.prefix_range(prefix.strip().upper())
+        return [(table.code(i), table.description(i)) for i in range(start, min(end, start + limit))]
+
+    def partition(self, system: str, codes: Iterable[str]) -> Tuple[List[str], List[str]]:
+        """Split model-emitted codes into (valid normalized codes, unrecognized codes)."""
+        valid, invalid = {}, {}
+        for code in codes:
+            normalized = normalize_code(system, str(code))
+            if self.is_valid(system, normalized):
+                valid[normalized] = None
+            else:
+                invalid[str(code)] = None
+        return list(valid), list(invalid)
+
+    def suggest(self, text: str, system: str = "ICD10", limit: int = 5) -> List[Tuple[str, str]]:
+        """
+        Rank codes by how many descriptor words appear in `text` (e.g. the
+        assessment section). Ties go to the shorter, more general descriptor.
+        """
+        table = self._table(system)
+        if table is None or not text:
+            return []
+        words = table.word_index()
+        scores: Dict[int, int] = {}
+        for word in set(_WORD.findall(text.lower())) - _STOPWORDS:
+            for i in words.get(word, ()):
+                scores[i] = scores.get(i, 0) + 1
+        ranked = sorted(scores, key=lambda i: (-scores[i], int(table.offsets[i + 1] - table.offsets[i]), i))
+        return [(table.code(i), table.description(i)) for i in ranked[:limit]]
+
+
+@lru_cache(maxsize=1)
+def get_code_index() -> CodeIndex:
+    """Process-wide index, loaded on first use from CODE_INDEX_PATH or the bundled seed file."""
+    return CodeIndex.load(os.getenv("CODE_INDEX_PATH"))
@@ -0,0 +1,111 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+REFINEMENT_TTL = float(os.getenv("TRIAGE_REFINEMENT_TTL", "900"))
+REFINEMENT_MAX_JOBS = int(os.getenv("TRIAGE_REFINEMENT_MAX_JOBS", "1000"))
+
+
+class RefinementJob:
+    def __init__(self, quick: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.created = time.monotonic()
+        self.status = "pending"  # pending -> refined | failed
+        self.quick = quick
+        self.refined: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.done = asyncio.Event()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "triage_id": self.id,
+            "status": self.status,
+            "quick": self.quick,
+            "refined": self.refined,
+            "error": self.error,
+        }
+
+
+class RefinementStore:
+    """
+    In-flight and recently finished model refinements of quick triage answers.
+
+    `submit` runs the refinement coroutine as a background task; clients
+    poll `get` or follow `events` (used for SSE). Jobs are kept for
+    REFINEMENT_TTL seconds after creation, and at most REFINEMENT_MAX_JOBS at a time.
+
+    Jobs and their tasks live in this process only. With several uvicorn
+    workers a poll can reach a worker that never saw the triage_id and get
+    a 404, so deployments running more than one worker need sticky routing
+    on the triage_id (or the client) at the proxy.
+    """
+
+    def __init__(self, ttl: float = REFINEMENT_TTL, max_jobs: int = REFINEMENT_MAX_JOBS):
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, RefinementJob]" = OrderedDict()
+        # Strong references so running refinements aren't garbage collected
+        self._tasks: Set[asyncio.Task] = set()
+
+    def submit(self, quick: Dict[str, Any], refinement: Awaitable[Dict[str, Any]]) -> RefinementJob:
+        self._evict()
+        job = RefinementJob(quick)
+        self._jobs[job.id] = job
+        task = asyncio.get_running_loop().create_task(self._run(job, refinement))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: RefinementJob, refinement: Awaitable[Dict[str, Any]]):
+        try:
+            job.refined = await refinement
+            job.status = "refined"
+        except Exception as e:
+            logger.error(f"Triage refinement {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.done.set()
+
+    def get(self, triage_id: str) -> Optional[RefinementJob]:
+        job = self._jobs.get(triage_id)
+        if job is not None and time.monotonic() - job.created > self.ttl:
+            return None
+        return job
+
+    async def wait(self, triage_id: str, timeout: float) -> Optional[RefinementJob]:
+        """The job once refined, or as it stands after `timeout` seconds (long polling)."""
+        job = self.get(triage_id)
+        if job is not None and timeout > 0:
+            try:
+                await asyncio.wait_for(job.done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    async def events(self, job: RefinementJob, heartbeat: float = 15.0) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """("quick", ...) at once, ("ping", {}) while waiting, then ("refined" | "failed", ...)."""
+        yield "quick", job.quick
+        while not job.done.is_set():
+            try:
+                await asyncio.wait_for(job.done.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield "ping", {}
+        yield job.status, job.refined if job.status == "refined" else {"error": job.error}
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._jobs:
+            oldest = next(iter(self._jobs.values()))
+            if now - oldest.created <= self.ttl and len(self._jobs) < self.max_jobs:
+                break
+            self._jobs.popitem(last=False)
+
+    def __len__(self):
+        return len(self._jobs)
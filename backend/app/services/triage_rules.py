@@ -0,0 +1,72 @@
+from typing import Any, Dict, Optional, Tuple
+
+from .red_flags import RedFlagScan, scan_complaint
+
+
+def normalize_vitals(vitals: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Accept both vitals shapes the API sees: {"hr", "spo2", "bp_sys", ...}
+    and {"HR", "SpO2", "BP": "120/80", ...}. Keys come back lower case,
+    with "BP" split into bp_sys / bp_dia.
+    """
+    normalized = {key.lower(): value for key, value in vitals.items()}
+    bp = normalized.pop("bp", None)
+    if isinstance(bp, str) and "/" in bp:
+        systolic, diastolic = bp.split("/", 1)
+        try:
+            normalized.setdefault("bp_sys", int(systolic))
+            normalized.setdefault("bp_dia", int(diastolic))
+        except ValueError:
+            pass
+    return normalized
+
+
+# (esi_level, vital, comparison, limit): a single vital past its limit is enough for that level
+VITAL_LIMITS = (
+    (1, "spo2", "<", 90),
+    (1, "hr", ">", 130),
+    (1, "bp_sys", ">", 200),
+    (2, "hr", ">=", 100),
+    (2, "rr", ">", 22),
+    (2, "bp_sys", ">=", 160),
+)
+ESI_CONFIDENCE = {1: 0.95, 2: 0.90, 3: 0.85}
+THRESHOLD_VITALS = frozenset(vital for _, vital, _, _ in VITAL_LIMITS)
+
+_COMPARE = {"<": float.__lt__, "<=": float.__le__, ">": float.__gt__, ">=": float.__ge__}
+
+
+def vital_band(vital: str, value: Any) -> int:
+    """Most urgent ESI level this one reading calls for on its own (3 if none)."""
+    for esi_level, name, op, limit in VITAL_LIMITS:
+        if name == vital and _COMPARE[op](float(value), float(limit)):
+            return esi_level
+    return 3
+
+
+def vitals_esi(vitals: Dict[str, Any]) -> Tuple[int, float]:
+    """Vitals-only pre-score: (esi_level, confidence). ESI 1: Immediate, 2: Emergent, 3: Urgent."""
+    esi_level = min((vital_band(vital, vitals[vital]) for vital in THRESHOLD_VITALS if vitals.get(vital) is not None), default=3)
+    return esi_level, ESI_CONFIDENCE[esi_level]
+
+
+def rule_based_esi(text: str, vitals: Dict[str, Any], scan: Optional[RedFlagScan] = None) -> Tuple[int, float]:
+    """
+    Deterministic ESI estimate from vitals and red-flag complaint terms.
+    Cheap enough to run before any queueing or model call. Pass `scan`
+    when the complaint has already been run through the red-flag matcher.
+    """
+    esi_level, confidence = vitals_esi(vitals)
+
+    # Textual Overrides for High Risk Complaints (negated mentions don't count)
+    ceiling = (scan or scan_complaint(text)).esi_ceiling()
+    if ceiling is not None and esi_level > ceiling:
+        esi_level = ceiling
+        confidence = 0.92
+
+    return esi_level, confidence
+
+
+def is_emergent(text: str, vitals: Dict[str, Any]) -> bool:
+    """ESI 1-2 by the rules above."""
+    return rule_based_esi(text, vitals)[0] <= 2
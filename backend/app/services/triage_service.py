@@ -1,72 +1,121 @@
+import asyncio
 import logging
 from typing import Dict, Any, List, Optional
-from models.medgemma_loader import load_medgemma_model
 from models.preprocessing import MultimodalPreprocessor
+from ..core.metrics import stage, set_model, record_stage
+from .triage_rules import normalize_vitals, rule_based_esi
+from .red_flags import RedFlagScan, scan_complaint
+from .triage_refinement import RefinementStore
+from .inference_scheduler import InferenceScheduler, priority_from_vitals
 
 logger = logging.getLogger(__name__)
 
 class TriageService:
-    def __init__(self):
+    model_name = "google/medgemma-2b"
+
+    def __init__(self, scheduler: Optional[InferenceScheduler] = None):
+        self.scheduler = scheduler or InferenceScheduler()
+        self.refinements = RefinementStore()
         self.model = None
         self.tokenizer = None
+        self.adapters = None  # AdapterManager over the shared base model
         self.preprocessor = MultimodalPreprocessor()
         self._initialized = False
+        self._init_lock = asyncio.Lock()
+
+    async def warmup(self):
+        """Load the model ahead of the first request (see ServiceContainer)."""
+        await self._lazy_init()
 
     async def _lazy_init(self):
-        if not self._initialized:
+        if self._initialized:
+            return
+        # Concurrent first requests must not each start their own model load
+        async with self._init_lock:
+            if self._initialized:
+                return
             try:
-                # In a real scenario, this would load the fine-tuned checkpoint
-                self.model, self.tokenizer = load_medgemma_model()
+                # torch/transformers are only imported once a model is needed,
+                # keeping API startup and test collection fast.
+                from models.medgemma_loader import MedGemmaLoader
+                from models.adapter_manager import AdapterManager, discover_adapters
+
+                # One quantized base model; task LoRA adapters (triage, soap,
+                # xray) from train.py are swapped in on top of it.
+                # Loading blocks for seconds to minutes, so keep it off the event loop.
+                loader = MedGemmaLoader(model_name=self.model_name, stage_recorder=record_stage)
+                await asyncio.to_thread(loader.load_model)
+                self.adapters = AdapterManager(loader, discover_adapters())
+                if "triage" in self.adapters.adapter_paths:
+                    await asyncio.to_thread(self.adapters.ensure, ["triage"])
+                self.model, self.tokenizer = loader.model, loader.tokenizer
                 self._initialized = True
             except Exception as e:
                 logger.error(f"Failed to initialize MedGemma model: {e}")
                 # For demo purposes, we might continue with a mockup if model loading fails
                 # but in production, this should be a hard failure.
 
+    def quick_assessment(self, text_input: str, vitals: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Stage one: ESI from vitals and complaint keywords only. No model, no
+        I/O and no waiting on the scheduler, so it answers in well under a
+        millisecond however busy or cold the model is.
+        """
+        vitals = normalize_vitals(vitals)
+        scan = scan_complaint(text_input)
+        esi_level, confidence = rule_based_esi(text_input, vitals, scan)
+        return self._build_result(scan, esi_level, confidence)
+
+    async def start_triage(self, text_input: str, vitals: Dict[str, Any], image_base64: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Two-stage triage: return the rule-based answer now and run the
+        MedGemma refinement in the background. The returned `triage_id`
+        looks up (or streams) the refined result in `self.refinements`.
+        """
+        quick = self.quick_assessment(text_input, vitals)
+        job = self.refinements.submit(quick, self.process_triage(text_input, vitals, image_base64))
+        return {"triage_id": job.id, "status": job.status, **quick}
+
     async def process_triage(self, text_input: str, vitals: Dict[str, Any], image_base64: Optional[str] = None) -> Dict[str, Any]:
         """
         Processes triage input using MedGemma.
         """
         await self._lazy_init()
+        vitals = normalize_vitals(vitals)
+        scan = scan_complaint(text_input)
         
         logger.info(f"Processing triage for: {text_input[:50]}...")
+        set_model(self.model_name)
         
         # Preprocess inputs
-        processed_input = self.preprocessor.prepare_multimodal_input(text_input, vitals, image_base64)
-        
-        # Mock inference result for now, as actually running a 7B model requires GPU
-        # In actual implementation: 
-        # outputs = self.model.generate(**processed_input)
-        # response = self.tokenizer.decode(outputs[0])
-        
-        # Mocking the structured output based on MedGemma's potential output
-        # ESI 1: Immediate, 2: Emergent, 3: Urgent, 4: Less Urgent, 5: Non-Urgent
-        
-        # Logic to "simulate" ESI level based on vitals if model is not available
-        esi_level = 3
-        confidence = 0.85
-        
-        if vitals.get("spo2", 100) < 90 or vitals.get("hr", 80) > 130 or vitals.get("bp_sys", 120) > 200:
-            esi_level = 1
-            confidence = 0.95
-        elif vitals.get("hr", 80) >= 100 or vitals.get("rr", 16) > 22 or vitals.get("bp_sys", 120) >= 160:
-            esi_level = 2
-            confidence = 0.90
+        with stage("preprocess"):
+            processed_input = self.preprocessor.prepare_multimodal_input(text_input, vitals, image_base64)
         
-        # Textual Overrides for High Risk Complaints
-        if "chest pain" in text_input.lower() or "stroke" in text_input.lower() or "difficulty breathing" in text_input.lower():
-             if esi_level > 2:
-                 esi_level = 2
-                 confidence = 0.92
-
-        red_flags = ["Sepsis", "Myocardial Infarction"] if esi_level <= 2 else ["Dehydration"]
-        if "chest" in text_input.lower() or "heart" in text_input.lower():
+        # Model time is handed out by the scheduler using a vitals-only
+        # pre-score, so a hypoxic patient doesn't wait behind routine work
+        async with self.scheduler.slot(priority_from_vitals(vitals)):
+            # Mock inference result for now, as actually running a 7B model requires GPU
+            # In actual implementation: 
+            # outputs = self.model.generate(**processed_input)
+            # response = self.tokenizer.decode(outputs[0])
+
+            # Mocking the structured output based on MedGemma's potential output
+            # ESI 1: Immediate, 2: Emergent, 3: Urgent, 4: Less Urgent, 5: Non-Urgent
+
+            # Logic to "simulate" ESI level based on vitals if model is not available
+            esi_level, confidence = rule_based_esi(text_input, vitals, scan)
+
+        return self._build_result(scan, esi_level, confidence)
+
+    def _build_result(self, scan: RedFlagScan, esi_level: int, confidence: float) -> Dict[str, Any]:
+        red_flags = scan.red_flags() or (["Sepsis", "Myocardial Infarction"] if esi_level <= 2 else ["Dehydration"])
+        if scan.has("cardiac"):
             follow_up = [
                 "Does the pain radiate to your arm or jaw?",
                 "Is the pain worse with exertion or rest?",
                 "Do you have a history of heart disease?"
             ]
-        elif "abdomen" in text_input.lower() or "stomach" in text_input.lower():
+        elif scan.has("abdominal"):
             follow_up = [
                 "Is the pain constant or does it come and go?",
                 "Have you experienced any nausea or vomiting?",
@@ -0,0 +1,339 @@
+import os
+import json
+import asyncio
+import argparse
+import logging
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import column, select, table, tuple_
+
+from ..core.database import get_async_engine
+from .triage_rules import ESI_CONFIDENCE, THRESHOLD_VITALS, vital_band
+
+logger = logging.getLogger(__name__)
+
+VITALS_WINDOW_SECONDS = float(os.getenv("VITALS_WINDOW_SECONDS", "1800"))
+VITALS_BUFFER_SIZE = int(os.getenv("VITALS_BUFFER_SIZE", "64"))
+# Consecutive readings a vital must stay in a more urgent band before it escalates,
+# so a single probe artifact (finger off the oximeter) doesn't page anyone
+VITALS_CONFIRM_READINGS = int(os.getenv("VITALS_CONFIRM_READINGS", "2"))
+VITALS_POLL_INTERVAL = float(os.getenv("VITALS_POLL_INTERVAL", "2.0"))
+# Each poll re-reads this many seconds behind the newest row seen, so rows whose
+# transaction committed after a later row was already read are still picked up
+VITALS_POLL_LOOKBACK = float(os.getenv("VITALS_POLL_LOOKBACK", "30"))
+# Auto-admitted patients with no readings for this long are dropped (e.g. discharged)
+VITALS_IDLE_DISCHARGE = float(os.getenv("VITALS_IDLE_DISCHARGE", str(6 * 3600)))
+
+# Prisma `Vital.type` -> the vitals keys triage uses
+VITAL_TYPES = {
+    "HEART_RATE": "hr",
+    "BLOOD_PRESSURE": "bp_sys",
+    "SYSTOLIC_BP": "bp_sys",
+    "DIASTOLIC_BP": "bp_dia",
+    "OXYGEN_SATURATION": "spo2",
+    "SPO2": "spo2",
+    "RESPIRATORY_RATE": "rr",
+    "TEMPERATURE": "temp",
+}
+
+
+class VitalReading(NamedTuple):
+    patient_id: str
+    vital: str  # "hr", "spo2", ... (see VITAL_TYPES)
+    value: float
+    timestamp: float  # epoch seconds
+
+
+class EscalationEvent(NamedTuple):
+    patient_id: str
+    previous_esi: int
+    esi_level: int
+    confidence: float
+    vital: str
+    value: float
+    timestamp: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+class RingBuffer:
+    """Last `capacity` (timestamp, value) pairs of one vital, in two fixed C double arrays."""
+
+    __slots__ = ("_times", "_values", "_next", "_size")
+
+    def __init__(self, capacity: int = VITALS_BUFFER_SIZE):
+        self._times = array("d", bytes(8 * capacity))
+        self._values = array("d", bytes(8 * capacity))
+        self._next = 0
+        self._size = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._values)
+
+    def __len__(self):
+        return self._size
+
+    def push(self, timestamp: float, value: float):
+        self._times[self._next] = timestamp
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def latest(self) -> Optional[Tuple[float, float]]:
+        if not self._size:
+            return None
+        i = self._next - 1
+        return self._times[i], self._values[i]
+
+    def recent(self, count: Optional[int] = None, since: Optional[float] = None) -> List[Tuple[float, float]]:
+        """Newest first: at most `count` readings, none older than `since`."""
+        out = []
+        limit = self._size if count is None else min(count, self._size)
+        for k in range(1, limit + 1):
+            i = (self._next - k) % self.capacity
+            if since is not None and self._times[i] < since:
+                break
+            out.append((self._times[i], self._values[i]))
+        return out
+
+
+class PatientWatch:
+    """One waiting patient: assigned ESI, a ring buffer per vital and each vital's current band."""
+
+    __slots__ = ("patient_id", "esi_level", "buffers", "bands", "updated")
+
+    def __init__(self, patient_id: str, esi_level: int):
+        self.patient_id = patient_id
+        self.esi_level = esi_level
+        self.buffers: Dict[str, RingBuffer] = {}
+        self.bands: Dict[str, int] = {}
+        self.updated: Optional[float] = None  # newest reading (or admit) time
+
+    def vitals_esi(self) -> int:
+        return min(self.bands.values(), default=3)
+
+
+class VitalsStreamProcessor:
+    """
+    Continuous re-triage of the waiting room from a stream of vitals readings.
+
+    Each admitted patient keeps the last VITALS_BUFFER_SIZE readings per
+    vital in ring buffers. A reading only triggers an ESI recompute when it
+    moves its vital into a different threshold band (the VITAL_LIMITS
+    triage uses); everything else is a buffer write. When the vitals call
+    for a more urgent level than the patient holds, the patient is
+    escalated and an EscalationEvent is emitted. Escalation is sticky:
+    improving vitals never lower the level, a clinician re-triages with
+    `admit`. With `idle_discharge` set, patients without a reading for that
+    many seconds (by reading time) are discharged, so an auto-admitting
+    watcher doesn't hold every patient it ever saw.
+
+    Example:
+        >>> processor.admit("patient-1", esi_level=3)
+        >>> async for event in processor.run(poll_vitals_table()):
+        ...     await notify_charge_nurse(event)
+    """
+
+    def __init__(self, window_seconds: float = VITALS_WINDOW_SECONDS, capacity: int = VITALS_BUFFER_SIZE,
+                 confirm: int = VITALS_CONFIRM_READINGS, auto_admit: bool = False,
+                 idle_discharge: Optional[float] = None):
+        self.window_seconds = window_seconds
+        self.capacity = capacity
+        self.confirm = max(1, confirm)
+        self.auto_admit = auto_admit
+        self.idle_discharge = idle_discharge
+        self._next_sweep = 0.0
+        self._patients: Dict[str, PatientWatch] = {}
+        self._stats = {"readings": 0, "recomputed": 0, "escalations": 0, "ignored": 0, "discharged": 0}
+
+    def admit(self, patient_id: str, esi_level: int = 3, now: Optional[float] = None) -> PatientWatch:
+        """
+        Start (or reset, after re-triage) watching a patient at `esi_level`.
+        `now` (epoch seconds, same clock as the readings) starts the idle
+        clock; without it the first idle sweep that sees the patient does.
+        """
+        watch = self._patients.get(patient_id)
+        if watch is None:
+            watch = self._patients[patient_id] = PatientWatch(patient_id, esi_level)
+        watch.esi_level = esi_level
+        if now is not None:
+            watch.updated = now if watch.updated is None else max(watch.updated, now)
+        return watch
+
+    def discharge(self, patient_id: str):
+        self._patients.pop(patient_id, None)
+
+    def watching(self, patient_id: str) -> Optional[PatientWatch]:
+        return self._patients.get(patient_id)
+
+    def discharge_idle(self, now: float, idle_seconds: float) -> int:
+        """Discharge every patient whose newest reading is older than `now - idle_seconds`."""
+        for watch in self._patients.values():
+            if watch.updated is None:
+                watch.updated = now  # admitted without a time and no reading yet: idle from here
+        idle = [pid for pid, watch in self._patients.items() if watch.updated < now - idle_seconds]
+        for patient_id in idle:
+            del self._patients[patient_id]
+        self._stats["discharged"] += len(idle)
+        return len(idle)
+
+    def update(self, reading: VitalReading) -> Optional[EscalationEvent]:
+        self._stats["readings"] += 1
+        if self.idle_discharge is not None and reading.timestamp >= self._next_sweep:
+            # A sweep is O(patients), so run it about ten times per idle period
+            self.discharge_idle(reading.timestamp, self.idle_discharge)
+            self._next_sweep = reading.timestamp + self.idle_discharge / 10
+        watch = self._patients.get(reading.patient_id)
+        if watch is None:
+            if not self.auto_admit:
+                self._stats["ignored"] += 1
+                return None
+            watch = self.admit(reading.patient_id)
+
+        buffer = watch.buffers.get(reading.vital)
+        if buffer is None:
+            buffer = watch.buffers[reading.vital] = RingBuffer(self.capacity)
+        buffer.push(reading.timestamp, reading.value)
+        watch.updated = reading.timestamp if watch.updated is None else max(watch.updated, reading.timestamp)
+        if reading.vital not in THRESHOLD_VITALS:
+            return None
+
+        band = self._band(buffer, reading.vital, reading.timestamp)
+        if band == watch.bands.get(reading.vital, 3):
+            return None  # same band as before: the patient's ESI can't have changed
+
+        watch.bands[reading.vital] = band
+        self._stats["recomputed"] += 1
+        esi_level = watch.vitals_esi()
+        if esi_level >= watch.esi_level:
+            return None
+
+        event = EscalationEvent(
+            reading.patient_id, watch.esi_level, esi_level, ESI_CONFIDENCE[esi_level],
+            reading.vital, reading.value, reading.timestamp
+        )
+        watch.esi_level = esi_level
+        self._stats["escalations"] += 1
+        return event
+
+    def _band(self, buffer: RingBuffer, vital: str, now: float) -> int:
+        """The least urgent band across the last `confirm` readings still inside the window."""
+        bands = [vital_band(vital, value) for _, value in buffer.recent(self.confirm, since=now - self.window_seconds)]
+        if len(bands) < self.confirm:
+            bands.append(3)  # not enough recent readings to confirm anything more urgent yet
+        return max(bands)
+
+    async def run(self, readings: AsyncIterator[VitalReading]) -> AsyncIterator[EscalationEvent]:
+        """Consume `readings` until the source ends, yielding escalations as they happen."""
+        async for reading in readings:
+            event = self.update(reading)
+            if event is not None:
+                logger.warning(f"Vitals escalation: patient {event.patient_id} ESI {event.previous_esi} -> "
+                               f"{event.esi_level} ({event.vital}={event.value:g})")
+                yield event
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats, patients=len(self._patients))
+
+
+async def queue_source(queue: "asyncio.Queue[Optional[VitalReading]]") -> AsyncIterator[VitalReading]:
+    """Readings put on a local queue by device gateways or tests; `None` ends the stream."""
+    while True:
+        reading = await queue.get()
+        if reading is None:
+            return
+        yield reading
+
+
+VITAL_TABLE = table(
+    "Vital", column("id"), column("userId"), column("type"), column("value"), column("timestamp")
+)
+
+
+def _as_datetime(value: Any) -> datetime:
+    # Drivers without a column type (e.g. SQLite) hand timestamps back as text
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _epoch(value: Any) -> float:
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if isinstance(value, str):
+        return _epoch(datetime.fromisoformat(value))
+    return float(value)
+
+
+def readings_from_rows(rows: Iterable[Any]) -> List[VitalReading]:
+    """Rows of the Prisma `Vital` table as readings; types triage doesn't use are dropped."""
+    readings = []
+    for row in rows:
+        vital = VITAL_TYPES.get(str(row.type).upper())
+        if vital is not None and row.value is not None:
+            readings.append(VitalReading(row.userId, vital, float(row.value), _epoch(row.timestamp)))
+    return readings
+
+
+async def poll_vitals_table(interval: float = VITALS_POLL_INTERVAL, after: Optional[Tuple[Any, str]] = None,
+                            batch_size: int = 1000, engine=None, once: bool = False,
+                            lookback: float = VITALS_POLL_LOOKBACK) -> AsyncIterator[VitalReading]:
+    """
+    New rows of the `Vital` table, oldest first, by keyset on (timestamp, id).
+
+    Polls every `interval` seconds with short keyset queries. A row can
+    commit after a row with a later timestamp has already been read, so
+    each poll seeks back `lookback` seconds from the newest timestamp seen
+    and skips the ids it has already yielded; only rows committed more than
+    `lookback` seconds late are missed. Starts from `after` (default: now).
+    `once` stops after the backlog is drained.
+    """
+    engine = engine or get_async_engine()
+    v = VITAL_TABLE.c
+    if after is None:
+        after = (datetime.now(timezone.utc).replace(tzinfo=None), "")
+    start = (_as_datetime(after[0]), after[1])
+    newest = start[0]
+    seen: Dict[Any, datetime] = {}  # id -> timestamp of rows yielded inside the lookback window
+    cursor = start
+    while True:
+        statement = (
+            select(v.id, v.userId, v.type, v.value, v.timestamp)
+            .where(tuple_(v.timestamp, v.id) > tuple_(*cursor))
+            .order_by(v.timestamp, v.id)
+            .limit(batch_size)
+        )
+        async with engine.connect() as conn:
+            rows = (await conn.execute(statement)).all()
+        fresh = [row for row in rows if row.id not in seen]
+        for row in fresh:
+            seen[row.id] = _as_datetime(row.timestamp)
+        for reading in readings_from_rows(fresh):
+            yield reading
+        if rows:
+            cursor = (rows[-1].timestamp, rows[-1].id)
+            newest = max(newest, _as_datetime(rows[-1].timestamp))
+        if len(rows) < batch_size:
+            if once:
+                return
+            await asyncio.sleep(interval)
+            horizon = newest - timedelta(seconds=lookback)
+            seen = {row_id: ts for row_id, ts in seen.items() if ts >= horizon}
+            cursor = max((horizon, ""), start)
+
+
+async def _watch(interval: float):
+    processor = VitalsStreamProcessor(auto_admit=True, idle_discharge=VITALS_IDLE_DISCHARGE)
+    async for event in processor.run(poll_vitals_table(interval)):
+        print(json.dumps(event.to_dict()), flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch new Vital rows and print ESI escalations as JSON lines")
+    parser.add_argument("--interval", type=float, default=VITALS_POLL_INTERVAL)
+    args = parser.parse_args()
+    asyncio.run(_watch(args.interval))
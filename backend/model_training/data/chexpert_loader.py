@@ -7,8 +7,10 @@ class CheXpertLoader(Dataset):
     Loader for CheXpert style radiology reasoning tasks.
     Simulates multimodal input (Image + Text).
     """
-    def __init__(self, use_mock: bool = True):
+    def __init__(self, use_mock: bool = True, seed: int = 42):
         self.data = []
+        # Seeded so mock data (and its token cache key) is stable across runs
+        self.rng = random.Random(seed)
         if use_mock:
             self.data = self._generate_mock_data(50)
 
@@ -17,7 +19,7 @@ class CheXpertLoader(Dataset):
         
         mock_samples = []
         for i in range(num_samples):
-            condition = random.choice(conditions)
+            condition = self.rng.choice(conditions)
             
             # In real case, 'image' would be a path or tensor
             # For mock, we use a placeholder or dummy feature vector
@@ -8,8 +8,10 @@ class ESIDatasetLoader(Dataset):
     Loader for ESI Triage guidelines.
     Focuses on classification training (Urgency Level 1-5).
     """
-    def __init__(self, use_mock: bool = True):
+    def __init__(self, use_mock: bool = True, seed: int = 42):
         self.data = []
+        # Seeded so mock data (and its token cache key) is stable across runs
+        self.rng = random.Random(seed)
         if use_mock:
             self.data = self._generate_mock_data(200)
 
@@ -17,9 +19,9 @@ class ESIDatasetLoader(Dataset):
         mock_samples = []
         for i in range(num_samples):
             # Generate random vitals
-            hr = random.randint(50, 150)
-            sbp = random.randint(80, 200)
-            spo2 = random.randint(85, 100)
+            hr = self.rng.randint(50, 150)
+            sbp = self.rng.randint(80, 200)
+            spo2 = self.rng.randint(85, 100)
             
             # Simple heuristic for ground truth in mock data
             if hr > 130 or spo2 < 90:
@@ -8,8 +8,10 @@ class MIMICDatasetLoader(Dataset):
     Loader for MIMIC-IV style discharge summaries for SOAP note training.
     Includes a mock generator for pipeline verification.
     """
-    def __init__(self, use_mock: bool = True, data_path: str = None):
+    def __init__(self, use_mock: bool = True, data_path: str = None, seed: int = 42):
         self.data = []
+        # Seeded so mock data (and its token cache key) is stable across runs
+        self.rng = random.Random(seed)
         if use_mock:
             self.data = self._generate_mock_data(100)
         elif data_path:
@@ -25,15 +27,15 @@ class MIMICDatasetLoader(Dataset):
         
         mock_samples = []
         for i in range(num_samples):
-            cc = random.choice(complaints)
-            vitals = random.choice(vitals_pool)
+            cc = self.rng.choice(complaints)
+            vitals = self.rng.choice(vitals_pool)
             
             # Simulated Prompt
             prompt = f"Patient presents with {cc}. Vitals: HR {vitals['hr']}, BP {vitals['bp']}, SpO2 {vitals['spo2']}%. Generate SOAP note."
             
             # Simulated Target (SOAP Note)
             target = {
-                "subjective": f"Patient reports onset of {cc.lower()} approximately {random.randint(1, 5)} hours ago.",
+                "subjective": f"Patient reports onset of {cc.lower()} approximately {self.rng.randint(1, 5)} hours ago.",
                 "objective": f"Vitals: HR {vitals['hr']}, BP {vitals['bp']}. Exam reveals alert patient in mild distress.",
                 "assessment": f"Acute presentation of {cc}. Differential includes cardiac and respiratory causes.",
                 "plan": "Perform ECG, order CBC and Troponin. Monitor vitals."
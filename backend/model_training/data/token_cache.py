@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import socket
+import hashlib
+from typing import List, Dict, Any
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+# Bump whenever the way examples are turned into training text changes,
+# so stale token caches are never reused.
+TEMPLATE_VERSION = "1"
+
+
+def hash_records(records: List[Dict[str, Any]]) -> str:
+    """
+    Content hash of the source examples (order sensitive).
+    """
+    digest = hashlib.sha256()
+    for record in records:
+        digest.update(json.dumps(record, sort_keys=True).encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def cache_key(tokenizer, records: List[Dict[str, Any]], text_field: str, max_length: int) -> str:
+    """
+    Key a token cache by tokenizer, template version and source data hash.
+    """
+    parts = [
+        getattr(tokenizer, "name_or_path", type(tokenizer).__name__),
+        str(len(tokenizer)),
+        TEMPLATE_VERSION,
+        text_field,
+        str(max_length),
+        hash_records(records),
+    ]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()[:32]
+
+
+class TokenizedDataset(Dataset):
+    """
+    Read-only view over a memory-mapped token cache.
+
+    Token ids for all examples are stored back to back in one flat int32
+    array; `offsets[i]:offsets[i + 1]` is the slice belonging to example i.
+    Labels are left to the collator (`DataCollatorForLanguageModeling`).
+    """
+    def __init__(self, ids_path: str, offsets_path: str):
+        self.ids = np.load(ids_path, mmap_mode="r")
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        start, end = int(self.offsets[idx]), int(self.offsets[idx + 1])
+        input_ids = self.ids[start:end].tolist()
+        return {
+            "input_ids": input_ids,
+            "attention_mask": [1] * len(input_ids),
+        }
+
+
+class TokenCache:
+    """
+    Tokenize a dataset once and reuse the token ids across runs.
+
+    The first run writes `<key>.ids.npy` / `<key>.offsets.npy` under
+    `cache_dir`; later runs (and the other ranks of a multi-GPU job) open
+    them with `mmap_mode="r"` and start training immediately.
+
+    Example:
+        >>> cache = TokenCache()
+        >>> train_dataset = cache.load_or_build(tokenizer, MIMICDatasetLoader().data)
+    """
+    def __init__(self, cache_dir: str = "./cache/tokenized"):
+        self.cache_dir = cache_dir
+
+    def _paths(self, key: str):
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.ids.npy", f"{base}.offsets.npy"
+
+    def load_or_build(
+        self,
+        tokenizer,
+        records: List[Dict[str, Any]],
+        text_field: str = "instruction",
+        max_length: int = 512,
+    ) -> TokenizedDataset:
+        key = cache_key(tokenizer, records, text_field, max_length)
+        ids_path, offsets_path = self._paths(key)
+
+        if _distributed():
+            # Every rank takes part in the barrier, whether or not it saw the
+            # cache, so rank 0 is never left waiting on a rank that didn't
+            if _is_main_process() and not os.path.exists(offsets_path):
+                print(f"Token cache miss ({key}). Tokenizing {len(records)} examples...")
+                self._build(tokenizer, records, text_field, max_length, ids_path, offsets_path)
+            torch.distributed.barrier()
+        elif not os.path.exists(offsets_path):
+            if _is_main_process():
+                print(f"Token cache miss ({key}). Tokenizing {len(records)} examples...")
+                self._build(tokenizer, records, text_field, max_length, ids_path, offsets_path)
+            _wait_for_cache(offsets_path)
+        else:
+            print(f"Token cache hit ({key}).")
+
+        return TokenizedDataset(ids_path, offsets_path)
+
+    def _build(self, tokenizer, records, text_field, max_length, ids_path, offsets_path):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        texts = [record[text_field] for record in records]
+        encoded = tokenizer(texts, max_length=max_length, truncation=True)["input_ids"]
+
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(ids) for ids in encoded])
+
+        # Write to temporary files first so a crashed or concurrent build never
+        # leaves a half-written cache behind under the final name. The names are
+        # per process: LOCAL_RANK 0 on every node may build into a shared directory.
+        suffix = f"{socket.gethostname()}.{os.getpid()}.tmp.npy"
+        tmp_ids, tmp_offsets = f"{ids_path}.{suffix}", f"{offsets_path}.{suffix}"
+        ids = np.lib.format.open_memmap(tmp_ids, mode="w+", dtype=np.int32, shape=(int(offsets[-1]),))
+        for i, example_ids in enumerate(encoded):
+            ids[offsets[i]:offsets[i + 1]] = example_ids
+        ids.flush()
+        del ids
+        np.save(tmp_offsets, offsets)
+
+        # Offsets are published last: their presence marks a complete cache.
+        os.replace(tmp_ids, ids_path)
+        os.replace(tmp_offsets, offsets_path)
+
+
+def _distributed() -> bool:
+    return torch.distributed.is_available() and torch.distributed.is_initialized()
+
+
+def _is_main_process() -> bool:
+    if _distributed():
+        return torch.distributed.get_rank() == 0
+    return int(os.getenv("LOCAL_RANK", "0")) == 0
+
+
+def _wait_for_cache(offsets_path: str, poll_interval: float = 1.0):
+    """Hold non-main processes (no process group) until the main one has published the cache."""
+    while not os.path.exists(offsets_path):
+        time.sleep(poll_interval)
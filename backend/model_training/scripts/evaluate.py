@@ -1,72 +1,84 @@
 import argparse
 import json
+import os
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+import torch.multiprocessing as mp
+from transformers import AutoModelForCausalLM, AutoTokenizer
 from peft import PeftModel
 from data.mimic_loader import MIMICDatasetLoader
 from data.esi_loader import ESIDatasetLoader
+from generation_cache import GenerationCache, generate_batched, shard_prompts
 try:
     from rouge_score import rouge_scorer
     HAS_ROUGE = True
 except ImportError:
     HAS_ROUGE = False
 
-def evaluate(args):
-    # 1. Load Base Model and Adapter
-    model_id = f"google/medgemma-{args.model_size}"
+
+def load_model(model_id, adapter_path=None, device_map="auto"):
+    """Load base model (+ optional LoRA adapter) and a left-padding tokenizer."""
     tokenizer = AutoTokenizer.from_pretrained(model_id, trust_remote_code=True)
-    
+    # Left padding keeps every prompt flush against its generated tokens,
+    # so the continuation of a whole batch starts at the same column.
+    tokenizer.padding_side = "left"
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
     base_model = AutoModelForCausalLM.from_pretrained(
         model_id,
-        device_map="auto",
-        torch_dtype=torch.float16,
+        device_map=device_map,
+        torch_dtype=torch.float32 if device_map == "cpu" else torch.float16,
         trust_remote_code=True
     )
-    
-    if args.adapter_path:
-        print(f"Loading adapter from {args.adapter_path}...")
-        model = PeftModel.from_pretrained(base_model, args.adapter_path)
+
+    if adapter_path:
+        print(f"Loading adapter from {adapter_path}...")
+        model = PeftModel.from_pretrained(base_model, adapter_path)
     else:
         print("No adapter provided. Evaluating base model performance...")
         model = base_model
 
-    generator = pipeline("text-generation", model=model, tokenizer=tokenizer)
+    model.eval()
+    return model, tokenizer
+
+
+def run_generation(args, model_id, prompts, shard="main", device_map="auto"):
+    """Generate predictions for `prompts` and append them to the cache."""
+    cache = GenerationCache(args.cache_dir, model_id, args.adapter_path)
+    model, tokenizer = load_model(model_id, args.adapter_path, device_map=device_map)
+
+    with cache.writer(shard) as out:
+        for prompt, prediction in generate_batched(model, tokenizer, prompts, args.batch_size, args.max_new_tokens):
+            key = GenerationCache.sample_key(prompt, args.max_new_tokens)
+            out.write(json.dumps({"key": key, "prediction": prediction}) + "\n")
+            out.flush()
+
+
+def _shard_worker(rank, args, model_id, prompts):
+    # Split the cores evenly so shards do not oversubscribe the CPU
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // args.num_workers))
+    run_generation(args, model_id, shard_prompts(prompts, rank, args.num_workers), shard=f"shard{rank}", device_map="cpu")
 
-    # 2. Select Test Dataset
-    if args.task == "soap":
-        test_data = MIMICDatasetLoader(use_mock=True).data[:10] # Small test set
-        scorer = rouge_scorer.RougeScorer(['rouge1', 'rougeL'], use_stemmer=True) if HAS_ROUGE else None
-    elif args.task == "triage":
-        test_data = ESIDatasetLoader(use_mock=True).data[:20]
-    else:
-        print(f"Evaluation for {args.task} not yet implemented.")
-        return
 
-    # 3. Inference Loop
+def score(task, test_data, predictions):
     correct = 0
     rouge_scores = {"rouge1": [], "rougeL": []}
+    scorer = rouge_scorer.RougeScorer(['rouge1', 'rougeL'], use_stemmer=True) if task == "soap" and HAS_ROUGE else None
 
-    print(f"Running evaluation on {len(test_data)} samples...")
-    for item in test_data:
-        prompt = item["instruction"]
+    for item, prediction in zip(test_data, predictions):
         expected = item["output"]
-        
-        result = generator(prompt, max_new_tokens=100, do_sample=False)[0]['generated_text']
-        prediction = result.replace(prompt, "").strip()
-
-        if args.task == "triage":
+        if task == "triage":
             if expected.lower() in prediction.lower():
                 correct += 1
-        elif args.task == "soap" and HAS_ROUGE:
+        elif task == "soap" and scorer:
             scores = scorer.score(expected, prediction)
             rouge_scores["rouge1"].append(scores['rouge1'].fmeasure)
             rouge_scores["rougeL"].append(scores['rougeL'].fmeasure)
 
-    # 4. Report Metrics
-    if args.task == "triage":
+    if task == "triage":
         accuracy = correct / len(test_data)
         print(f"Triage Accuracy: {accuracy:.2%}")
-    elif args.task == "soap":
+    elif task == "soap":
         if HAS_ROUGE:
             avg_r1 = sum(rouge_scores["rouge1"]) / len(rouge_scores["rouge1"])
             avg_rl = sum(rouge_scores["rougeL"]) / len(rouge_scores["rougeL"])
@@ -74,13 +86,45 @@ def evaluate(args):
             print(f"ROUGE-L: {avg_rl:.4f}")
         else:
             print("rouge-score package not installed. Skipping ROUGE calculation.")
-            print(f"Sample Prediction: {prediction[:100]}...")
+            print(f"Sample Prediction: {predictions[-1][:100]}...")
+
+
+def evaluate(args):
+    # 1. Select Test Dataset
+    model_id = f"google/medgemma-{args.model_size}"
+    if args.task == "soap":
+        test_data = MIMICDatasetLoader(use_mock=True).data[:10] # Small test set
+    elif args.task == "triage":
+        test_data = ESIDatasetLoader(use_mock=True).data[:20]
+    else:
+        print(f"Evaluation for {args.task} not yet implemented.")
+        return
+
+    # 2. Generate only what is not already cached for this (model, adapter)
+    cache = GenerationCache(args.cache_dir, model_id, args.adapter_path)
+    keys = [GenerationCache.sample_key(item["instruction"], args.max_new_tokens) for item in test_data]
+    missing = list(dict.fromkeys(item["instruction"] for item, key in zip(test_data, keys) if cache.get(key) is None))
+
+    print(f"Running evaluation on {len(test_data)} samples ({len(test_data) - len(missing)} cached)...")
+    if missing:
+        if args.num_workers > 1:
+            mp.spawn(_shard_worker, args=(args, model_id, missing), nprocs=args.num_workers, join=True)
+        else:
+            run_generation(args, model_id, missing)
+        cache.reload()
+
+    # 3. Report Metrics
+    score(args.task, test_data, [cache.get(key) for key in keys])
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="MedGemma Evaluation Script")
     parser.add_argument("--task", type=str, default="soap", choices=["soap", "triage"])
     parser.add_argument("--model_size", type=str, default="2b")
     parser.add_argument("--adapter_path", type=str, help="Path to trained LoRA adapter")
-    
+    parser.add_argument("--batch_size", type=int, default=8, help="Prompts per generate() call")
+    parser.add_argument("--max_new_tokens", type=int, default=100)
+    parser.add_argument("--num_workers", type=int, default=1, help="CPU processes for a sharded run (1 = single process, model on device_map=auto)")
+    parser.add_argument("--cache_dir", type=str, default="./cache/eval_outputs", help="Directory for cached predictions")
+
     args = parser.parse_args()
     evaluate(args)
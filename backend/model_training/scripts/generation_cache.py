@@ -0,0 +1,93 @@
+import glob
+import hashlib
+import json
+import os
+import torch
+
+
+class GenerationCache:
+    """
+    Append-only JSONL cache of model predictions.
+
+    Predictions live under `<cache_dir>/<model key>/`, where the model key
+    covers the base model and the adapter weights, and each entry is keyed by
+    prompt + generation settings. Re-scoring with new metrics only reads
+    this cache; shard workers each append to their own file.
+    """
+    def __init__(self, cache_dir, model_id, adapter_path=None):
+        self.dir = os.path.join(cache_dir, self._model_key(model_id, adapter_path))
+        os.makedirs(self.dir, exist_ok=True)
+        self.entries = {}
+        self.reload()
+
+    @staticmethod
+    def _model_key(model_id, adapter_path):
+        digest = hashlib.sha256(model_id.encode())
+        if adapter_path:
+            # Adapter identity = its files' names, sizes and mtimes, so a
+            # retrained adapter at the same path does not reuse old outputs.
+            for path in sorted(glob.glob(os.path.join(adapter_path, "*"))):
+                stat = os.stat(path)
+                digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return digest.hexdigest()[:16]
+
+    @staticmethod
+    def sample_key(prompt, max_new_tokens):
+        return hashlib.sha256(f"{max_new_tokens}|greedy|{prompt}".encode()).hexdigest()
+
+    def reload(self):
+        for path in glob.glob(os.path.join(self.dir, "*.jsonl")):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Half-written line from a worker that crashed mid-write:
+                        # that prediction is simply regenerated
+                        continue
+                    self.entries[entry["key"]] = entry["prediction"]
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def writer(self, shard="main"):
+        path = os.path.join(self.dir, f"{shard}.jsonl")
+        out = open(path, "a")
+        if out.tell():
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    out.write("\n")  # don't glue the next entry onto a crashed run's partial line
+        return out
+
+
+def shard_prompts(prompts, rank, num_workers):
+    """Every `num_workers`-th prompt starting at `rank`, so shards are disjoint and cover all prompts."""
+    return prompts[rank::num_workers]
+
+
+def generate_batched(model, tokenizer, prompts, batch_size=8, max_new_tokens=100):
+    """
+    Greedy batched generation with the KV cache enabled.
+
+    Prompts are length-sorted before batching to minimise padding; yields
+    (prompt, prediction) pairs batch by batch.
+    """
+    ordered = sorted(prompts, key=len, reverse=True)
+    for start in range(0, len(ordered), batch_size):
+        batch = ordered[start:start + batch_size]
+        inputs = tokenizer(batch, return_tensors="pt", padding=True).to(model.device)
+
+        with torch.inference_mode():
+            outputs = model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                do_sample=False,
+                use_cache=True,
+                pad_token_id=tokenizer.pad_token_id
+            )
+
+        # Strip the prompt by position instead of string replacement
+        completions = tokenizer.batch_decode(outputs[:, inputs.input_ids.shape[1]:], skip_special_tokens=True)
+        for prompt, completion in zip(batch, completions):
+            yield prompt, completion.strip()
@@ -6,6 +6,7 @@ from transformers import (
     AutoTokenizer,
     BitsAndBytesConfig,
     TrainingArguments,
+    DataCollatorForLanguageModeling,
     pipeline,
     logging,
 )
@@ -14,6 +15,7 @@ from trl import SFTTrainer
 from data.mimic_loader import MIMICDatasetLoader
 from data.chexpert_loader import CheXpertLoader
 from data.esi_loader import ESIDatasetLoader
+from data.token_cache import TokenCache
 
 def train(args):
     # 1. Load Data
@@ -26,6 +28,16 @@ def train(args):
     else:
         raise ValueError(f"Unknown task: {args.task}")
 
+    model_id = f"google/medgemma-{args.model_size}"
+    tokenizer = AutoTokenizer.from_pretrained(model_id, trust_remote_code=True)
+    tokenizer.pad_token = tokenizer.eos_token
+
+    # Tokenize once per (tokenizer, template version, data hash); repeated
+    # experiments and the other ranks reuse the memory-mapped token ids.
+    train_dataset = TokenCache(args.token_cache_dir).load_or_build(
+        tokenizer, dataset, text_field="instruction", max_length=512
+    )
+
     # 2. Config Quantization (NF4)
     bnb_config = BitsAndBytesConfig(
         load_in_4bit=True,
@@ -34,8 +46,7 @@ def train(args):
         bnb_4bit_use_double_quant=True,
     )
 
-    # 3. Load Model & Tokenizer
-    model_id = f"google/medgemma-{args.model_size}"
+    # 3. Load Model
     model = AutoModelForCausalLM.from_pretrained(
         model_id,
         quantization_config=bnb_config,
@@ -45,9 +56,6 @@ def train(args):
     model.config.use_cache = False
     model = prepare_model_for_kbit_training(model)
 
-    tokenizer = AutoTokenizer.from_pretrained(model_id, trust_remote_code=True)
-    tokenizer.pad_token = tokenizer.eos_token
-
     # 4. LoRA Config
     peft_config = LoraConfig(
         r=args.lora_r,
@@ -83,12 +91,14 @@ def train(args):
     # 6. SFT Trainer
     trainer = SFTTrainer(
         model=model,
-        train_dataset=dataset,
+        train_dataset=train_dataset,
         peft_config=peft_config,
-        dataset_text_field="instruction", # Instruction-tuning format
         max_seq_length=512,
         tokenizer=tokenizer,
         args=training_args,
+        # Dataset is already tokenized by TokenCache; only pad per batch
+        data_collator=DataCollatorForLanguageModeling(tokenizer, mlm=False),
+        dataset_kwargs={"skip_prepare_dataset": True},
     )
 
     # 7. Start Training
@@ -107,6 +117,7 @@ if __name__ == "__main__":
     parser.add_argument("--epochs", type=int, default=3, help="Number of training epochs")
     parser.add_argument("--lora_r", type=int, default=16, help="LoRA R parameter")
     parser.add_argument("--lora_alpha", type=int, default=32, help="LoRA Alpha parameter")
+    parser.add_argument("--token_cache_dir", type=str, default="./cache/tokenized", help="Directory for pre-tokenized dataset cache")
     
     args = parser.parse_args()
     train(args)
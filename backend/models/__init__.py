@@ -1,4 +1,3 @@
-from .medgemma_loader import MedGemmaLoader
 from .config import MedGemmaConfig, GenerationConfig
 from .exceptions import MedGemmaError, ModelLoadError, InferenceError
 
@@ -10,3 +9,11 @@ __all__ = [
     "ModelLoadError", 
     "InferenceError"
 ]
+
+def __getattr__(name):
+    # MedGemmaLoader pulls in torch/transformers, so only import it on first use.
+    # Importing light submodules (e.g. models.preprocessing) stays cheap.
+    if name == "MedGemmaLoader":
+        from .medgemma_loader import MedGemmaLoader
+        return MedGemmaLoader
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
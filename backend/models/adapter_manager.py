@@ -0,0 +1,172 @@
+import os
+import re
+import glob
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .exceptions import ModelLoadError
+
+logger = logging.getLogger(__name__)
+
+# peft's name for "no adapter" rows in a mixed-adapter batch
+BASE_ADAPTER = "__base__"
+
+
+def discover_adapters(root: Optional[str] = None) -> Dict[str, str]:
+    """
+    Map task name -> adapter directory.
+
+    MEDGEMMA_ADAPTERS ("soap=/path/a,triage=/path/b") wins; otherwise
+    `medgemma-<task>-lora` directories written by train.py are picked up
+    from MEDGEMMA_ADAPTER_DIR (default: current directory).
+    """
+    configured = os.getenv("MEDGEMMA_ADAPTERS")
+    if configured:
+        return dict(item.split("=", 1) for item in configured.split(",") if "=" in item)
+
+    root = root or os.getenv("MEDGEMMA_ADAPTER_DIR", ".")
+    adapters = {}
+    for path in sorted(glob.glob(os.path.join(root, "medgemma-*-lora"))):
+        match = re.fullmatch(r"medgemma-(.+)-lora", os.path.basename(path))
+        if match and os.path.isdir(path):
+            adapters[match.group(1)] = path
+    return adapters
+
+
+class AdapterManager:
+    """
+    One quantized base model kept resident, with task LoRA adapters
+    (soap, triage, xray, ...) loaded on top of it on demand.
+
+    At most `max_resident` adapters are held at once; loading another
+    evicts the least recently used one. Since adapters are a few MB next to
+    a multi-GB base, three task models cost roughly the memory of one.
+    `generate_mixed` serves a batch whose rows use different adapters in a
+    single forward pass (peft `adapter_names=`).
+
+    Example:
+        >>> manager = AdapterManager(loader, discover_adapters())
+        >>> manager.generate("triage", prompt)["generated_text"]
+    """
+
+    def __init__(self, loader, adapter_paths: Dict[str, str], max_resident: int = 2):
+        if max_resident < 1:
+            raise ValueError("max_resident must be at least 1")
+        self.loader = loader
+        self.adapter_paths = dict(adapter_paths)
+        self.max_resident = max_resident
+        self.resident: "OrderedDict[str, None]" = OrderedDict()
+        self.loads = 0
+        self.evictions = 0
+        # set_adapter/delete_adapter mutate the shared model; one generation at a time
+        self._lock = threading.RLock()
+
+    @property
+    def model(self):
+        return self.loader.model
+
+    def _load(self, task: str):
+        path = self.adapter_paths.get(task)
+        if path is None:
+            raise ValueError(f"No LoRA adapter configured for task '{task}'")
+        logger.info(f"Loading LoRA adapter '{task}' from {path}")
+        if not hasattr(self.model, "load_adapter") or not hasattr(self.model, "peft_config"):
+            # First adapter: wrap the resident base model once
+            try:
+                from peft import PeftModel
+            except ImportError as e:
+                raise ModelLoadError(f"peft is required for LoRA adapters: {e}")
+            self.loader.model = PeftModel.from_pretrained(self.model, path, adapter_name=task, is_trainable=False)
+        else:
+            self.model.load_adapter(path, adapter_name=task, is_trainable=False)
+        self.loads += 1
+
+    def _evict(self, task: str):
+        logger.info(f"Evicting LoRA adapter '{task}'")
+        delete = getattr(self.model, "delete_adapter", None) or self.model.base_model.delete_adapter
+        delete(task)
+        self.evictions += 1
+
+    def ensure(self, tasks: List[str]):
+        """Make every task's adapter resident, evicting LRU adapters not in `tasks`."""
+        wanted = list(dict.fromkeys(t for t in tasks if t is not None))
+        if len(wanted) > self.max_resident:
+            raise ValueError(f"{len(wanted)} adapters requested but max_resident is {self.max_resident}")
+        with self._lock:
+            for task in wanted:
+                if task in self.resident:
+                    self.resident.move_to_end(task)
+                    continue
+                self._load(task)
+                self.resident[task] = None
+            while len(self.resident) > self.max_resident:
+                victim = next(t for t in self.resident if t not in wanted)
+                del self.resident[victim]
+                self._evict(victim)
+
+    def generate(self, task: Optional[str], prompt, **kwargs) -> dict:
+        """Generate with one task's adapter active; `task=None` uses the bare base model."""
+        with self._lock:
+            if task is None and self.resident:
+                with self.model.disable_adapter():
+                    result = self.loader.generate_text(prompt, **kwargs)
+            elif task is None:
+                result = self.loader.generate_text(prompt, **kwargs)
+            else:
+                self.ensure([task])
+                self.model.set_adapter(task)
+                result = self.loader.generate_text(prompt, **kwargs)
+        result["adapter"] = task
+        return result
+
+    def generate_mixed(self, requests: List[Tuple[Optional[str], object]], **kwargs) -> List[dict]:
+        """
+        Batched inference over (task, prompt) pairs with different adapters.
+        Rows are grouped into chunks of at most `max_resident` distinct
+        adapters; each chunk is a single generate call.
+        """
+        results: List[Optional[dict]] = [None] * len(requests)
+        for indices in self._chunks(requests):
+            tasks = [requests[i][0] for i in indices]
+            prompts = [requests[i][1] for i in indices]
+            with self._lock:
+                self.ensure(tasks)
+                if self.resident:
+                    adapter_kwargs = {"adapter_names": [task or BASE_ADAPTER for task in tasks]}
+                else:
+                    # Base-only batch before any adapter was loaded: plain model
+                    adapter_kwargs = {}
+                outputs = self.loader.generate_batch(prompts, **adapter_kwargs, **kwargs)
+            for i, task, output in zip(indices, tasks, outputs):
+                output["adapter"] = task
+                results[i] = output
+        return results
+
+    def _chunks(self, requests) -> List[List[int]]:
+        # Keep rows of the same task together and resident adapters first,
+        # so a mixed batch triggers as few loads as possible
+        by_task: "OrderedDict[Optional[str], List[int]]" = OrderedDict()
+        for i, (task, _) in enumerate(requests):
+            by_task.setdefault(task, []).append(i)
+        order = sorted(by_task, key=lambda t: t is not None and t not in self.resident)
+        chunks, current, current_tasks = [], [], set()
+        for task in order:
+            if task is not None and task not in current_tasks and len(current_tasks) == self.max_resident:
+                chunks.append(current)
+                current, current_tasks = [], set()
+            current.extend(by_task[task])
+            if task is not None:
+                current_tasks.add(task)
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def stats(self) -> dict:
+        return {
+            "resident": list(self.resident),
+            "available": sorted(self.adapter_paths),
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
@@ -12,6 +12,11 @@ class MedGemmaConfig:
     load_in_8bit: bool = False
     load_in_4bit: bool = True
     trust_remote_code: bool = True
+    # Generation memory budget for KV caches; None derives it from what is
+    # free after the model loads, times memory_fraction
+    memory_budget_gb: Optional[float] = None
+    memory_fraction: float = 0.9
+    admission_timeout: float = 30.0
     
 @dataclass
 class GenerationConfig:
@@ -3,7 +3,7 @@ import time
 import torch
 import psutil
 import logging
-from typing import Optional, Dict, Union, Any, List
+from typing import Callable, Optional, Dict, Union, Any, List
 from PIL import Image
 
 try:
@@ -24,9 +24,32 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from utils.logger import setup_logger
 from .config import MedGemmaConfig
 from .exceptions import ModelLoadError, InferenceError, InsufficientMemoryError
+from .prompt_templates import PROMPTS, format_context
+from .tokenization import TokenizerFastPath, Prompt
+from .memory_governor import MemoryGovernor, kv_bytes_per_token
 
 logger = setup_logger("medgemma_loader")
 
+
+class _FirstTokenTimer:
+    """
+    Minimal `generate()` streamer that notes when the first new token is
+    produced, splitting model time into prefill and decode.
+    """
+
+    def __init__(self):
+        self._puts = 0
+        self.first_token_at: Optional[float] = None
+
+    def put(self, value):
+        # The first put() carries the prompt, the second the first new token
+        self._puts += 1
+        if self._puts == 2:
+            self.first_token_at = time.time()
+
+    def end(self):
+        pass
+
 class MedGemmaLoader:
     """
     Production-ready loader for MedGemma models with quantization support.
@@ -56,8 +79,14 @@ class MedGemmaLoader:
         max_length: int = 2048,
         load_in_8bit: bool = False,
         load_in_4bit: bool = True,
+        stage_recorder: Optional[Callable[[str, float], None]] = None,
     ):
-        """Initialize the model loader with configuration."""
+        """
+        Initialize the model loader with configuration.
+
+        `stage_recorder(stage, seconds)` receives the tokenization / prefill /
+        decode split of every generate call (the API passes metrics.record_stage).
+        """
         self.config = MedGemmaConfig(
             model_name=model_name,
             quantization=quantization,
@@ -70,7 +99,11 @@ class MedGemmaLoader:
         self.model = None
         self.tokenizer = None
         self.processor = None  # For multimodal
+        self._tokenization = None
+        self._model_metadata: Optional[Dict[str, Any]] = None
+        self.governor: Optional[MemoryGovernor] = None
         self.device_map = None
+        self.stage_recorder = stage_recorder
         
         # Override booleans if string quantization is explicit
         if quantization == "4bit":
@@ -191,11 +224,15 @@ class MedGemmaLoader:
             
             logger.info(f"Model loaded in {time.time() - start_time:.2f}s")
             self._log_memory_usage()
+            self._model_metadata = self._collect_model_metadata()
+            self.governor = self._build_governor()
+            logger.info(f"Generation memory budget: {self.governor.stats()['budget_gb']}GB")
             
             # Warmup
             logger.info("Warming up model...")
             dummy_input = "Hello, doctor."
-            inputs = self.tokenizer(dummy_input, return_tensors="pt").to(self.model.device)
+            inputs = self.tokenizer(dummy_input, return_tensors="pt")
+            inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
             with torch.no_grad():
                 self.model.generate(**inputs, max_new_tokens=10)
             logger.info("Warmup complete.")
@@ -208,9 +245,16 @@ class MedGemmaLoader:
             logger.error(f"Failed to load model: {e}")
             raise ModelLoadError(f"Failed to load model: {e}")
 
+    @property
+    def tokenization(self) -> TokenizerFastPath:
+        """Caching/batching tokenizer layer, rebuilt whenever the tokenizer changes."""
+        if self._tokenization is None or self._tokenization.tokenizer is not self.tokenizer:
+            self._tokenization = TokenizerFastPath(self.tokenizer)
+        return self._tokenization
+
     def generate_text(
         self,
-        prompt: str,
+        prompt: Prompt,
         max_new_tokens: int = 512,
         temperature: float = 0.7,
         top_p: float = 0.9,
@@ -220,7 +264,8 @@ class MedGemmaLoader:
         Generate text completion from prompt.
         
         Args:
-            prompt: Input text prompt
+            prompt: Input text prompt, token ids (e.g. from encode_medical_prompt),
+                or a list of text segments whose encodings are cached
             max_new_tokens: Maximum tokens to generate
             temperature: Sampling temperature
             top_p: Nucleus sampling parameter
@@ -230,43 +275,153 @@ class MedGemmaLoader:
             dict with:
                 - generated_text: The completion
                 - tokens_used: Number of tokens
-                - generation_time: Time taken in seconds
+                - generation_time: Total time taken in seconds
+                - tokenization_time: Encode + decode time in seconds
+                - model_time: Time spent in model.generate
+                - prefill_time / decode_time: model_time split at the first new token
                 - model_info: Model metadata
         """
         if self.model is None:
             raise ModelLoadError("Model is not loaded. Call load_model() first.")
             
         start_time = time.time()
+        first_token = _FirstTokenTimer()
         
         try:
-            inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
-            input_length = inputs.input_ids.shape[1]
+            if isinstance(prompt, str):
+                inputs = self.tokenizer(prompt, return_tensors="pt")
+                inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
+            else:
+                input_ids = torch.tensor([self.tokenization.to_ids(prompt)], device=self.model.device)
+                inputs = {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+            input_length = inputs["input_ids"].shape[1]
+            encode_time = time.time() - start_time
             
-            with torch.no_grad():
+            with self._reserve_memory(input_length, max_new_tokens), torch.no_grad():
+                model_start = time.time()
                 outputs = self.model.generate(
                     **inputs,
                     max_new_tokens=max_new_tokens,
                     temperature=temperature,
                     top_p=top_p,
                     do_sample=do_sample,
-                    pad_token_id=self.tokenizer.eos_token_id
+                    pad_token_id=self.tokenizer.eos_token_id,
+                    streamer=first_token
                 )
+            model_time = time.time() - model_start
+            prefill_time = (first_token.first_token_at or time.time()) - model_start
             
+            decode_start = time.time()
             generated_text = self.tokenizer.decode(outputs[0][input_length:], skip_special_tokens=True)
+            decode_time = time.time() - decode_start
             total_time = time.time() - start_time
             tokens_generated = outputs.shape[1] - input_length
+            self._record_stages(tokenization=encode_time + decode_time, prefill=prefill_time,
+                                decode=model_time - prefill_time)
             
             return {
                 "generated_text": generated_text,
                 "tokens_used": tokens_generated,
                 "generation_time": total_time,
+                "tokenization_time": encode_time + decode_time,
+                "model_time": model_time,
+                "prefill_time": prefill_time,
+                "decode_time": model_time - prefill_time,
                 "model_info": self.get_model_info()
             }
             
+        except InsufficientMemoryError:
+            raise
         except Exception as e:
             logger.error(f"Inference failed: {e}")
             raise InferenceError(f"Inference failed: {e}")
 
+    def generate_batch(
+        self,
+        prompts: List[Prompt],
+        max_new_tokens: int = 512,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        do_sample: bool = True,
+        **generate_kwargs
+    ) -> List[dict]:
+        """
+        Generate completions for several prompts with one batched encode,
+        one `model.generate` call and one batched decode.
+
+        Extra keyword arguments go to `model.generate` (e.g. per-row
+        `adapter_names` from AdapterManager). Timings are for the whole
+        batch and repeated on every result.
+        """
+        if self.model is None:
+            raise ModelLoadError("Model is not loaded. Call load_model() first.")
+        if not prompts:
+            return []
+
+        start_time = time.time()
+
+        try:
+            input_ids, attention_mask = self.tokenization.batch_encode(prompts, device=self.model.device)
+            input_length = input_ids.shape[1]
+            encode_time = time.time() - start_time
+            # Gemma's pad id is 0, which batch_encode pads with; only fall back to eos when there is none
+            pad_token_id = self.tokenizer.pad_token_id
+            if pad_token_id is None:
+                pad_token_id = self.tokenizer.eos_token_id
+
+            with self._reserve_memory(input_length, max_new_tokens, len(prompts)), torch.no_grad():
+                model_start = time.time()
+                outputs = self.model.generate(
+                    input_ids=input_ids,
+                    attention_mask=attention_mask,
+                    max_new_tokens=max_new_tokens,
+                    temperature=temperature,
+                    top_p=top_p,
+                    do_sample=do_sample,
+                    pad_token_id=pad_token_id,
+                    **generate_kwargs
+                )
+            model_time = time.time() - model_start
+
+            decode_start = time.time()
+            completions = outputs[:, input_length:]
+            texts = self.tokenization.batch_decode(completions)
+            decode_time = time.time() - decode_start
+            total_time = time.time() - start_time
+
+            # One generate() for the whole batch: no per-row prefill/decode split
+            self._record_stages(tokenization=encode_time + decode_time, model=model_time)
+
+            # Finished rows are padded out to the longest one; count each row up to its first eos
+            eos = self.tokenizer.eos_token_id
+            model_info = self.get_model_info()
+            return [
+                {
+                    "generated_text": text,
+                    "tokens_used": self._generated_length(row, eos),
+                    "generation_time": total_time,
+                    "tokenization_time": encode_time + decode_time,
+                    "model_time": model_time,
+                    "model_info": model_info
+                }
+                for text, row in zip(texts, completions)
+            ]
+
+        except InsufficientMemoryError:
+            raise
+        except Exception as e:
+            logger.error(f"Batch inference failed: {e}")
+            raise InferenceError(f"Batch inference failed: {e}")
+
+    @staticmethod
+    def _generated_length(row: torch.Tensor, eos_token_id: Optional[int]) -> int:
+        """Tokens generated in one row of a batch, including the eos that ended it."""
+        if eos_token_id is not None:
+            ends = (row == eos_token_id).nonzero()
+            if len(ends):
+                return int(ends[0]) + 1
+        return int(row.numel())
+
     def generate_multimodal(
         self,
         text: str,
@@ -321,6 +476,42 @@ class MedGemmaLoader:
             logger.error(f"Multimodal inference failed: {e}")
             raise InferenceError(f"Multimodal inference failed: {e}")
 
+    def _collect_model_metadata(self) -> Dict[str, Any]:
+        """Static facts about the loaded model, computed once at load."""
+        dtype_bytes = getattr(getattr(self.model, "dtype", None), "itemsize", 2)
+        if not isinstance(dtype_bytes, int):
+            dtype_bytes = 2
+        return {
+            "parameters": f"{sum(p.numel() for p in self.model.parameters())/1e9:.1f}B",
+            "device": str(self.model.device),
+            "kv_bytes_per_token": kv_bytes_per_token(getattr(self.model, "config", None), dtype_bytes),
+        }
+
+    def _build_governor(self) -> MemoryGovernor:
+        if self.config.memory_budget_gb is not None:
+            budget = self.config.memory_budget_gb * 1e9
+        elif torch.cuda.is_available() and self.device_map != "cpu":
+            free, _ = torch.cuda.mem_get_info()
+            budget = free * self.config.memory_fraction
+        else:
+            budget = psutil.virtual_memory().available * self.config.memory_fraction
+        return MemoryGovernor(
+            budget,
+            bytes_per_token=self._model_metadata["kv_bytes_per_token"],
+            timeout=self.config.admission_timeout
+        )
+
+    def _record_stages(self, **seconds: float):
+        if self.stage_recorder is not None:
+            for stage_name, value in seconds.items():
+                self.stage_recorder(stage_name, value)
+
+    def _reserve_memory(self, prompt_tokens: int, max_new_tokens: int, batch_size: int = 1):
+        if self.governor is None:
+            # Model objects attached without load_model(): nothing to account against
+            self.governor = MemoryGovernor(float("inf"))
+        return self.governor.reserve(self.governor.estimate(prompt_tokens, max_new_tokens, batch_size))
+
     def get_model_info(self) -> dict:
         """
         Get detailed model information.
@@ -330,6 +521,8 @@ class MedGemmaLoader:
         """
         if self.model is None:
             return {"loaded": False}
+        if self._model_metadata is None:
+            self._model_metadata = self._collect_model_metadata()
         
         ram = psutil.virtual_memory()  
         
@@ -344,10 +537,11 @@ class MedGemmaLoader:
 
         return {
             "model_name": self.config.model_name,
-            "parameters": f"{sum(p.numel() for p in self.model.parameters())/1e9:.1f}B",
+            "parameters": self._model_metadata["parameters"],
             "quantization": self.config.quantization,
-            "device": str(self.model.device),
+            "device": self._model_metadata["device"],
             "memory_usage": mem_info,
+            "generation_budget": self.governor.stats() if self.governor else None,
             "max_length": self.config.max_length,
             "loaded": True
         }
@@ -364,54 +558,39 @@ class MedGemmaLoader:
         if self.processor:
             del self.processor
             self.processor = None
+        self._tokenization = None
+        self._model_metadata = None
+        self.governor = None
             
         torch.cuda.empty_cache()
         logger.info("Model unloaded.")
 
     @staticmethod
     def format_medical_prompt(
-        task: str,  # "triage", "documentation", "diagnosis"
+        task: str,  # "triage", "documentation"
         context: Dict[str, Any],
     ) -> str:
         """
         Format prompts for medical tasks following MedGemma best practices.
         
-        Templates:
-        - Triage: "As an ER triage nurse, analyze..."
-        - Documentation: "Generate a SOAP note for..."
-        - Diagnosis: "Based on the following clinical presentation..."
+        Templates live in `prompt_templates.PROMPTS`:
+        - Triage: "You are an experienced ER triage nurse..."
+        - Documentation: "Generate a structured SOAP note from..."
         """
-        
-        templates = {
-            "triage": """You are an experienced ER triage nurse. Analyze the following patient presentation and provide:
-1. ESI urgency level (1-5)
-2. Red-flag conditions to consider
-3. Recommended next steps
-
-Patient Information:
-{context}
-
-Respond in JSON format.""",
-            
-            "documentation": """Generate a structured SOAP note from the following clinical encounter:
+        return PROMPTS.get(task).render(context=format_context(context))
 
-{context}
-
-Format as:
-Subjective: 
-Objective:
-Assessment:
-Plan:""",
-        }
-        
-        # Simple context formatting: if context is dict, convert to pretty string, else use as is
-        ctx_str = ""
-        if isinstance(context, dict):
-             ctx_str = "\\n".join([f"{k}: {v}" for k, v in context.items()])
-        else:
-             ctx_str = str(context)
-             
-        return template.format(context=ctx_str)
+    def encode_medical_prompt(self, task: str, context: Dict[str, Any]) -> List[int]:
+        """
+        Token ids for a medical prompt. Only the context is tokenized; the
+        template's fixed text is tokenized once and cached.
+        """
+        if self.tokenizer is None:
+            raise ModelLoadError("Model is not loaded. Call load_model() first.")
+        # Context lines (vitals, complaint) repeat across patients, so they are
+        # cached line by line in the fast path
+        return PROMPTS.get(task).encode(
+            self.tokenizer, encode_value=self.tokenization.encode_lines, context=format_context(context)
+        )
 
 def load_medgemma_model(
     model_name: str = "google/medgemma-2b",
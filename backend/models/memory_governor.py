@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from .exceptions import InsufficientMemoryError
+
+# Gemma-2B style fallback when the model config can't be read:
+# 2 (K and V) * 18 layers * 1 KV head * 256 head dim * 2 bytes (bf16)
+DEFAULT_KV_BYTES_PER_TOKEN = 2 * 18 * 1 * 256 * 2
+# Activations, logits and allocator slack on top of the KV cache
+ACTIVATION_OVERHEAD = 1.2
+
+
+def kv_bytes_per_token(model_config, dtype_bytes: int = 2) -> int:
+    """KV-cache bytes one token costs: 2 (K, V) * layers * KV heads * head dim * dtype size."""
+    layers = getattr(model_config, "num_hidden_layers", None)
+    heads = getattr(model_config, "num_attention_heads", None)
+    kv_heads = getattr(model_config, "num_key_value_heads", None) or heads
+    head_dim = getattr(model_config, "head_dim", None)
+    hidden = getattr(model_config, "hidden_size", None)
+    if not isinstance(head_dim, int) and isinstance(hidden, int) and isinstance(heads, int) and heads:
+        head_dim = hidden // heads
+    if not all(isinstance(v, int) and v > 0 for v in (layers, kv_heads, head_dim)):
+        return DEFAULT_KV_BYTES_PER_TOKEN
+    return 2 * layers * kv_heads * head_dim * dtype_bytes
+
+
+class MemoryGovernor:
+    """
+    Budget-based admission control for generation requests.
+
+    Each request reserves its estimated KV-cache cost (prompt length plus
+    `max_new_tokens`) before running and releases it afterwards. Requests
+    that don't fit wait in FIFO order until enough is released or
+    `timeout` expires. A request that could never fit is rejected at once.
+    Either way InsufficientMemoryError is raised before the allocation,
+    instead of a CUDA OOM during it.
+    """
+
+    def __init__(self, budget_bytes: int, bytes_per_token: int = DEFAULT_KV_BYTES_PER_TOKEN, timeout: Optional[float] = 30.0):
+        self.budget_bytes = int(budget_bytes)
+        self.bytes_per_token = bytes_per_token
+        self.timeout = timeout
+        self.in_use = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._waiters = deque()
+        self._cond = threading.Condition()
+
+    def estimate(self, prompt_tokens: int, max_new_tokens: int, batch_size: int = 1) -> int:
+        return int((prompt_tokens + max_new_tokens) * batch_size * self.bytes_per_token * ACTIVATION_OVERHEAD)
+
+    def acquire(self, cost: int, timeout: Optional[float] = None):
+        timeout = self.timeout if timeout is None else timeout
+        with self._cond:
+            if cost > self.budget_bytes:
+                self.rejected += 1
+                raise InsufficientMemoryError(
+                    f"Request needs ~{cost / 1e9:.2f}GB, more than the {self.budget_bytes / 1e9:.2f}GB generation budget."
+                )
+            ticket = object()
+            self._waiters.append(ticket)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            try:
+                # Only the head of the queue may take memory, so a large request
+                # isn't starved by a stream of small ones
+                while self._waiters[0] is not ticket or self.in_use + cost > self.budget_bytes:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self.rejected += 1
+                        raise InsufficientMemoryError("Timed out waiting for generation memory budget.")
+                    self._cond.wait(remaining)
+                self.in_use += cost
+                self.admitted += 1
+            finally:
+                self._waiters.remove(ticket)
+                self._cond.notify_all()
+
+    def release(self, cost: int):
+        with self._cond:
+            self.in_use = max(0, self.in_use - cost)
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self, cost: int, timeout: Optional[float] = None):
+        self.acquire(cost, timeout)
+        try:
+            yield
+        finally:
+            self.release(cost)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "budget_gb": round(self.budget_bytes / 1e9, 3),
+                "in_use_gb": round(self.in_use / 1e9, 3),
+                "waiting": len(self._waiters),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
@@ -1,7 +1,9 @@
 import base64
 import io
-from PIL import Image
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
 
 class MultimodalPreprocessor:
     """
@@ -10,7 +12,7 @@ class MultimodalPreprocessor:
     """
     
     @staticmethod
-    def process_image(image_base64: Optional[str]) -> Optional[Image.Image]:
+    def process_image(image_base64: Optional[str]) -> Optional["Image.Image"]:
         """
         Convert base64 string to PIL Image.
         
@@ -22,7 +24,10 @@ class MultimodalPreprocessor:
         """
         if not image_base64:
             return None
-            
+
+        # Imported here so text-only requests never load PIL
+        from PIL import Image
+
         try:
             # Remove data URI prefix if present
             if "base64," in image_base64:
@@ -0,0 +1,152 @@
+import hashlib
+import threading
+from string import Formatter
+from typing import Dict, List, Optional, Tuple, Any, Callable
+
+
+class PromptTemplate:
+    """
+    A prompt compiled into fixed text segments and named slots.
+
+    The template is parsed once at registration. `render()` only joins
+    strings, and `encode()` tokenizes just the slot values, reusing the
+    token ids of the fixed segments cached per tokenizer.
+
+    Segment ids are concatenated rather than re-tokenized as one string.
+    SentencePiece-style tokenizers (Gemma's included) attach a space to the
+    word after it, so spaces right before a slot are moved out of the fixed
+    segment and tokenized together with the slot value. Segment boundaries
+    then fall on newlines or slot edges only, and the ids match tokenizing
+    the rendered prompt in one go.
+    """
+
+    def __init__(self, name: str, text: str, version: str = "1"):
+        self.name = name
+        self.text = text
+        self.version = version
+        self.segments: List[str] = []
+        self.fields: List[Optional[str]] = []
+        # whitespace between a segment and the slot after it, encoded with the slot value
+        self.prefixes: List[str] = []
+        for literal, field, _, _ in Formatter().parse(text):
+            prefix = ""
+            if field is not None:
+                stripped = literal.rstrip(" \t")
+                literal, prefix = stripped, literal[len(stripped):]
+            self.segments.append(literal)
+            self.fields.append(field)
+            self.prefixes.append(prefix)
+        self._token_cache: Dict[Tuple[str, int], List[List[int]]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def key(self) -> str:
+        """Name, version and a hash of the text, e.g. for keying caches of rendered prompts."""
+        digest = hashlib.sha256(self.text.encode()).hexdigest()[:8]
+        return f"{self.name}@{self.version}:{digest}"
+
+    def render(self, **values: Any) -> str:
+        parts = []
+        for segment, field, prefix in zip(self.segments, self.fields, self.prefixes):
+            parts.append(segment)
+            if field is not None:
+                parts.append(prefix + str(values[field]))
+        return "".join(parts)
+
+    def static_ids(self, tokenizer) -> List[List[int]]:
+        """Token ids of each fixed segment, computed once per tokenizer."""
+        tokenizer_key = (getattr(tokenizer, "name_or_path", type(tokenizer).__name__), len(tokenizer))
+        ids = self._token_cache.get(tokenizer_key)
+        if ids is None:
+            with self._lock:
+                ids = self._token_cache.get(tokenizer_key)
+                if ids is None:
+                    ids = [tokenizer.encode(s, add_special_tokens=False) if s else [] for s in self.segments]
+                    self._token_cache[tokenizer_key] = ids
+        return ids
+
+    def encode(
+        self,
+        tokenizer,
+        add_special_tokens: bool = True,
+        encode_value: Optional[Callable[[str], List[int]]] = None,
+        **values: Any
+    ) -> List[int]:
+        # `encode_value` lets callers route slot values through their own cache
+        if encode_value is None:
+            encode_value = lambda text: tokenizer.encode(text, add_special_tokens=False)
+        ids = []
+        if add_special_tokens and getattr(tokenizer, "bos_token_id", None) is not None:
+            ids.append(tokenizer.bos_token_id)
+        for segment_ids, field, prefix in zip(self.static_ids(tokenizer), self.fields, self.prefixes):
+            ids.extend(segment_ids)
+            if field is not None:
+                ids.extend(encode_value(prefix + str(values[field])))
+        return ids
+
+
+class TemplateRegistry:
+    """Named, versioned prompt templates shared by the loader and the services."""
+
+    def __init__(self):
+        self._templates: Dict[str, PromptTemplate] = {}
+
+    def register(self, name: str, text: str, version: str = "1") -> PromptTemplate:
+        template = PromptTemplate(name, text, version)
+        self._templates[name] = template
+        return template
+
+    def get(self, name: str) -> PromptTemplate:
+        try:
+            return self._templates[name]
+        except KeyError:
+            raise KeyError(f"Unknown prompt template: {name}") from None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._templates
+
+    def versions(self) -> Dict[str, str]:
+        return {name: template.key for name, template in self._templates.items()}
+
+
+PROMPTS = TemplateRegistry()
+
+PROMPTS.register("triage", """You are an experienced ER triage nurse. Analyze the following patient presentation and provide:
+1. ESI urgency level (1-5)
+2. Red-flag conditions to consider
+3. Recommended next steps
+
+Patient Information:
+{context}
+
+Respond in JSON format.""")
+
+PROMPTS.register("documentation", """Generate a structured SOAP note from the following clinical encounter:
+
+{context}
+
+Format as:
+Subjective:
+Objective:
+Assessment:
+Plan:""")
+
+# {vignette} is the specialty template's prompt_vignette (app/services/templates.py)
+PROMPTS.register("soap_note", """{vignette}
+Patient Context: {patient_context}
+Encounter Type: {encounter_type}
+Clinical Notes: {encounter_text}
+
+Requirements:
+- Output MUST be valid JSON.
+- Include sections: subjective, objective, assessment, plan.
+- Provide relevant ICD-10 and CPT codes.
+- Include a brief handoff summary.
+- Create a 'patient_handout' summary written at a 6th-grade reading level.""")
+
+
+def format_context(context: Any) -> str:
+    """Dicts become one `key: value` line per entry; anything else is str()'d."""
+    if isinstance(context, dict):
+        return "\n".join(f"{k}: {v}" for k, v in context.items())
+    return str(context)
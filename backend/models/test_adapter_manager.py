@@ -0,0 +1,99 @@
+import pytest
+from contextlib import contextmanager
+from types import SimpleNamespace
+from .adapter_manager import AdapterManager, discover_adapters, BASE_ADAPTER
+
+PATHS = {"soap": "/a/soap", "triage": "/a/triage", "xray": "/a/xray"}
+
+
+class FakePeftModel:
+    """Stands in for a peft.PeftModel that already wraps the base model."""
+
+    def __init__(self):
+        self.peft_config = {}
+        self.active = None
+        self.events = []
+
+    def load_adapter(self, path, adapter_name, is_trainable=False):
+        self.peft_config[adapter_name] = path
+        self.events.append(("load", adapter_name))
+
+    def delete_adapter(self, adapter_name):
+        del self.peft_config[adapter_name]
+        self.events.append(("delete", adapter_name))
+
+    def set_adapter(self, adapter_name):
+        self.active = adapter_name
+
+    @contextmanager
+    def disable_adapter(self):
+        previous, self.active = self.active, None
+        yield
+        self.active = previous
+
+
+class FakeLoader:
+    def __init__(self):
+        self.model = FakePeftModel()
+        self.batches = []
+
+    def generate_text(self, prompt, **kwargs):
+        return {"generated_text": f"{self.model.active}:{prompt}"}
+
+    def generate_batch(self, prompts, **kwargs):
+        self.batches.append(kwargs.get("adapter_names"))
+        return [{"generated_text": p} for p in prompts]
+
+
+class TestAdapterManager:
+
+    def test_lru_eviction(self):
+        loader = FakeLoader()
+        manager = AdapterManager(loader, PATHS, max_resident=2)
+
+        assert manager.generate("soap", "p")["generated_text"] == "soap:p"
+        manager.generate("triage", "p")
+        manager.generate("soap", "p")  # soap is now most recent
+        manager.generate("xray", "p")  # evicts triage
+
+        assert list(manager.resident) == ["soap", "xray"]
+        assert ("delete", "triage") in loader.model.events
+        assert manager.stats()["loads"] == 3
+        assert manager.stats()["evictions"] == 1
+
+    def test_base_model_generation_disables_adapters(self):
+        manager = AdapterManager(FakeLoader(), PATHS)
+        manager.generate("soap", "p")
+        result = manager.generate(None, "p")
+        assert result["generated_text"] == "None:p"
+        assert result["adapter"] is None
+
+    def test_mixed_batch_groups_by_resident_adapters(self):
+        loader = FakeLoader()
+        manager = AdapterManager(loader, PATHS, max_resident=2)
+        requests = [("soap", "a"), ("triage", "b"), (None, "c"), ("xray", "d"), ("soap", "e")]
+
+        results = manager.generate_mixed(requests)
+
+        assert [r["generated_text"] for r in results] == ["a", "b", "c", "d", "e"]
+        assert [r["adapter"] for r in results] == ["soap", "triage", None, "xray", "soap"]
+        assert len(loader.batches) == 2
+        assert BASE_ADAPTER in loader.batches[0]
+        assert all(len(set(names) - {BASE_ADAPTER}) <= 2 for names in loader.batches)
+
+    def test_unknown_task(self):
+        with pytest.raises(ValueError):
+            AdapterManager(FakeLoader(), PATHS).generate("cardiology", "p")
+
+    def test_discover_adapters(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("MEDGEMMA_ADAPTERS", raising=False)
+        for task in ("soap", "triage"):
+            (tmp_path / f"medgemma-{task}-lora").mkdir()
+        (tmp_path / "results_soap").mkdir()
+        assert discover_adapters(str(tmp_path)) == {
+            "soap": str(tmp_path / "medgemma-soap-lora"),
+            "triage": str(tmp_path / "medgemma-triage-lora"),
+        }
+
+        monkeypatch.setenv("MEDGEMMA_ADAPTERS", "xray=/models/xray")
+        assert discover_adapters(str(tmp_path)) == {"xray": "/models/xray"}
@@ -79,6 +79,75 @@ class TestMedGemmaLoader:
         assert "tokens_used" in result
         assert "generation_time" in result
 
+    @patch("transformers.AutoTokenizer.from_pretrained")
+    @patch("transformers.AutoModelForCausalLM.from_pretrained")
+    def test_generate_text_records_stages(self, mock_model_cls, mock_tokenizer_cls):
+        """Tokenization, prefill and decode reach the stage recorder."""
+        mock_model = MagicMock()
+        mock_model.device = "cpu"
+        mock_model.generate.return_value = torch.tensor([[101, 200, 102]])
+        mock_model_cls.return_value = mock_model
+        mock_tokenizer = MagicMock()
+        mock_tokenizer.return_value = {"input_ids": torch.tensor([[101]])}
+        mock_tokenizer.decode.return_value = "generated text"
+        mock_tokenizer_cls.return_value = mock_tokenizer
+
+        stages = {}
+        loader = MedGemmaLoader(quantization="none", stage_recorder=stages.__setitem__)
+        loader.load_model()
+        result = loader.generate_text("Test prompt")
+
+        assert set(stages) == {"tokenization", "prefill", "decode"}
+        assert stages["tokenization"] == result["tokenization_time"]
+        assert stages["decode"] == result["decode_time"]
+
+    @patch("transformers.AutoTokenizer.from_pretrained")
+    @patch("transformers.AutoModelForCausalLM.from_pretrained")
+    def test_generate_batch_keeps_pad_id_zero(self, mock_model_cls, mock_tokenizer_cls):
+        """Gemma pads with id 0; generate must not swap it for eos."""
+        mock_model = MagicMock()
+        mock_model.device = "cpu"
+        mock_model.generate.return_value = torch.tensor([[0, 5, 6, 7], [4, 5, 8, 1]])
+        mock_model_cls.return_value = mock_model
+        mock_tokenizer = MagicMock()
+        mock_tokenizer.pad_token_id = 0
+        mock_tokenizer.eos_token_id = 1
+        mock_tokenizer_cls.return_value = mock_tokenizer
+
+        loader = MedGemmaLoader(quantization="none")
+        loader.load_model()
+        loader._tokenization = MagicMock(tokenizer=loader.tokenizer)
+        loader._tokenization.batch_encode.return_value = (torch.tensor([[0, 5], [4, 5]]), torch.tensor([[0, 1], [1, 1]]))
+        loader._tokenization.batch_decode.return_value = ["a", "b"]
+
+        results = loader.generate_batch(["x", "yz"], max_new_tokens=2)
+
+        assert mock_model.generate.call_args.kwargs["pad_token_id"] == 0
+        assert [r["generated_text"] for r in results] == ["a", "b"]
+
+    @patch("transformers.AutoTokenizer.from_pretrained")
+    @patch("transformers.AutoModelForCausalLM.from_pretrained")
+    def test_generate_batch_tokens_used_stops_at_eos(self, mock_model_cls, mock_tokenizer_cls):
+        """Padding after a row's eos is not counted as generated tokens."""
+        mock_model = MagicMock()
+        mock_model.device = "cpu"
+        mock_model.generate.return_value = torch.tensor([[0, 5, 6, 1, 0, 0], [4, 5, 7, 8, 9, 1]])
+        mock_model_cls.return_value = mock_model
+        mock_tokenizer = MagicMock()
+        mock_tokenizer.pad_token_id = 0
+        mock_tokenizer.eos_token_id = 1
+        mock_tokenizer_cls.return_value = mock_tokenizer
+
+        loader = MedGemmaLoader(quantization="none")
+        loader.load_model()
+        loader._tokenization = MagicMock(tokenizer=loader.tokenizer)
+        loader._tokenization.batch_encode.return_value = (torch.tensor([[0, 5], [4, 5]]), torch.tensor([[0, 1], [1, 1]]))
+        loader._tokenization.batch_decode.return_value = ["a", "b"]
+
+        results = loader.generate_batch(["x", "yz"], max_new_tokens=4)
+
+        assert [r["tokens_used"] for r in results] == [2, 4]
+
     @patch("transformers.AutoTokenizer.from_pretrained")
     @patch("transformers.AutoModelForCausalLM.from_pretrained")
     def test_memory_info(self, mock_model, mock_tokenizer):
@@ -0,0 +1,53 @@
+import threading
+import time
+import pytest
+from types import SimpleNamespace
+from .memory_governor import MemoryGovernor, kv_bytes_per_token, DEFAULT_KV_BYTES_PER_TOKEN
+from .exceptions import InsufficientMemoryError
+
+
+class TestMemoryGovernor:
+
+    def test_kv_bytes_from_config(self):
+        config = SimpleNamespace(num_hidden_layers=18, num_attention_heads=8, num_key_value_heads=1, head_dim=256)
+        assert kv_bytes_per_token(config, dtype_bytes=2) == 2 * 18 * 1 * 256 * 2
+        assert kv_bytes_per_token(None) == DEFAULT_KV_BYTES_PER_TOKEN
+
+    def test_estimate_scales_with_tokens_and_batch(self):
+        governor = MemoryGovernor(1e9, bytes_per_token=1000)
+        single = governor.estimate(100, 412)
+        assert governor.estimate(100, 412, batch_size=4) == 4 * single
+        assert single > 512 * 1000
+
+    def test_oversized_request_rejected_immediately(self):
+        governor = MemoryGovernor(1000)
+        with pytest.raises(InsufficientMemoryError):
+            governor.acquire(2000)
+        assert governor.stats()["rejected"] == 1
+
+    def test_waits_for_release_then_admits(self):
+        governor = MemoryGovernor(1000, timeout=5)
+        governor.acquire(800)
+        admitted = threading.Event()
+
+        def second():
+            with governor.reserve(500):
+                admitted.set()
+
+        worker = threading.Thread(target=second)
+        worker.start()
+        time.sleep(0.05)
+        assert not admitted.is_set()
+        assert governor.stats()["waiting"] == 1
+
+        governor.release(800)
+        worker.join(timeout=2)
+        assert admitted.is_set()
+        assert governor.in_use == 0
+
+    def test_times_out_when_budget_stays_full(self):
+        governor = MemoryGovernor(1000)
+        governor.acquire(1000)
+        with pytest.raises(InsufficientMemoryError):
+            governor.acquire(10, timeout=0.05)
+        assert governor.stats()["waiting"] == 0
@@ -0,0 +1,51 @@
+import pytest
+import torch
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast
+from .tokenization import TokenizerFastPath
+
+WORDS = ["HR", ":", "120", "BP", "90/60", "chest", "pain", "patient", "with", "\n"]
+
+
+@pytest.fixture
+def tokenizer():
+    vocab = {"[PAD]": 0, "[BOS]": 1, "[EOS]": 2, "[UNK]": 3}
+    vocab.update({w: i + 4 for i, w in enumerate(WORDS)})
+    backend = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    backend.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    return PreTrainedTokenizerFast(
+        tokenizer_object=backend, pad_token="[PAD]", bos_token="[BOS]", eos_token="[EOS]", unk_token="[UNK]"
+    )
+
+
+class TestTokenizerFastPath:
+
+    def test_repeated_segments_hit_cache(self, tokenizer):
+        fast = TokenizerFastPath(tokenizer)
+        first = fast.encode_segments(["patient with chest pain ", "HR : 120"])
+        second = fast.encode_segments(["patient with chest pain ", "HR : 120"])
+
+        assert first == second
+        assert first == tokenizer("patient with chest pain HR : 120")["input_ids"]
+        assert fast.stats() == {"cached_strings": 2, "hits": 2, "misses": 2}
+
+    def test_lru_eviction(self, tokenizer):
+        fast = TokenizerFastPath(tokenizer, cache_size=2)
+        for text in ["HR", "BP", "chest"]:
+            fast.encode(text)
+        assert fast.stats()["cached_strings"] == 2
+        assert "HR" not in fast._cache
+
+    def test_batch_encode_left_pads(self, tokenizer):
+        fast = TokenizerFastPath(tokenizer)
+        input_ids, attention_mask = fast.batch_encode(["chest pain", ["patient ", "with chest pain"]])
+
+        assert input_ids.shape == (2, 4)
+        assert attention_mask[0].tolist() == [0, 0, 1, 1]
+        assert input_ids[0].tolist() == [tokenizer.pad_token_id] * 2 + tokenizer("chest pain")["input_ids"]
+        assert input_ids[1].tolist() == tokenizer("patient with chest pain")["input_ids"]
+
+    def test_batch_decode(self, tokenizer):
+        fast = TokenizerFastPath(tokenizer)
+        ids = torch.tensor([tokenizer("chest pain")["input_ids"], tokenizer("HR 120")["input_ids"]])
+        assert fast.batch_decode(ids) == ["chest pain", "HR 120"]
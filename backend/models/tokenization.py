@@ -0,0 +1,119 @@
+import threading
+from collections import OrderedDict
+from typing import List, Sequence, Tuple, Union
+
+import torch
+
+# A prompt is plain text, ready token ids, or a list of text segments whose
+# encodings are cached individually (fixed prefixes, "HR: 120" style vitals lines).
+Prompt = Union[str, List[int], List[str]]
+
+
+class TokenizerFastPath:
+    """
+    Caching and batching layer over a (fast, Rust-backed) HF tokenizer.
+
+    - `encode()` memoizes the ids of short, frequently repeated strings in an
+      LRU, so prompt prefixes and vitals lines are tokenized once.
+    - `batch_encode()` / `batch_decode()` hand whole batches to the tokenizer
+      in one call, letting the Rust backend parallelize across samples.
+
+    Segment encodings are concatenated, so segments should break on
+    whitespace or newlines to keep token boundaries identical to encoding
+    the joined text.
+    """
+
+    def __init__(self, tokenizer, cache_size: int = 4096):
+        self.tokenizer = tokenizer
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._special_prefix = None
+
+    @property
+    def special_prefix(self) -> List[int]:
+        # Whatever the tokenizer itself adds in front of text (BOS for Gemma),
+        # so segment prompts match prompts encoded as plain text
+        if self._special_prefix is None:
+            self._special_prefix = list(self.tokenizer("")["input_ids"])
+        return self._special_prefix
+
+    def _lookup(self, text: str):
+        with self._lock:
+            ids = self._cache.get(text)
+            if ids is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(text)
+            self.hits += 1
+            return ids
+
+    def _store(self, text: str, ids: List[int]):
+        with self._lock:
+            self._cache[text] = ids
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def encode_many(self, texts: Sequence[str]) -> List[List[int]]:
+        """Ids (no special tokens) for each text; cache misses are encoded in one batch call."""
+        results = [self._lookup(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, ids in zip(texts, results) if ids is None))
+        if missing:
+            encoded = dict(zip(missing, self.tokenizer(missing, add_special_tokens=False)["input_ids"]))
+            for text, ids in encoded.items():
+                self._store(text, ids)
+            results = [ids if ids is not None else encoded[text] for text, ids in zip(texts, results)]
+        return results
+
+    def encode(self, text: str) -> List[int]:
+        return self.encode_many([text])[0]
+
+    def encode_segments(self, segments: Sequence[str], add_special_tokens: bool = True) -> List[int]:
+        ids = list(self.special_prefix) if add_special_tokens else []
+        for segment_ids in self.encode_many([s for s in segments if s]):
+            ids.extend(segment_ids)
+        return ids
+
+    def encode_lines(self, text: str) -> List[int]:
+        """Encode multi-line text (e.g. a vitals block) with one cache entry per line."""
+        return self.encode_segments(text.splitlines(keepends=True), add_special_tokens=False)
+
+    def to_ids(self, prompt: Prompt) -> List[int]:
+        if isinstance(prompt, str):
+            return self.encode_segments([prompt])
+        if prompt and isinstance(prompt[0], str):
+            return self.encode_segments(prompt)
+        return list(prompt)
+
+    def batch_encode(self, prompts: Sequence[Prompt], device=None) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Left-padded (input_ids, attention_mask) for a batch of prompts, ready
+        for `model.generate`. Plain-text prompts go through the tokenizer in
+        a single batched call; segment lists reuse cached segment ids.
+        """
+        texts = [p for p in prompts if isinstance(p, str)]
+        encoded_texts = iter(self.tokenizer(texts)["input_ids"]) if texts else iter(())
+        sequences = [list(next(encoded_texts)) if isinstance(p, str) else self.to_ids(p) for p in prompts]
+
+        pad_id = self.tokenizer.pad_token_id
+        if pad_id is None:
+            pad_id = self.tokenizer.eos_token_id
+        width = max(len(seq) for seq in sequences)
+        input_ids = torch.full((len(sequences), width), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(sequences), width), dtype=torch.long)
+        for row, seq in enumerate(sequences):
+            if seq:
+                input_ids[row, width - len(seq):] = torch.tensor(seq, dtype=torch.long)
+                attention_mask[row, width - len(seq):] = 1
+        if device is not None:
+            input_ids, attention_mask = input_ids.to(device), attention_mask.to(device)
+        return input_ids, attention_mask
+
+    def batch_decode(self, sequences, skip_special_tokens: bool = True) -> List[str]:
+        return self.tokenizer.batch_decode(sequences, skip_special_tokens=skip_special_tokens)
+
+    def stats(self) -> dict:
+        return {"cached_strings": len(self._cache), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,77 @@
+import json
+import torch
+from backend.model_training.scripts.generation_cache import GenerationCache, generate_batched, shard_prompts
+
+
+class ReverseModel:
+    """generate() stand-in: appends each prompt's tokens reversed."""
+    device = "cpu"
+
+    def __init__(self):
+        self.batches = []
+
+    def generate(self, input_ids, attention_mask, max_new_tokens, **kwargs):
+        self.batches.append(input_ids.shape[0])
+        return torch.cat([input_ids, input_ids.flip(1)[:, :max_new_tokens]], dim=1)
+
+
+class CharTokenizer:
+    pad_token_id = 0
+
+    def __call__(self, texts, return_tensors="pt", padding=True):
+        width = max(len(t) for t in texts)
+        ids = torch.tensor([[0] * (width - len(t)) + [ord(c) for c in t] for t in texts])
+
+        class Batch(dict):
+            def to(self, device):
+                return self
+
+        batch = Batch(input_ids=ids, attention_mask=(ids != 0).long())
+        batch.input_ids = ids
+        return batch
+
+    def batch_decode(self, rows, skip_special_tokens=True):
+        return ["".join(chr(i) for i in row.tolist() if i) for row in rows]
+
+
+def test_cache_roundtrip_and_model_key(tmp_path):
+    cache = GenerationCache(str(tmp_path), "google/medgemma-2b")
+    key = GenerationCache.sample_key("HR 110", 100)
+    with cache.writer("shard0") as out:
+        out.write(json.dumps({"key": key, "prediction": "ESI Level 2"}) + "\n")
+
+    assert GenerationCache(str(tmp_path), "google/medgemma-2b").get(key) == "ESI Level 2"
+    assert GenerationCache(str(tmp_path), "google/medgemma-4b").get(key) is None
+    assert GenerationCache.sample_key("HR 110", 50) != key
+
+
+def test_partial_line_from_crash_is_skipped(tmp_path):
+    cache = GenerationCache(str(tmp_path), "m")
+    with cache.writer() as out:
+        out.write(json.dumps({"key": "a", "prediction": "ok"}) + "\n")
+        out.write('{"key": "b", "predic')
+
+    cache = GenerationCache(str(tmp_path), "m")
+    assert cache.get("a") == "ok"
+    assert cache.get("b") is None
+
+    # The next run's entries start on a fresh line
+    with cache.writer() as out:
+        out.write(json.dumps({"key": "b", "prediction": "redone"}) + "\n")
+    cache.reload()
+    assert cache.get("b") == "redone"
+
+
+def test_batched_generation_strips_prompt_by_position():
+    model = ReverseModel()
+    prompts = ["ab", "abcd", "abc"]
+    results = dict(generate_batched(model, CharTokenizer(), prompts, batch_size=2, max_new_tokens=3))
+    assert results == {"abcd": "dcb", "abc": "cba", "ab": "ba"}
+    assert model.batches == [2, 1]
+
+
+def test_shards_are_disjoint_and_complete():
+    prompts = [f"p{i}" for i in range(10)]
+    shards = [shard_prompts(prompts, rank, 3) for rank in range(3)]
+    assert sorted(p for shard in shards for p in shard) == sorted(prompts)
+    assert sum(len(shard) for shard in shards) == len(prompts)
@@ -0,0 +1,66 @@
+import pytest
+from backend.model_training.data.token_cache import TokenCache, cache_key
+
+
+class CharTokenizer:
+    """Tiny tokenizer stand-in: one token id per character."""
+    name_or_path = "char-tokenizer"
+
+    def __init__(self):
+        self.calls = 0
+
+    def __len__(self):
+        return 256
+
+    def __call__(self, texts, max_length=512, truncation=True):
+        self.calls += 1
+        return {"input_ids": [[ord(c) for c in text[:max_length]] for text in texts]}
+
+
+RECORDS = [
+    {"instruction": "HR 110", "output": "ESI Level 2"},
+    {"instruction": "SpO2 85%", "output": "ESI Level 1"},
+]
+
+
+def test_token_cache_roundtrip(tmp_path):
+    tokenizer = CharTokenizer()
+    dataset = TokenCache(str(tmp_path)).load_or_build(tokenizer, RECORDS)
+
+    assert len(dataset) == 2
+    assert dataset[1]["input_ids"] == [ord(c) for c in "SpO2 85%"]
+    assert dataset[1]["attention_mask"] == [1] * len("SpO2 85%")
+
+
+def test_token_cache_reused_across_runs(tmp_path):
+    tokenizer = CharTokenizer()
+    TokenCache(str(tmp_path)).load_or_build(tokenizer, RECORDS)
+    TokenCache(str(tmp_path)).load_or_build(tokenizer, RECORDS)
+    assert tokenizer.calls == 1
+
+
+def test_cache_key_tracks_source_data():
+    tokenizer = CharTokenizer()
+    changed = RECORDS[:1] + [{"instruction": "SpO2 86%", "output": "ESI Level 1"}]
+    assert cache_key(tokenizer, RECORDS, "instruction", 512) == cache_key(tokenizer, list(RECORDS), "instruction", 512)
+    assert cache_key(tokenizer, RECORDS, "instruction", 512) != cache_key(tokenizer, changed, "instruction", 512)
+
+
+@pytest.mark.parametrize("rank", [0, 1])
+def test_every_rank_reaches_barrier_on_hit_and_miss(tmp_path, monkeypatch, rank):
+    import torch
+    barriers = []
+    monkeypatch.setattr(torch.distributed, "is_available", lambda: True)
+    monkeypatch.setattr(torch.distributed, "is_initialized", lambda: True)
+    monkeypatch.setattr(torch.distributed, "get_rank", lambda: 0)
+    monkeypatch.setattr(torch.distributed, "barrier", lambda: barriers.append(1))
+
+    tokenizer = CharTokenizer()
+    TokenCache(str(tmp_path)).load_or_build(tokenizer, RECORDS)  # miss, built by rank 0
+    monkeypatch.setattr(torch.distributed, "get_rank", lambda: rank)
+    dataset = TokenCache(str(tmp_path)).load_or_build(tokenizer, RECORDS)  # hit
+
+    assert len(barriers) == 2
+    assert tokenizer.calls == 1
+    assert len(dataset) == 2
+    assert not [p for p in tmp_path.iterdir() if ".tmp." in p.name]
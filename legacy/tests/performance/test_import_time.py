@@ -0,0 +1,43 @@
+import os
+import re
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+HEAVY_MODULES = ["torch", "transformers", "PIL", "pyinstrument", "redis"]
+
+
+def profile_import(module: str):
+    """
+    Import `module` in a fresh interpreter under `-X importtime`.
+
+    Returns (cumulative microseconds per direct dependency of `module`,
+    set of all modules loaded).
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([REPO_ROOT, os.path.join(REPO_ROOT, "backend")])
+    code = f"import sys, {module}; print(','.join(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, env=env, cwd=REPO_ROOT, timeout=120
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        # Direct dependencies are nested exactly one level (two spaces) deeper
+        if match and len(match.group(2)) == 3:
+            cumulative[match.group(3)] = int(match.group(1))
+    return cumulative, set(result.stdout.strip().split(","))
+
+
+def test_backend_import_profile():
+    cumulative, loaded = profile_import("backend.app.main")
+
+    print("\nSlowest imports for backend.app.main (cumulative ms):")
+    for name, usec in sorted(cumulative.items(), key=lambda item: -item[1])[:10]:
+        print(f"  {name:<40} {usec / 1000:8.1f}")
+
+    # Heavy libraries must be deferred to first use or the app lifespan
+    assert not [m for m in HEAVY_MODULES if m in loaded]
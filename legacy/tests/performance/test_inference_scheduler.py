@@ -0,0 +1,128 @@
+import asyncio
+import pytest
+from backend.app.core import metrics
+from backend.app.services.inference_scheduler import (
+    InferenceScheduler, SchedulerOverloaded, priority_for_esi, priority_from_vitals,
+)
+
+
+@pytest.fixture(autouse=True)
+def no_request_context():
+    metrics._current.set(None)
+
+
+async def _drain(scheduler, requests):
+    """Hold the only slot, queue `requests`, then release and record the service order."""
+    order = []
+
+    async def worker(priority, label):
+        async with scheduler.slot(priority):
+            order.append(label)
+            await asyncio.sleep(0)
+
+    await scheduler.acquire("routine")
+    tasks = [asyncio.create_task(worker(p, label)) for p, label in requests]
+    await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_priority_pre_score():
+    assert priority_from_vitals({"spo2": 84}) == "critical"
+    assert priority_from_vitals({"hr": 110}) == "emergent"
+    assert priority_from_vitals({"hr": 80, "spo2": 98}) == "urgent"
+    assert priority_for_esi(5) == "routine"
+
+
+def test_critical_jumps_queued_routine_work():
+    scheduler = InferenceScheduler(max_concurrency=1)
+    requests = [("routine", "soap-1"), ("routine", "soap-2"), ("urgent", "ankle"), ("critical", "hypoxic")]
+    order = asyncio.run(_drain(scheduler, requests))
+    assert order[0] == "hypoxic"
+    assert order[1] == "ankle"
+
+
+def test_weighted_fair_share_does_not_starve_routine():
+    scheduler = InferenceScheduler(max_concurrency=1)
+    requests = [("routine", f"r{i}") for i in range(10)] + [("emergent", f"e{i}") for i in range(10)]
+    order = asyncio.run(_drain(scheduler, requests))
+    first_nine = order[:9]
+    assert sum(label.startswith("e") for label in first_nine) == 8
+    assert any(label.startswith("r") for label in first_nine)
+    assert sorted(order) == sorted(label for _, label in requests)
+
+
+def test_full_queue_preempts_lower_priority():
+    async def scenario():
+        scheduler = InferenceScheduler(max_concurrency=1, max_queued=2)
+        await scheduler.acquire("urgent")
+        older = asyncio.create_task(scheduler.acquire("routine"))
+        newer = asyncio.create_task(scheduler.acquire("routine"))
+        await asyncio.sleep(0)
+
+        emergent = asyncio.create_task(scheduler.acquire("emergent"))
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerOverloaded):
+            await newer
+
+        # Full again and nothing below routine to preempt
+        with pytest.raises(SchedulerOverloaded):
+            await scheduler.acquire("routine")
+
+        scheduler.release()
+        await emergent
+        scheduler.release()
+        await older
+        scheduler.release()
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["classes"]["routine"]["preempted"] == 1
+    assert stats["running"] == 0
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        scheduler = InferenceScheduler(max_concurrency=1)
+        await scheduler.acquire("routine")
+        waiter = asyncio.create_task(scheduler.acquire("urgent"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        queued = scheduler.queued()
+        scheduler.release()
+        return queued, scheduler.running
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+
+def test_queue_wait_reported_per_class():
+    scheduler = InferenceScheduler(max_concurrency=1)
+    asyncio.run(_drain(scheduler, [("emergent", "a"), ("routine", "b")]))
+    stats = scheduler.stats()["classes"]
+    assert stats["emergent"]["served"] == 1
+    assert stats["routine"]["served"] == 2  # includes the slot holder
+    assert stats["emergent"]["max_wait_ms"] >= 0
+    assert 'er_inference_queue_wait_seconds_count{priority="emergent"}' in metrics.render_metrics()
+
+
+def test_chat_waits_for_a_slot():
+    import httpx
+    from backend.app.services.ollama_service import OllamaService
+
+    async def scenario():
+        scheduler = InferenceScheduler(max_concurrency=1)
+        service = OllamaService(scheduler)
+        service._get_client = lambda: httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, json={"message": {"content": "ok"}})
+        ))
+        await scheduler.acquire("routine")
+        chat = asyncio.create_task(service.generate_chat([{"role": "user", "content": "hi"}]))
+        await asyncio.sleep(0.01)
+        queued = scheduler.queued()
+        scheduler.release()
+        return queued, await chat
+
+    assert asyncio.run(scenario()) == (1, "ok")
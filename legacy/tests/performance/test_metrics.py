@@ -0,0 +1,44 @@
+from fastapi.testclient import TestClient
+from backend.app.main import app
+from backend.app.core import metrics
+
+
+def test_stage_timings_recorded_per_route():
+    timings = metrics.start_request(rate=1.0)
+    metrics.set_model("test-model")
+    with metrics.stage("quality_checks"):
+        pass
+    metrics.record_stage("prefill", 0.2)
+    metrics.finish_request(timings, "/unit", 0.25)
+    metrics._current.set(None)
+
+    text = metrics.render_metrics()
+    assert 'er_stage_duration_seconds_count{route="/unit",model="test-model",stage="quality_checks"} 1' in text
+    assert 'er_stage_duration_seconds_bucket{route="/unit",model="test-model",stage="prefill",le="0.25"} 1' in text
+    assert 'er_request_duration_seconds_sum{route="/unit",model="test-model"} 0.25' in text
+
+
+def test_metrics_endpoint_exposes_request_histogram():
+    client = TestClient(app)
+    assert client.get("/health").status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'er_request_duration_seconds_count{route="/health",model="none"}' in response.text
+
+
+def test_unsampled_stage_is_cheap(monkeypatch):
+    assert metrics.start_request(rate=0.0) is None
+    metrics._current.set(None)
+    timed = []
+    monkeypatch.setattr(metrics, "_timed", lambda *args: timed.append(args))
+
+    for _ in range(100):
+        with metrics.stage("export"):
+            pass
+    metrics.record_stage("prefill", 0.1)
+
+    # Every unsampled stage is the one shared no-op: no timer, no allocation
+    assert metrics.stage("export") is metrics._NOOP
+    assert timed == []
@@ -0,0 +1,89 @@
+import os
+import time
+import pytest
+from backend.app.services.red_flags import DEFAULT_LEXICON_FILE, RedFlagMatcher, load_lexicon, tokenize
+
+COMPLAINT = (
+    "58 y/o male with crushing substernal chest pain radiating to the left arm for 30 minutes, "
+    "diaphoretic and nauseated. Denies fever or cough. History of hypertension and diabetes, on metformin."
+)
+
+
+def _lexicon(copies):
+    """The bundled lexicon plus `copies` - 1 synthetic variants of every term, to grow it past what's shipped."""
+    categories = load_lexicon(DEFAULT_LEXICON_FILE)["categories"]
+    return {
+        name: dict(spec, terms=[term if k == 0 else f"{term} variant{k}" for term in spec["terms"] for k in range(copies)])
+        for name, spec in categories.items()
+    }
+
+
+def _sequential(categories):
+    """The approach the matcher replaced: lower-case, then an `in` check per term."""
+    terms = [(name, term) for name, spec in categories.items() for term in spec["terms"]]
+
+    def scan(text):
+        lowered = text.lower()
+        return {name for name, term in terms if term in lowered}
+
+    return scan
+
+
+def _transitions(matcher, text):
+    """Replay `scan`'s walk and count automaton steps: goto edges plus failure-link hops."""
+    goto, fail = matcher._goto, matcher._fail
+    steps, state = 0, 0
+    for token, _, _ in tokenize(text):
+        if token not in matcher._vocabulary:
+            state = 0
+            continue
+        while state and token not in goto[state]:
+            state = fail[state]
+            steps += 1
+        state = goto[state].get(token, 0)
+        steps += 1
+    return steps
+
+
+def test_matcher_work_does_not_grow_with_lexicon():
+    tokens = len(tokenize(COMPLAINT))
+    steps = {}
+    for copies in (1, 8):
+        categories = _lexicon(copies)
+        matcher = RedFlagMatcher(categories)
+        assert set(matcher.scan(COMPLAINT).categories) <= _sequential(categories)(COMPLAINT)
+        steps[copies] = _transitions(matcher, COMPLAINT)
+    # Aho-Corasick: at most two steps per token (amortized), whatever the lexicon size;
+    # the `in` loop it replaced does one substring search per term
+    assert steps[8] == steps[1]
+    assert steps[1] <= 2 * tokens
+
+
+def _best_of(fn, repeat=5, number=200):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn(COMPLAINT)
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+@pytest.mark.skipif(not os.getenv("RUN_BENCHMARKS"), reason="wall-clock benchmark; set RUN_BENCHMARKS=1")
+def test_matcher_cost_does_not_grow_with_lexicon():
+    timings = {}
+    for copies in (1, 8):
+        categories = _lexicon(copies)
+        matcher = RedFlagMatcher(categories)
+        sequential = _sequential(categories)
+        assert set(matcher.scan(COMPLAINT).categories) <= sequential(COMPLAINT)
+        timings[copies] = (_best_of(matcher.scan), _best_of(sequential))
+
+    for copies, (matcher_s, sequential_s) in timings.items():
+        print(f"\n{copies}x lexicon: matcher {matcher_s * 1e6:.1f}us, sequential `in` {sequential_s * 1e6:.1f}us")
+
+    matcher_1, sequential_1 = timings[1]
+    matcher_8, sequential_8 = timings[8]
+    assert sequential_8 > 4 * sequential_1
+    assert matcher_8 < 2 * matcher_1
+    assert matcher_8 < sequential_8
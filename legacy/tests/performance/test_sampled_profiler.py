@@ -0,0 +1,60 @@
+import json
+import os
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from backend.app.core.profiling import SampledProfiler
+
+
+def _app(profiler):
+    app = FastAPI()
+    app.middleware("http")(profiler)
+
+    @app.get("/work")
+    def work():
+        time.sleep(0.02)
+        return {"ok": True}
+
+    return app
+
+
+def _wait_for_files(directory, count, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if os.path.isdir(directory) and len(os.listdir(directory)) >= count:
+            return os.listdir(directory)
+        time.sleep(0.05)
+    return os.listdir(directory) if os.path.isdir(directory) else []
+
+
+def test_sampled_request_writes_speedscope_and_keeps_response(tmp_path):
+    client = TestClient(_app(SampledProfiler(sample_rate=1.0, output_dir=str(tmp_path))))
+    response = client.get("/work", headers={"X-Request-ID": "abc123"})
+
+    assert response.json() == {"ok": True}
+    assert response.headers["X-Request-ID"] == "abc123"
+    files = _wait_for_files(str(tmp_path), 1)
+    assert len(files) == 1 and "abc123" in files[0] and files[0].endswith(".speedscope.json")
+    with open(os.path.join(tmp_path, files[0])) as f:
+        assert "speedscope" in json.load(f)["$schema"]
+
+
+def test_unsampled_requests_are_not_profiled(tmp_path):
+    client = TestClient(_app(SampledProfiler(sample_rate=0.0, output_dir=str(tmp_path))))
+    response = client.get("/work?profile=1")
+
+    assert response.json() == {"ok": True}
+    assert response.headers["X-Request-ID"]
+    assert os.listdir(tmp_path) == []
+
+
+def test_unsafe_request_id_is_replaced(tmp_path):
+    output_dir = tmp_path / "profiles"
+    client = TestClient(_app(SampledProfiler(sample_rate=1.0, output_dir=str(output_dir))))
+    response = client.get("/work", headers={"X-Request-ID": "../../escape"})
+
+    request_id = response.headers["X-Request-ID"]
+    assert request_id != "../../escape" and len(request_id) == 32
+    files = _wait_for_files(str(output_dir), 1)
+    assert len(files) == 1 and request_id in files[0]
+    assert sorted(os.listdir(tmp_path)) == ["profiles"]
@@ -0,0 +1,57 @@
+import timeit
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from backend.app.api.triage import router
+from backend.app.core.container import get_triage_service
+from backend.app.services.triage_service import TriageService
+
+
+def _fake_request():
+    return SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace()))
+
+
+def test_triage_service_shared_across_requests():
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    seen = []
+
+    async def fake_process_triage(self, text_input, vitals, image_base64=None):
+        seen.append(id(self))
+        return {
+            "clinical_json": {
+                "esi_level": 3, "confidence_score": 0.85, "red_flag_conditions": [],
+                "follow_up_questions": [], "suggested_follow_up": [], "recommended_next_steps": []
+            },
+            "patient_text": ""
+        }
+
+    payload = {
+        "text_input": "Minor laceration",
+        "vitals": {"HR": 80, "BP": "120/80", "SpO2": 98, "temp": 98.6, "RR": 16}
+    }
+    original = TriageService.process_triage
+    TriageService.process_triage = fake_process_triage
+    try:
+        client = TestClient(app)
+        for _ in range(3):
+            assert client.post("/api/triage", json=payload).status_code == 200
+    finally:
+        TriageService.process_triage = original
+
+    assert len(seen) == 3
+    assert len(set(seen)) == 1
+
+
+def test_per_request_construction_cost():
+    request = _fake_request()
+    get_triage_service(request)  # container built once, as the lifespan would
+
+    runs = 2000
+    construct = timeit.timeit(TriageService, number=runs) / runs
+    lookup = timeit.timeit(lambda: get_triage_service(request), number=runs) / runs
+
+    # Construction itself is cheap; the real saving is that a fresh instance
+    # also repeats the MedGemma load on its first process_triage call.
+    print(f"\nTriageService() per request: {construct * 1e6:.1f}us, container lookup: {lookup * 1e6:.2f}us")
+    assert get_triage_service(request) is get_triage_service(request)
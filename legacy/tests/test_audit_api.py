@@ -0,0 +1,121 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel
+from backend.app.api.audit import router
+from backend.app.core import auth, database
+from backend.app.services.audit import AuditLog
+from backend.app.services.audit_query import AuditFilters, audit_query, decode_cursor, encode_cursor, iter_audit_batches
+
+app = FastAPI()
+app.include_router(router, prefix="/api")
+app.dependency_overrides[auth.get_current_user] = lambda: auth.User(username="compliance_officer")
+
+START = datetime(2026, 3, 1, 8, 0)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    pytest.importorskip("aiosqlite")
+    monkeypatch.setattr(database, "DATABASE_URL", f"sqlite:///{tmp_path / 'audit.db'}")
+    asyncio.run(database.dispose_engines())
+    engine = database.get_engine()
+    SQLModel.metadata.create_all(engine, tables=[AuditLog.__table__])
+    with Session(engine) as session:
+        for i in range(250):
+            session.add(AuditLog(
+                # Pairs of events share a timestamp, so the id tie-break matters
+                timestamp=START + timedelta(minutes=i // 2),
+                user_id="dr_a" if i % 3 else "dr_b",
+                action="READ_PATIENT" if i % 2 else "LOGIN",
+                resource_id=f"P{i}",
+            ))
+        session.commit()
+    # Keep the endpoints' own audit rows out of the fixture data
+    with patch("backend.app.api.audit.log_audit_event", AsyncMock()) as audit:
+        client = TestClient(app)
+        client.audit = audit
+        yield client
+    asyncio.run(database.dispose_engines())
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(START, 42)) == (START, 42)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_query_uses_keyset_not_offset():
+    sql = str(audit_query(AuditFilters(user_id="dr_a"), after=(START, 10), limit=50))
+    assert "OFFSET" not in sql.upper()
+    assert "(auditlog.timestamp, auditlog.id) <" in sql
+
+
+def test_pages_cover_every_row_once(client):
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 40, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/audit/events", params=params).json()
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == 250
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_filters_by_user_action_and_time(client):
+    params = {"user_id": "dr_b", "action": "LOGIN", "since": (START + timedelta(minutes=10)).isoformat(), "limit": 1000}
+    items = client.get("/api/audit/events", params=params).json()["items"]
+    assert items
+    assert all(i["user_id"] == "dr_b" and i["action"] == "LOGIN" for i in items)
+    assert all(datetime.fromisoformat(i["timestamp"]) >= START + timedelta(minutes=10) for i in items)
+
+
+def test_invalid_cursor_rejected(client):
+    assert client.get("/api/audit/events", params={"cursor": "garbage"}).status_code == 400
+
+
+def test_export_batches_are_keyset_ordered(client):
+    batches = list(iter_audit_batches(AuditFilters(), batch_size=100))
+    assert [len(b) for b in batches] == [100, 100, 50]
+    ids = [row[0] for batch in batches for row in batch]
+    assert ids == sorted(ids)
+
+
+def test_csv_export(client):
+    response = client.get("/api/audit/export", params={"action": "READ_PATIENT"})
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 125
+    assert {row["action"] for row in rows} == {"READ_PATIENT"}
+
+
+def test_parquet_export(client):
+    pq = pytest.importorskip("pyarrow.parquet")
+    response = client.get("/api/audit/export", params={"output_format": "parquet", "user_id": "dr_a"})
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.num_rows == sum(1 for i in range(250) if i % 3)
+    assert set(table.column("user_id").to_pylist()) == {"dr_a"}
+
+
+def test_requires_authentication(client):
+    anonymous = FastAPI()
+    anonymous.include_router(router, prefix="/api")
+    unauthenticated = TestClient(anonymous)
+    assert unauthenticated.get("/api/audit/events").status_code == 401
+    assert unauthenticated.get("/api/audit/export").status_code == 401
+
+
+def test_export_is_audited(client):
+    client.get("/api/audit/export", params={"user_id": "dr_b"})
+    call = client.audit.await_args.kwargs
+    assert (call["user_id"], call["action"]) == ("compliance_officer", "AUDIT_EXPORT")
+    assert json.loads(call["details"])["user_id"] == "dr_b"
@@ -1,10 +1,14 @@
+import json
 import pytest
+from unittest.mock import AsyncMock, patch
 from fastapi.testclient import TestClient
 from backend.app.api.documentation import router
+from backend.app.core import auth
 from fastapi import FastAPI
 
 app = FastAPI()
 app.include_router(router, prefix="/api")
+app.dependency_overrides[auth.get_current_user] = lambda: auth.User(username="dr_export")
 
 client = TestClient(app)
 
@@ -46,3 +50,121 @@ def test_generate_note_template_missing():
     data = response.json()
     assert data["json"]["metadata"]["encounter_type"] == "unknown-specialty"
     assert data["json"]["metadata"]["template_used"] == "Standard clinical encounter."
+
+def test_generate_note_selected_formats():
+    payload = {
+        "encounter_text": "Ankle sprain after fall, able to bear weight.",
+        "patient_context": {"patient_id": "P789"},
+        "encounter_type": "ER visit",
+        "formats": ["plain_text"]
+    }
+    response = client.post("/api/generate-note", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert list(data.keys()) == ["plain_text"]
+    assert "CLINICAL NOTE" in data["plain_text"]
+
+def test_generate_note_unknown_format():
+    payload = {
+        "encounter_text": "Simple checkup.",
+        "patient_context": {"patient_id": "P456"},
+        "encounter_type": "general",
+        "formats": ["pdf"]
+    }
+    response = client.post("/api/generate-note", json=payload)
+    assert response.status_code == 422
+
+def test_generate_note_fhir_bytes():
+    payload = {
+        "encounter_text": "Patient has severe 10/10 abdominal pain, guarding present.",
+        "patient_context": {"patient_id": "P123"},
+        "encounter_type": "ER visit"
+    }
+    response = client.post("/api/generate-note/fhir", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/fhir+json"
+    fhir = response.json()
+    assert fhir["resourceType"] == "Composition"
+    assert "CLINICAL NOTE" in fhir["section"][0]["text"]["div"]
+
+def test_invalid_code_reported_once():
+    """A bad code in both the note text and the model's code list is one issue, not two."""
+    completion = json.dumps({
+        "soap_note": {
+            "subjective": "Crushing chest pain for two hours.",
+            "objective": "HR 110, BP 90/60, ST elevation on ECG.",
+            "assessment": "Suspected STEMI, I21.9. Rule out X99.9.",
+            "plan": "Cath lab activation. Bill CPT 99283 and CPT 12345."
+        },
+        "icd10": ["I21.9", "X99.9", "X99.9"],
+        "cpt": ["99283", "12345"],
+    })
+    payload = {
+        "encounter_text": "Crushing chest pain, ST elevation.",
+        "patient_context": {"patient_id": "P321"},
+        "encounter_type": "ER visit",
+        "formats": ["json"]
+    }
+    with patch("backend.app.services.ollama_service.OllamaService.generate_completion", AsyncMock(return_value=completion)), \
+         patch("backend.app.services.documentation_service.save_note", AsyncMock()):
+        response = client.post("/api/generate-note", json=payload)
+    assert response.status_code == 200
+    note = response.json()["json"]
+    assert note["icd10"] == ["I21.9"]
+    issues = [issue for issue in note["quality_checks"]["issues"] if issue.startswith("Unrecognized")]
+    assert issues == ["Unrecognized ICD-10 code: X99.9", "Unrecognized CPT code: 12345"]
+
+def _stored_notes(count):
+    for i in range(count):
+        note = {"soap_note": {"subjective": f"Note {i}"}, "icd10": [], "cpt": [], "handoff": ""}
+        yield note, {"patient_id": f"P{i}"}, "2026-01-01T00:00:00"
+
+def test_bulk_export_ndjson():
+    audit = AsyncMock()
+    with patch("backend.app.api.documentation.iter_notes", return_value=_stored_notes(250)), \
+         patch("backend.app.api.documentation.log_audit_event", audit):
+        response = client.get("/api/notes/export", params={"patient_id": "P7"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/fhir+ndjson"
+    lines = response.text.strip().split("\n")
+    assert len(lines) == 250
+    assert json.loads(lines[-1])["subject"]["display"] == "Patient ID: P249"
+
+    started, completed = [call.kwargs for call in audit.await_args_list]
+    assert (started["user_id"], started["action"], started["resource_id"]) == ("dr_export", "NOTES_EXPORT", "P7")
+    assert json.loads(started["details"])["patient_id"] == "P7"
+    assert completed["action"] == "NOTES_EXPORT_COMPLETE"
+    assert json.loads(completed["details"])["rows"] == 250
+
+def test_bulk_export_bundle():
+    with patch("backend.app.api.documentation.iter_notes", return_value=_stored_notes(3)), \
+         patch("backend.app.api.documentation.log_audit_event", AsyncMock()):
+        response = client.get("/api/notes/export", params={"output_format": "bundle"})
+    assert response.status_code == 200
+    bundle = response.json()
+    assert bundle["resourceType"] == "Bundle"
+    assert [entry["resource"]["date"] for entry in bundle["entry"]] == ["2026-01-01T00:00:00"] * 3
+
+def test_bulk_export_requires_login():
+    unauthenticated = FastAPI()
+    unauthenticated.include_router(router, prefix="/api")
+    with patch("backend.app.api.documentation.iter_notes") as notes:
+        response = TestClient(unauthenticated).get("/api/notes/export")
+    assert response.status_code == 401
+    notes.assert_not_called()
+
+def test_bulk_export_mounted_on_main_app():
+    from backend.app import main
+
+    main.app.dependency_overrides[auth.get_current_user] = lambda: auth.User(username="dr_export")
+    try:
+        with patch("backend.app.api.documentation.iter_notes", return_value=_stored_notes(2)), \
+             patch("backend.app.api.documentation.log_audit_event", AsyncMock()):
+            response = TestClient(main.app).get("/api/notes/export")
+    finally:
+        main.app.dependency_overrides.pop(auth.get_current_user, None)
+    assert response.status_code == 200
+    assert len(response.text.strip().split("\n")) == 2
+    # main's own /api/generate-note is still the one serving that path
+    routes = [r for r in main.app.routes if getattr(r, "path", None) == "/api/generate-note"]
+    assert [r.endpoint.__module__ for r in routes] == [main.__name__]
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import threading
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from backend.app.api.triage import router
+from backend.app.core.container import get_triage_service
+from backend.app.services.triage_service import TriageService
+
+PAYLOAD = {
+    "text_input": "Shortness of breath and cough",
+    "vitals": {"HR": 115, "BP": "110/70", "SpO2": 88, "temp": 101.5, "RR": 26},
+}
+
+
+@pytest.fixture
+def service():
+    service = TriageService()
+    service._initialized = True  # no model load in tests
+    return service
+
+
+@pytest.fixture
+def client(service):
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    app.dependency_overrides[get_triage_service] = lambda: service
+    with TestClient(app) as client:
+        yield client
+
+
+def test_quick_assessment_is_fast_and_reads_both_vitals_shapes(service):
+    start = time.perf_counter()
+    result = service.quick_assessment(PAYLOAD["text_input"], PAYLOAD["vitals"])
+    assert time.perf_counter() - start < 0.05
+    assert result["clinical_json"]["esi_level"] == 1
+    lower = service.quick_assessment("ankle sprain", {"hr": 80, "spo2": 99, "bp_sys": 120})
+    assert lower["clinical_json"]["esi_level"] == 3
+
+
+def test_answers_before_refinement_then_polls(client, service):
+    gate = threading.Event()
+    refine = service.process_triage
+
+    async def slow_refinement(*args):
+        await asyncio.to_thread(gate.wait, 5)
+        result = await refine(*args)
+        result["clinical_json"]["confidence_score"] = 0.99
+        return result
+
+    service.process_triage = slow_refinement
+    response = client.post("/api/triage/fast", json=PAYLOAD)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "pending"
+    assert data["clinical_json"]["esi_level"] == 1
+    assert data["poll_url"].endswith(f"/api/triage/{data['triage_id']}")
+
+    assert client.get(f"/api/triage/{data['triage_id']}").json()["status"] == "pending"
+    gate.set()
+    polled = client.get(f"/api/triage/{data['triage_id']}", params={"wait": 5}).json()
+    assert polled["status"] == "refined"
+    assert polled["refined"]["clinical_json"]["confidence_score"] == 0.99
+    assert polled["quick"]["clinical_json"]["esi_level"] == 1
+
+
+def test_server_sent_events(client):
+    triage_id = client.post("/api/triage/fast", json=PAYLOAD).json()["triage_id"]
+    with client.stream("GET", f"/api/triage/{triage_id}/events") as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        body = "".join(response.iter_text())
+
+    events = [block.split("\n") for block in body.strip().split("\n\n")]
+    assert [lines[0] for lines in events] == ["event: quick", "event: refined"]
+    refined = json.loads(events[-1][1][len("data: "):])
+    assert refined["clinical_json"]["esi_level"] in [1, 2]
+
+
+def test_failed_refinement_reported(client, service):
+    async def broken(*args):
+        raise RuntimeError("model crashed")
+
+    service.process_triage = broken
+    triage_id = client.post("/api/triage/fast", json=PAYLOAD).json()["triage_id"]
+    polled = client.get(f"/api/triage/{triage_id}", params={"wait": 5}).json()
+    assert polled["status"] == "failed"
+    assert polled["error"] == "model crashed"
+
+
+def test_unknown_triage_id(client):
+    assert client.get("/api/triage/nope").status_code == 404
+    assert client.get("/api/triage/nope/events").status_code == 404
+
+
+def test_main_triage_endpoint_does_not_wait_for_model(service):
+    from types import SimpleNamespace
+    from unittest.mock import AsyncMock, patch
+    from backend.app import main
+    from backend.app.core.container import get_services
+
+    gate = threading.Event()
+
+    async def slow_refinement(*args):
+        await asyncio.to_thread(gate.wait, 5)
+        return service.quick_assessment(PAYLOAD["text_input"], PAYLOAD["vitals"])
+
+    service.process_triage = slow_refinement
+    main.app.dependency_overrides[get_services] = lambda: SimpleNamespace(triage=service)
+    main.app.dependency_overrides[get_triage_service] = lambda: service
+    payload = {
+        "chief_complaint": "Shortness of breath and cough",
+        "vitals": {"hr": 115, "bp_sys": 110, "bp_dia": 70, "spo2": 88, "temp": 101.5, "rr": 26},
+    }
+    try:
+        # One portal for both requests, so the refinement task outlives the POST
+        with patch("backend.app.main.log_audit_event", AsyncMock()), TestClient(main.app) as client:
+            data = client.post("/api/triage", json=payload).json()
+            assert data["esi_level"] == 1
+            assert data["status"] == "pending"
+            gate.set()
+            polled = client.get(f"/api/triage/{data['triage_id']}", params={"wait": 5}).json()
+    finally:
+        gate.set()
+        main.app.dependency_overrides.pop(get_services, None)
+        main.app.dependency_overrides.pop(get_triage_service, None)
+    assert polled["status"] == "refined"
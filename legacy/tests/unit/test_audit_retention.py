@@ -0,0 +1,118 @@
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select
+from backend.app.services.audit import AuditLog, add_months, ensure_partitions, month_start, partition_name
+from backend.app.services.audit_retention import expired_months, run_retention
+
+
+class FakePostgres:
+    """Records statements; answers the catalog queries ensure_partitions/expired_months make."""
+
+    def __init__(self, tables, default_months=()):
+        self.dialect = SimpleNamespace(name="postgresql")
+        self.tables = set(tables)
+        self.default_months = list(default_months)
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        result = MagicMock()
+        if "relkind" in sql:
+            result.scalar.return_value = "p"
+        elif "to_regclass" in sql:
+            name = sql.split("'")[1]
+            result.scalar.return_value = name if name in self.tables else None
+        elif "pg_inherits" in sql:
+            result.scalars.return_value.all.return_value = sorted(self.tables)
+        elif "date_trunc" in sql:
+            result.scalars.return_value.all.return_value = self.default_months
+        return result
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'audit.db'}")
+    SQLModel.metadata.create_all(engine, tables=[AuditLog.__table__])
+    with Session(engine) as session:
+        for month in (1, 2, 3, 6):
+            for day in (1, 15, 28):
+                session.add(AuditLog(timestamp=datetime(2026, month, day, 12), user_id="u1", action="READ_PATIENT"))
+        session.commit()
+    return engine
+
+
+def test_month_helpers():
+    assert month_start(datetime(2026, 10, 19, 8, 30)) == datetime(2026, 10, 1)
+    assert add_months(datetime(2026, 11, 1), 2) == datetime(2027, 1, 1)
+    assert add_months(datetime(2026, 1, 1), -1) == datetime(2025, 12, 1)
+    assert partition_name(datetime(2026, 3, 1)) == "auditlog_p2026_03"
+
+
+def test_composite_indexes_declared():
+    indexes = {tuple(c.name for c in index.columns) for index in AuditLog.__table__.indexes}
+    assert ("timestamp", "user_id", "action") in indexes
+
+
+def test_retention_archives_then_drops_whole_months(engine, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    archive_dir = tmp_path / "archive"
+
+    # Cutoff lands in April: January through March have fully expired
+    report = run_retention(older_than_days=60, archive_dir=str(archive_dir), engine=engine, now=datetime(2026, 6, 10))
+
+    assert [entry["month"] for entry in report] == ["2026-01", "2026-02", "2026-03"]
+    assert all(entry["rows"] == 3 for entry in report)
+    archived = pq.read_table(archive_dir / "auditlog_2026_02.parquet")
+    assert archived.num_rows == 3
+    assert archived.column("action").to_pylist() == ["READ_PATIENT"] * 3
+
+    with Session(engine) as session:
+        remaining = session.exec(select(AuditLog)).all()
+    assert {row.timestamp.month for row in remaining} == {6}
+
+
+def test_retention_without_archive(engine):
+    report = run_retention(older_than_days=60, archive_dir=None, engine=engine, now=datetime(2026, 6, 10))
+    assert len(report) == 3
+    assert all(entry["archive"] is None for entry in report)
+
+
+def test_new_partition_takes_rows_from_default():
+    conn = FakePostgres({"auditlog_default", "auditlog_p2026_06"})
+    created = ensure_partitions(conn, months_ahead=1, now=datetime(2026, 6, 10))
+    assert created == ["auditlog_p2026_06", "auditlog_p2026_07"]
+
+    july = [sql for sql in conn.statements if "auditlog_p2026_07" in sql and "to_regclass" not in sql]
+    assert july[0].startswith("CREATE TABLE auditlog_p2026_07 (LIKE auditlog")
+    assert "DELETE FROM auditlog_default" in july[1]
+    assert july[2].startswith("ALTER TABLE auditlog ATTACH PARTITION auditlog_p2026_07")
+    # The existing June partition is left alone
+    assert not any("CREATE TABLE auditlog_p2026_06" in sql for sql in conn.statements)
+
+
+def test_expired_rows_in_default_partition_are_included():
+    conn = FakePostgres({"auditlog_default", "auditlog_p2026_03", "auditlog_p2026_06"},
+                        default_months=[datetime(2026, 1, 1)])
+    months = expired_months(conn, cutoff=datetime(2026, 4, 1))
+    assert months == [(datetime(2026, 1, 1), "auditlog_default"), (datetime(2026, 3, 1), "auditlog_p2026_03")]
+
+
+def test_rearchived_month_gets_a_new_part(engine, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    archive_dir = tmp_path / "archive"
+    run_retention(older_than_days=60, archive_dir=str(archive_dir), engine=engine, now=datetime(2026, 6, 10))
+
+    # A late row for an already archived month
+    with Session(engine) as session:
+        session.add(AuditLog(timestamp=datetime(2026, 2, 20), user_id="u2", action="LOGIN"))
+        session.commit()
+    report = run_retention(older_than_days=60, archive_dir=str(archive_dir), engine=engine, now=datetime(2026, 6, 10))
+
+    assert [(entry["month"], entry["rows"]) for entry in report] == [("2026-02", 1), ("2026-03", 0)]
+    assert report[0]["archive"].endswith("auditlog_2026_02.1.parquet")
+    assert report[1]["archive"] is None  # nothing left in March: no empty part file
+    assert pq.read_table(archive_dir / "auditlog_2026_02.parquet").num_rows == 3
+    assert pq.read_table(archive_dir / "auditlog_2026_02.1.parquet").column("user_id").to_pylist() == ["u2"]
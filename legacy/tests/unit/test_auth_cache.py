@@ -0,0 +1,150 @@
+import asyncio
+import time
+from datetime import timedelta
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+from backend.app.core import auth
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    auth.token_cache.clear()
+    auth.user_cache.clear()
+    yield
+    auth.token_cache.clear()
+    auth.user_cache.clear()
+
+
+class LocalOIDCProvider:
+    """Stand-in for the hospital SSO: signs tokens and serves its JWKS over a mock transport."""
+
+    def __init__(self):
+        self.private_keys = {}
+        self.jwks_requests = 0
+        self.rotate("k1")
+
+    def rotate(self, kid):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.private_keys[kid] = key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ).decode()
+
+    def _jwks(self):
+        keys = []
+        for kid, pem in self.private_keys.items():
+            public = jwk.construct(pem, "RS256").public_key().to_dict()
+            keys.append({**public, "kid": kid, "use": "sig"})
+        return {"keys": keys}
+
+    def handler(self, request):
+        self.jwks_requests += 1
+        return httpx.Response(200, json=self._jwks())
+
+    def sign(self, kid, sub="dr_sso", lifetime=300):
+        claims = {"sub": sub, "exp": int(time.time()) + lifetime}
+        return jwt.encode(claims, self.private_keys[kid], algorithm="RS256", headers={"kid": kid})
+
+    def jwks_cache(self):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+        return auth.JWKSCache("https://sso.local/jwks", min_refresh_interval=0, client=client)
+
+
+def test_app_token_verified_once(monkeypatch):
+    calls = []
+    real_decode = auth.jwt.decode
+    monkeypatch.setattr(auth.jwt, "decode", lambda *a, **k: calls.append(1) or real_decode(*a, **k))
+
+    token = auth.create_access_token({"sub": "doctor123"})
+    for _ in range(5):
+        assert auth.decode_access_token(token)["sub"] == "doctor123"
+    assert len(calls) == 1
+
+
+def test_cache_never_outlives_exp():
+    token = auth.create_access_token({"sub": "doctor123"}, expires_delta=timedelta(seconds=2))
+    auth.decode_access_token(token)
+    (_, expires_at), = auth.token_cache._data.values()
+    assert expires_at - time.monotonic() <= 2
+
+
+def test_current_user_lookup_cached(monkeypatch):
+    lookups = []
+    real_load = auth.load_user
+
+    async def counting_load(username):
+        lookups.append(username)
+        return await real_load(username)
+
+    monkeypatch.setattr(auth, "load_user", counting_load)
+    token = auth.create_access_token({"sub": "doctor123"})
+
+    async def scenario():
+        return [await auth.get_current_user(token) for _ in range(3)]
+
+    users = asyncio.run(scenario())
+    assert {u.username for u in users} == {"doctor123"}
+    assert lookups == ["doctor123"]
+
+
+def test_sso_token_uses_cached_jwks_and_handles_rotation():
+    provider = LocalOIDCProvider()
+    cache = provider.jwks_cache()
+
+    async def scenario():
+        first = await auth.verify_hospital_sso_token(provider.sign("k1"), cache)
+        second = await auth.verify_hospital_sso_token(provider.sign("k1", sub="dr_other"), cache)
+        fetches_before_rotation = provider.jwks_requests
+        provider.rotate("k2")
+        rotated = await auth.verify_hospital_sso_token(provider.sign("k2"), cache)
+        await cache.close()
+        return first, second, fetches_before_rotation, rotated
+
+    first, second, fetches, rotated = asyncio.run(scenario())
+    assert first["sub"] == "dr_sso" and second["sub"] == "dr_other"
+    assert fetches == 1
+    assert rotated["sub"] == "dr_sso"
+    assert provider.jwks_requests == 2
+
+
+def test_sso_and_app_tokens_do_not_cross_verify():
+    provider = LocalOIDCProvider()
+    cache = provider.jwks_cache()
+    app_token = auth.create_access_token({"sub": "doctor123"})
+    sso_token = provider.sign("k1")
+
+    async def scenario():
+        assert await auth.verify_hospital_sso_token(sso_token, cache) is not None
+        rejected = await auth.verify_hospital_sso_token(app_token, cache)
+        await cache.close()
+        return rejected
+
+    assert asyncio.run(scenario()) is None
+    with pytest.raises(auth.JWTError):
+        auth.decode_access_token(sso_token)
+
+
+def test_sso_disabled_without_jwks():
+    assert asyncio.run(auth.verify_hospital_sso_token("anything")) is None
+
+
+def test_jwks_refresh_rate_limited_while_provider_is_broken():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, text="<html>maintenance</html>")
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    cache = auth.JWKSCache("https://sso.local/jwks", min_refresh_interval=60, client=client)
+    token = LocalOIDCProvider().sign("k1")
+
+    async def scenario():
+        results = [await auth.verify_hospital_sso_token(token, cache) for _ in range(5)]
+        await cache.close()
+        return results
+
+    assert asyncio.run(scenario()) == [None] * 5
+    assert len(requests) == 1
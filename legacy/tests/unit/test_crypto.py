@@ -0,0 +1,73 @@
+import pytest
+from types import SimpleNamespace
+from cryptography.fernet import Fernet
+from backend.app.core.crypto import FieldCipher, CryptoSession, ENVELOPE_PREFIX
+
+KEY = Fernet.generate_key().decode()
+
+
+@pytest.fixture
+def fernet_cipher():
+    return FieldCipher(KEY, mode="fernet")
+
+
+@pytest.fixture
+def envelope_cipher():
+    return FieldCipher(KEY, mode="aesgcm")
+
+
+def test_round_trip_both_modes(fernet_cipher, envelope_cipher):
+    for cipher in (fernet_cipher, envelope_cipher):
+        token = cipher.encrypt("Jane Doe")
+        assert token != "Jane Doe"
+        assert cipher.decrypt(token) == "Jane Doe"
+    assert envelope_cipher.encrypt("x").startswith(ENVELOPE_PREFIX)
+    assert fernet_cipher.encrypt("") == ""
+
+
+def test_reads_either_format_regardless_of_mode(fernet_cipher, envelope_cipher):
+    legacy = fernet_cipher.encrypt("legacy row")
+    envelope = envelope_cipher.encrypt("new row")
+    assert envelope_cipher.decrypt(legacy) == "legacy row"
+    assert fernet_cipher.decrypt(envelope) == "new row"
+
+
+def test_encrypt_row_shares_one_data_key(envelope_cipher):
+    row = envelope_cipher.encrypt_row({"a": "one", "b": "two"})
+    assert {k: envelope_cipher.decrypt(v, k) for k, v in row.items()} == {"a": "one", "b": "two"}
+    # Same wrapped key header, so the second field reuses the unwrapped key
+    assert len(envelope_cipher._data_keys) == 1
+
+
+def test_bulk_decrypt_matches_serial(envelope_cipher):
+    plain = [f"patient-{i}" for i in range(200)]
+    tokens = envelope_cipher.encrypt_many(plain)
+    assert envelope_cipher.decrypt_many(tokens) == plain
+    assert [envelope_cipher.decrypt(t) for t in tokens] == plain
+
+
+def test_session_memoizes_and_zeroes(fernet_cipher):
+    rows = [SimpleNamespace(name_encrypted=fernet_cipher.encrypt(f"p{i}"), ssn_encrypted="") for i in range(50)]
+    session = CryptoSession(fernet_cipher)
+    decoded = session.decrypt_rows(rows, {"name": "name_encrypted", "ssn": "ssn_encrypted"})
+    assert decoded[7] == {"name": "p7", "ssn": ""}
+
+    buffers = list(session._memo.values())
+    assert len(buffers) == 50
+    assert session.decrypt(rows[3].name_encrypted) == "p3"
+
+    session.close()
+    assert all(set(buffer) == {0} for buffer in buffers)
+    assert session.decrypt(rows[3].name_encrypted) == "p3"
+    assert not session._memo
+
+
+def test_envelope_bound_to_column(envelope_cipher):
+    from cryptography.exceptions import InvalidTag
+
+    row = envelope_cipher.encrypt_row({"ssn_encrypted": "123-45-6789", "dob_encrypted": "1970-01-01"},
+                                      table="patientdata")
+    assert envelope_cipher.decrypt(row["ssn_encrypted"], "patientdata.ssn_encrypted") == "123-45-6789"
+    # A ciphertext copied into the other column no longer decrypts
+    with pytest.raises(InvalidTag):
+        envelope_cipher.decrypt(row["ssn_encrypted"], "patientdata.dob_encrypted")
@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from backend.app.core import database
+
+
+def test_async_url_picks_async_drivers():
+    pg = database.async_url("postgresql://u:p@db:5432/clinical_suite")
+    assert pg.drivername == "postgresql+asyncpg"
+    assert pg.query["prepared_statement_cache_size"] == str(database.DB_STATEMENT_CACHE_SIZE)
+    assert database.async_url("sqlite:///./local.db").drivername == "sqlite+aiosqlite"
+
+
+def test_pool_options_only_for_server_databases():
+    pg = database._engine_options("postgresql://u:p@db/x")
+    assert pg["pool_pre_ping"] is True
+    assert pg["pool_size"] == database.DB_POOL_SIZE
+    assert "pool_size" not in database._engine_options("sqlite:///./local.db")
+
+
+def test_sqlite_fallback_end_to_end(tmp_path, monkeypatch):
+    pytest.importorskip("aiosqlite")
+    from backend.app.services.audit import AuditLog, log_audit_event
+    from sqlmodel import select
+
+    monkeypatch.setattr(database, "DATABASE_URL", "postgresql://u:p@127.0.0.1:1/unreachable")
+    monkeypatch.setattr(database, "SQLITE_FALLBACK", True)
+    monkeypatch.setattr(database, "SQLITE_URL", f"sqlite:///{tmp_path / 'local.db'}")
+
+    async def scenario():
+        await database.dispose_engines()
+        await database.init_db()
+        await log_audit_event(user_id="u1", action="LOGIN")
+        async for session in database.get_session():
+            rows = (await session.exec(select(AuditLog))).all()
+        await database.dispose_engines()
+        return rows
+
+    rows = asyncio.run(scenario())
+    assert [(r.user_id, r.action) for r in rows] == [("u1", "LOGIN")]
+
+
+def test_no_fallback_unless_enabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_URL", "postgresql://u:p@127.0.0.1:1/unreachable")
+    monkeypatch.setattr(database, "SQLITE_URL", f"sqlite:///{tmp_path / 'local.db'}")
+    monkeypatch.setattr(database, "SQLITE_FALLBACK", False)
+
+    async def scenario():
+        await database.dispose_engines()
+        try:
+            await database.init_db()
+        finally:
+            await database.dispose_engines()
+
+    with pytest.raises((ImportError, OSError, database.OperationalError)):
+        asyncio.run(scenario())
+    assert not (tmp_path / "local.db").exists()
+
@@ -0,0 +1,81 @@
+import pytest
+from tokenizers import Regex, Tokenizer, models, pre_tokenizers, processors, trainers
+from transformers import PreTrainedTokenizerFast
+
+from backend.models.prompt_templates import PROMPTS, PromptTemplate, format_context
+
+
+class CharTokenizer:
+    """One token per character, counting how much text it was asked to encode."""
+    name_or_path = "char"
+    bos_token_id = 0
+
+    def __init__(self):
+        self.encoded_chars = 0
+
+    def __len__(self):
+        return 256
+
+    def encode(self, text, add_special_tokens=True):
+        self.encoded_chars += len(text)
+        ids = [ord(c) % 255 + 1 for c in text]
+        return [self.bos_token_id] + ids if add_special_tokens else ids
+
+
+SLOT_VALUES = {
+    "context": "vitals: HR 120, BP 90/60\ncomplaint: chest pain",
+    "vignette": "You are an emergency physician writing a SOAP note.",
+    "patient_context": "58 y/o male, HTN, on lisinopril",
+    "encounter_type": "ED visit",
+    "encounter_text": "Crushing chest pain radiating to the left arm.",
+}
+
+
+@pytest.fixture(scope="module")
+def sentencepiece_tokenizer():
+    """A small BPE that, like Gemma, attaches spaces to the next word and keeps newlines apart."""
+    backend = Tokenizer(models.BPE(unk_token="<unk>"))
+    backend.pre_tokenizer = pre_tokenizers.Sequence([
+        pre_tokenizers.Split(Regex("\n"), behavior="isolated"),
+        pre_tokenizers.Metaspace(prepend_scheme="never"),
+    ])
+    corpus = [template.text for template in PROMPTS._templates.values()] + list(SLOT_VALUES.values())
+    backend.train_from_iterator(
+        corpus, trainers.BpeTrainer(vocab_size=400, special_tokens=["<pad>", "<bos>", "<unk>"])
+    )
+    backend.post_processor = processors.TemplateProcessing(
+        single="<bos> $A", special_tokens=[("<bos>", backend.token_to_id("<bos>"))]
+    )
+    return PreTrainedTokenizerFast(tokenizer_object=backend, bos_token="<bos>", pad_token="<pad>", unk_token="<unk>")
+
+
+def test_render_matches_format():
+    context = {"vitals": "stable", "complaint": "pain"}
+    prompt = PROMPTS.get("triage").render(context=format_context(context))
+    assert prompt == PROMPTS.get("triage").text.format(context="vitals: stable\ncomplaint: pain")
+    assert "\\n" not in prompt
+
+def test_encode_only_tokenizes_variable_parts():
+    tokenizer = CharTokenizer()
+    template = PROMPTS.get("triage")
+    template.encode(tokenizer, context="warmup")
+
+    tokenizer.encoded_chars = 0
+    ids = template.encode(tokenizer, context="HR: 120")
+    assert tokenizer.encoded_chars == len("HR: 120")
+    assert ids == tokenizer.encode(template.render(context="HR: 120"))
+
+def test_template_key_tracks_version_and_text():
+    a = PromptTemplate("t", "Hello {name}", version="1")
+    b = PromptTemplate("t", "Hello {name}", version="2")
+    c = PromptTemplate("t", "Hi {name}", version="1")
+    assert len({a.key, b.key, c.key}) == 3
+
+@pytest.mark.parametrize("name", sorted(PROMPTS._templates))
+def test_encode_matches_tokenizing_rendered_prompt(name, sentencepiece_tokenizer):
+    template = PROMPTS.get(name)
+    values = {field: SLOT_VALUES[field] for field in template.fields if field is not None}
+    full_text = template.render(**values)
+
+    assert full_text == template.text.format(**values)
+    assert template.encode(sentencepiece_tokenizer, **values) == sentencepiece_tokenizer(full_text)["input_ids"]
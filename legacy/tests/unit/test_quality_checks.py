@@ -0,0 +1,31 @@
+from backend.app.services.quality_checks import QualityChecker, compile_rules
+
+NOTE = {
+    "subjective": "55yo male with crushing chest pain radiating to the left arm.",
+    "objective": "HR 110, BP 90/60. ECG shows ST elevation. Troponin pending.",
+    "assessment": "Suspected STEMI, I21.9. Rule out aortic dissection X99.9.",
+    "plan": "Cath lab activation, aspirin given. Bill CPT 99283 and CPT 12345. WBC 12000."
+}
+
+def test_run_all_single_pass_results():
+    result = QualityChecker.run_all(NOTE, ["ECG", "Troponin", "Cath Lab Activation", "Time of onset"])
+    assert result["is_complete"]
+    assert result["missing_requirements"] == ["Time of onset"]
+    assert result["issues"] == ["Unrecognized ICD-10 code: X99.9", "Unrecognized CPT code: 12345"]
+    assert set(result["timings_ms"]) == {"normalize", "completeness", "required_terms", "terminology", "total"}
+
+def test_incomplete_sections():
+    result = QualityChecker.run_all({"subjective": "Headache", "plan": ""}, [])
+    assert not result["is_complete"]
+    assert len(result["issues"]) == 4
+
+def test_rules_compiled_once_per_template():
+    requirements = ("ECG", "Troponin")
+    assert compile_rules(requirements) is compile_rules(requirements)
+
+def test_overlapping_requirements_all_found():
+    assert QualityChecker.run_all(NOTE, ["chest pain", "pain"])["missing_requirements"] == []
+    assert QualityChecker.run_all(NOTE, ["chest", "chest pain", "left arm"])["missing_requirements"] == []
+    found, icd10, _ = compile_rules(("STEMI", "Suspected STEMI")).scan(NOTE["assessment"])
+    assert found == {0, 1}
+    assert icd10 == ["I21.9", "X99.9"]
@@ -0,0 +1,147 @@
+import asyncio
+import ipaddress
+import time
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from backend.app.core import auth, rate_limit
+from backend.app.core.rate_limit import LocalBucketStore, TokenBucketLimiter, parse_rate, rate_limit_key
+from backend.app.services.triage_rules import is_emergent, rule_based_esi
+
+
+def _app(limiter):
+    app = FastAPI()
+
+    @app.post("/triage")
+    async def triage(request: Request, emergent: bool = False):
+        await limiter.check("triage", request, priority=emergent)
+        return {"ok": True}
+
+    return app
+
+
+def test_parse_rate():
+    assert parse_rate("5/minute") == (5, 5 / 60)
+    assert parse_rate("100 / hours") == (100, 100 / 3600)
+    with pytest.raises(ValueError):
+        parse_rate("5 per minute")
+
+
+def test_bucket_empties_then_reports_retry_after():
+    limiter = TokenBucketLimiter({"triage": "3/minute"})
+
+    async def scenario():
+        return [await limiter.hit("triage", "user:a") for _ in range(4)]
+
+    decisions = asyncio.run(scenario())
+    assert [d.allowed for d in decisions] == [True, True, True, False]
+    assert 0 < decisions[-1].retry_after <= 20
+
+
+def test_users_behind_one_ip_get_their_own_buckets():
+    client = TestClient(_app(TokenBucketLimiter({"triage": "2/minute"})))
+    alice = {"Authorization": f"Bearer {auth.create_access_token({'sub': 'alice'})}"}
+    bob = {"Authorization": f"Bearer {auth.create_access_token({'sub': 'bob'})}"}
+
+    assert [client.post("/triage", headers=alice).status_code for _ in range(3)] == [200, 200, 429]
+    assert client.post("/triage", headers=bob).status_code == 200
+    assert "Retry-After" in client.post("/triage", headers=alice).headers
+
+
+def test_priority_lane_never_throttled():
+    limiter = TokenBucketLimiter({"triage": "1/minute"})
+    client = TestClient(_app(limiter))
+    headers = {"X-Department": "ed-north"}
+
+    assert client.post("/triage", headers=headers).status_code == 200
+    assert client.post("/triage", headers=headers).status_code == 429
+    assert all(client.post("/triage", headers=headers, params={"emergent": True}).status_code == 200 for _ in range(20))
+    assert limiter.priority_passed == 20
+
+
+def _request(headers, host="10.0.0.5"):
+    scope = {"type": "http", "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()], "client": (host, 1234)}
+    return Request(scope)
+
+
+def test_key_falls_back_from_user_to_department_to_ip(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/24")])
+    token = auth.create_access_token({"sub": "alice"})
+    assert rate_limit_key(_request({"Authorization": f"Bearer {token}", "X-Department": "ed"})) == "user:alice"
+    assert rate_limit_key(_request({"Authorization": "Bearer junk", "X-Department": "ed"})) == "dept:ed"
+    assert rate_limit_key(_request({})) == "ip:10.0.0.5"
+
+
+def test_department_header_only_trusted_from_proxy(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/24")])
+    monkeypatch.setattr(rate_limit, "PROXY_SECRET", "s3cret")
+    assert rate_limit_key(_request({"X-Department": "ed"}, host="192.168.1.9")) == "ip:192.168.1.9"
+    assert rate_limit_key(_request({"X-Department": "ed", "X-Proxy-Secret": "guess"}, host="192.168.1.9")) == "ip:192.168.1.9"
+    assert rate_limit_key(_request({"X-Department": "ed", "X-Proxy-Secret": "s3cret"}, host="192.168.1.9")) == "dept:ed"
+
+    # Made-up departments from a client can't buy extra requests
+    client = TestClient(_app(TokenBucketLimiter({"triage": "5/minute"})))
+    codes = [client.post("/triage", headers={"X-Department": f"dept-{i}"}).status_code for i in range(100)]
+    assert codes.count(200) == 5
+
+
+def test_full_buckets_are_evicted():
+    store = LocalBucketStore(sweep_interval=0)
+
+    async def scenario():
+        for i in range(50):
+            await store.take(f"dept:{i}", capacity=5, rate=1000)
+        time.sleep(0.01)  # every bucket refills in 1ms
+        await store.take("dept:new", capacity=5, rate=1000)
+
+    asyncio.run(scenario())
+    assert len(store) == 1
+
+
+def test_redis_failure_falls_back_to_local_buckets():
+    class BrokenRedis:
+        def register_script(self, script):
+            async def run(keys, args):
+                raise ConnectionError("redis down")
+            return run
+
+    limiter = TokenBucketLimiter({"triage": "1/minute"})
+    limiter.use_redis(BrokenRedis())
+
+    async def scenario():
+        return [(await limiter.hit("triage", "user:a")).allowed for _ in range(2)]
+
+    assert asyncio.run(scenario()) == [True, False]
+
+
+def test_emergent_vitals_pre_score():
+    assert rule_based_esi("cough", {"spo2": 85}) == (1, 0.95)
+    assert is_emergent("crushing chest pain", {"hr": 80})
+    assert not is_emergent("ankle sprain", {"hr": 80, "spo2": 99})
+
+
+def test_repeated_identical_notes_are_limited(monkeypatch):
+    from types import SimpleNamespace
+    from unittest.mock import AsyncMock
+    from fastapi_cache import FastAPICache
+    from fastapi_cache.backends.inmemory import InMemoryBackend
+    from backend.app import main
+    from backend.app.core.container import get_services
+
+    documentation = SimpleNamespace(generate_note=AsyncMock(return_value={"plain_text": "note"}))
+    monkeypatch.setattr(main, "log_audit_event", AsyncMock())
+    monkeypatch.setattr(main.limiter, "local", rate_limit.LocalBucketStore())
+    monkeypatch.setattr(main.limiter, "store", main.limiter.local)
+    main.app.dependency_overrides[get_services] = lambda: SimpleNamespace(documentation=documentation)
+    FastAPICache.init(InMemoryBackend(), prefix="test-rate-limit")
+    try:
+        client = TestClient(main.app)
+        capacity, _ = main.limiter.limits["generate_note"]
+        codes = [client.post("/api/generate-note", json={"encounter_text": "same note"}).status_code
+                 for _ in range(capacity + 1)]
+    finally:
+        main.app.dependency_overrides.pop(get_services, None)
+        FastAPICache.reset()
+    # With the response cache live, identical requests still spend tokens
+    assert codes == [200] * capacity + [429]
+    assert documentation.generate_note.await_count == capacity
@@ -0,0 +1,92 @@
+import json
+from backend.app.services.red_flags import RedFlagMatcher, get_matcher
+from backend.app.services.triage_rules import rule_based_esi
+from backend.app.services.triage_service import TriageService
+
+
+def test_bundled_lexicon_is_versioned_and_large():
+    matcher = get_matcher()
+    assert matcher.version
+    assert matcher.terms >= 300
+    assert {"acs", "stroke", "sepsis", "anaphylaxis"} <= set(matcher.esi)
+
+
+def test_all_terms_and_categories_in_one_pass():
+    text = "Crushing chest pain radiating to the left arm, diaphoretic, now with facial droop"
+    scan = get_matcher().scan(text)
+    assert scan.categories == ["acs", "cardiac", "stroke"]
+    assert scan.red_flags() == ["Acute Coronary Syndrome", "Stroke"]
+    terms = {m.term for m in scan.matches}
+    assert {"crushing chest pain", "chest pain", "pain radiating to the left arm", "diaphoretic", "facial droop"} <= terms
+    first = scan.matches[0]
+    assert text[first.start:first.end] == "Crushing chest pain"
+
+
+def test_word_boundaries_and_spelling_variants():
+    matcher = get_matcher()
+    assert matcher.scan("Strokes of luck; throat lozenges").categories == []
+    assert matcher.scan("One-sided weakness").categories == ["stroke"]
+    assert matcher.scan("I CAN'T BREATHE").categories == ["respiratory"]
+
+
+def test_negation_window():
+    matcher = get_matcher()
+    assert matcher.scan("Denies chest pain").categories == []
+    assert matcher.scan("Denies chest pain").negated == ["acs", "cardiac"]
+    # Across a list only ESI-neutral categories are negated; the red flag stands
+    assert matcher.scan("No fever or chest pain").categories == ["acs"]
+    # Scope ends at "but", "," / sentence end, and after `window` tokens
+    assert matcher.scan("No fever, SOB or chest pain").categories == ["respiratory", "acs", "cardiac"]
+    assert matcher.scan("No fever but chest pain").categories == ["acs", "cardiac"]
+    assert matcher.scan("No fever. Slurred speech").categories == ["stroke"]
+    assert matcher.scan("No cough for the last few weeks and now stroke symptoms").categories == ["stroke"]
+
+
+def test_negation_does_not_hide_red_flags():
+    # Each of these scored ESI 3 when negation ran to the end of the window
+    for complaint in (
+        "Pt with no PMH presents with crushing chest pain",
+        "denies fever, reports chest pain",
+        "no relief from nitro for chest pain",
+        "resolved headache, now slurred speech",
+    ):
+        assert rule_based_esi(complaint, {"hr": 80})[0] == 2, complaint
+    assert get_matcher().scan("Pt with no PMH presents with crushing chest pain").negated == []
+
+
+def test_pseudo_negation():
+    matcher = RedFlagMatcher({"cough": {"terms": ["cough"]}}, cues=["no"], pseudo=["no change"])
+    assert matcher.scan("no cough").categories == []
+    assert matcher.scan("no change in cough").categories == ["cough"]
+
+
+def test_lexicon_from_file(tmp_path):
+    path = tmp_path / "lexicon.json"
+    path.write_text(json.dumps({
+        "version": "test-1",
+        "negation": {"cues": ["no"], "window": 2},
+        "categories": {"burn": {"label": "Burn", "esi": 2, "terms": ["burn", "scald burn"]}},
+    }))
+    matcher = get_matcher(str(path))
+    assert matcher.version == "test-1"
+    assert matcher.scan("scald burn to hand").red_flags() == ["Burn"]
+
+
+def test_overlapping_terms_through_failure_links():
+    matcher = RedFlagMatcher({
+        "a": {"terms": ["left arm"], "esi": 2},
+        "b": {"terms": ["pain radiating to left", "radiating to left arm pain"]},
+    })
+    scan = matcher.scan("pain radiating to left arm pain")
+    assert sorted(m.term for m in scan.matches) == ["left arm", "pain radiating to left", "radiating to left arm pain"]
+    assert scan.esi_ceiling() == 2
+
+
+def test_triage_uses_matcher():
+    assert rule_based_esi("denies chest pain, ankle sprain", {"hr": 80}) == (3, 0.85)
+    assert rule_based_esi("throat closing after eating shrimp", {"hr": 80}) == (2, 0.92)
+
+    result = TriageService().quick_assessment("Stomach pain, denies chest pain", {"hr": 80})
+    clinical = result["clinical_json"]
+    assert clinical["esi_level"] == 3
+    assert clinical["follow_up_questions"][0] == "Is the pain constant or does it come and go?"
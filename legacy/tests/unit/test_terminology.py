@@ -0,0 +1,36 @@
+from backend.app.services.terminology import CodeIndex, get_code_index, normalize_code
+
+def test_validation_and_description():
+    index = get_code_index()
+    assert index.is_valid("ICD10", "R10.9")
+    assert index.is_valid("ICD10", "r109")
+    assert not index.is_valid("ICD10", "X99.9")
+    assert index.describe("CPT", "99283") == "Emergency department visit, level 3"
+    assert index.describe("CPT", "00000") is None
+
+def test_prefix_search():
+    results = get_code_index().prefix_search("ICD10", "R10")
+    assert results
+    assert all(code.startswith("R10") for code, _ in results)
+    assert [code for code, _ in results] == sorted(code for code, _ in results)
+
+def test_partition_and_suggest():
+    index = get_code_index()
+    valid, invalid = index.partition("ICD10", ["R10.9", "R109", "ZZZ"])
+    assert valid == ["R10.9"]
+    assert invalid == ["ZZZ"]
+    codes = [code for code, _ in index.suggest("Acute abdominal pain, likely gastroenteritis")]
+    assert any(code.startswith("R10") for code in codes)
+
+def test_saved_index_is_memory_mapped(tmp_path):
+    get_code_index().save(str(tmp_path))
+    index = CodeIndex.load(str(tmp_path))
+    assert index.is_valid("ICD10", "I21.9")
+    assert index.prefix_search("CPT", "9928") == get_code_index().prefix_search("CPT", "9928")
+
+def test_partition_rejects_non_ascii_codes():
+    index = get_code_index()
+    assert not index.is_valid("ICD10", "R10.9\u00e9")
+    assert index.prefix_search("ICD10", "R1\u00e9") == []
+    codes = ["R10.9", "I21.9", "99283", normalize_code("ICD10", "J189"), "R10.9\u00e9"]
+    assert index.partition("ICD10", codes) == (["R10.9", "I21.9", "J18.9"], ["99283", "R10.9\u00e9"])
@@ -0,0 +1,179 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from backend.app.services.triage_rules import vital_band, vitals_esi
+from backend.app.services.vitals_stream import (
+    RingBuffer, VitalReading, VitalsStreamProcessor, poll_vitals_table, queue_source,
+)
+
+
+def test_ring_buffer_keeps_newest():
+    buffer = RingBuffer(capacity=3)
+    for t in range(5):
+        buffer.push(float(t), 60.0 + t)
+    assert len(buffer) == 3
+    assert buffer.latest() == (4.0, 64.0)
+    assert buffer.recent() == [(4.0, 64.0), (3.0, 63.0), (2.0, 62.0)]
+    assert buffer.recent(count=5, since=3.0) == [(4.0, 64.0), (3.0, 63.0)]
+
+
+def test_bands_match_snapshot_triage():
+    assert vital_band("spo2", 88) == 1
+    assert vital_band("hr", 105) == 2
+    assert vital_band("temp", 104) == 3
+    assert vitals_esi({"hr": 105, "spo2": 88}) == (1, 0.95)
+    assert vitals_esi({"hr": 80, "spo2": None}) == (3, 0.85)
+
+
+def test_escalates_once_confirmed_and_stays_escalated():
+    processor = VitalsStreamProcessor(confirm=2)
+    processor.admit("p1", esi_level=3)
+    updates = [("spo2", 97), ("spo2", 86), ("spo2", 97), ("spo2", 87), ("spo2", 85), ("spo2", 98)]
+    events = [processor.update(VitalReading("p1", vital, value, float(t))) for t, (vital, value) in enumerate(updates)]
+
+    # A lone 86% between normal readings is treated as artifact; two in a row escalate
+    escalations = [e for e in events if e is not None]
+    assert len(escalations) == 1
+    assert escalations[0].patient_id == "p1"
+    assert (escalations[0].previous_esi, escalations[0].esi_level, escalations[0].value) == (3, 1, 85)
+    assert events.index(escalations[0]) == 4
+    assert processor.watching("p1").esi_level == 1
+
+    # Re-triage resets the level
+    processor.admit("p1", esi_level=2)
+    assert processor.watching("p1").esi_level == 2
+
+
+def test_only_band_changes_recompute():
+    processor = VitalsStreamProcessor(confirm=1)
+    processor.admit("p1", esi_level=3)
+    for t, hr in enumerate([80, 82, 85, 90, 88, 104, 108, 110]):
+        processor.update(VitalReading("p1", "hr", hr, float(t)))
+    processor.update(VitalReading("p1", "temp", 101.2, 9.0))
+    processor.update(VitalReading("someone-else", "hr", 150, 9.0))
+    stats = processor.stats()
+    assert stats["readings"] == 10
+    assert stats["recomputed"] == 1
+    assert stats["escalations"] == 1
+    assert stats["ignored"] == 1
+
+
+def test_stale_readings_do_not_confirm():
+    processor = VitalsStreamProcessor(confirm=2, window_seconds=60)
+    processor.admit("p1", esi_level=3)
+    assert processor.update(VitalReading("p1", "hr", 140, 0.0)) is None
+    assert processor.update(VitalReading("p1", "hr", 140, 600.0)) is None
+    assert processor.update(VitalReading("p1", "hr", 140, 630.0)).esi_level == 1
+
+
+def test_run_over_local_queue_for_a_full_waiting_room():
+    processor = VitalsStreamProcessor(confirm=1)
+    for i in range(300):
+        processor.admit(f"p{i}", esi_level=3)
+
+    async def scenario():
+        queue = asyncio.Queue()
+        for t in range(20):
+            for i in range(300):
+                hr = 140 if i == 7 and t >= 10 else 80 + t % 5
+                queue.put_nowait(VitalReading(f"p{i}", "hr", hr, float(t)))
+        queue.put_nowait(None)
+        return [event async for event in processor.run(queue_source(queue))]
+
+    events = asyncio.run(scenario())
+    assert [(e.patient_id, e.esi_level) for e in events] == [("p7", 1)]
+    assert processor.stats()["recomputed"] == 1
+
+
+def test_polls_prisma_vital_table(tmp_path):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    start = datetime(2026, 1, 1, 12, 0, 0)
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'vitals.db'}")
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                'CREATE TABLE "Vital" (id TEXT PRIMARY KEY, "userId" TEXT, type TEXT, value REAL, '
+                'unit TEXT, status TEXT, timestamp DATETIME)'
+            ))
+            rows = [
+                ("v1", "p1", "HEART_RATE", 80, 0), ("v2", "p1", "GLUCOSE", 300, 1),
+                ("v3", "p1", "OXYGEN_SATURATION", 84, 2), ("v4", "p2", "HEART_RATE", 150, 3),
+            ]
+            for row_id, user, kind, value, minutes in rows:
+                await conn.execute(
+                    text('INSERT INTO "Vital" (id, "userId", type, value, unit, timestamp) VALUES (:i, :u, :k, :v, \'\', :t)'),
+                    {"i": row_id, "u": user, "k": kind, "v": value, "t": start + timedelta(minutes=minutes)},
+                )
+        readings = [r async for r in poll_vitals_table(after=(start - timedelta(seconds=1), ""), batch_size=2,
+                                                        engine=engine, once=True)]
+        processor = VitalsStreamProcessor(confirm=1)
+        processor.admit("p1", esi_level=3)
+        events = []
+        for reading in readings:
+            event = processor.update(reading)
+            if event:
+                events.append(event)
+        await engine.dispose()
+        return readings, events
+
+    readings, events = asyncio.run(scenario())
+    assert [(r.patient_id, r.vital, r.value) for r in readings] == [("p1", "hr", 80), ("p1", "spo2", 84), ("p2", "hr", 150)]
+    assert readings[1].timestamp - readings[0].timestamp == 120
+    assert [(e.patient_id, e.vital, e.esi_level) for e in events] == [("p1", "spo2", 1)]
+
+
+def test_polling_picks_up_late_commits_once(tmp_path):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    start = datetime(2026, 1, 1, 12, 0, 0)
+    insert = text('INSERT INTO "Vital" (id, "userId", type, value, timestamp) VALUES (:i, \'p1\', \'HEART_RATE\', :v, :t)')
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'vitals.db'}")
+        async with engine.begin() as conn:
+            await conn.execute(text('CREATE TABLE "Vital" (id TEXT PRIMARY KEY, "userId" TEXT, type TEXT, value REAL, timestamp DATETIME)'))
+            await conn.execute(insert, {"i": "b", "v": 90, "t": start + timedelta(seconds=10)})
+        stream = poll_vitals_table(interval=0, after=(start, ""), engine=engine, lookback=30)
+        first = await stream.__anext__()
+        # Committed late: its timestamp is before the row already read
+        async with engine.begin() as conn:
+            await conn.execute(insert, {"i": "a", "v": 80, "t": start + timedelta(seconds=5)})
+            await conn.execute(insert, {"i": "c", "v": 100, "t": start + timedelta(seconds=20)})
+        rest = [await stream.__anext__(), await stream.__anext__()]
+        await stream.aclose()
+        await engine.dispose()
+        return [first] + rest
+
+    assert [r.value for r in asyncio.run(scenario())] == [90, 80, 100]
+
+
+def test_idle_patients_discharged():
+    processor = VitalsStreamProcessor(auto_admit=True, idle_discharge=600)
+    processor.update(VitalReading("p1", "hr", 80, 0.0))
+    processor.update(VitalReading("p2", "hr", 80, 500.0))
+    processor.update(VitalReading("p2", "hr", 80, 1000.0))
+    assert processor.watching("p1") is None
+    assert processor.watching("p2") is not None
+    assert processor.stats()["discharged"] == 1
+
+
+def test_admitted_patient_survives_first_sweep():
+    processor = VitalsStreamProcessor(idle_discharge=600)
+    processor.admit("p1", esi_level=2)
+    processor.admit("p2", esi_level=3)
+    processor.update(VitalReading("p2", "hr", 80, 1000.0))
+    assert processor.watching("p1").esi_level == 2
+    assert processor.stats()["discharged"] == 0
+    # Idle is counted from the sweep that first saw p1
+    processor.update(VitalReading("p2", "hr", 80, 1700.0))
+    assert processor.watching("p1") is None
+
+    processor.admit("p3", esi_level=2, now=1650.0)
+    processor.update(VitalReading("p2", "hr", 80, 2200.0))
+    assert processor.watching("p3") is not None
@@ -1,7 +1,27 @@
+import os
+import hashlib
 import torch
 from datasets import load_dataset
 from typing import Dict, List
 
+# Version of the prompt layout produced by format_instruction. Bump it whenever
+# the template changes so previously tokenized datasets are not reused.
+TEMPLATE_VERSION = "1"
+
+TASK_INSTRUCTIONS = {
+    "triage": "Based on the following patient symptoms and vitals, determine the ESI (Emergency Severity Index) level from 1 (highest urgency) to 5 (lowest urgency).",
+    "red_flag": "Identify any life-threatening 'red-flag' conditions from the clinical text provided. List them if found, or state 'None'.",
+    "soap": "Generate a structured SOAP (Subjective, Objective, Assessment, Plan) note from the following clinical notes.",
+}
+
+def _prompt_prefix(task_type: str) -> str:
+    instruction = TASK_INSTRUCTIONS.get(task_type, "")
+    return f"### Task: {task_type.upper()}\n### Instruction:\n{instruction}\n\n### Input:\n"
+
+# Fixed part of each task's prompt, built once instead of per example
+PROMPT_PREFIXES = {task: _prompt_prefix(task) for task in TASK_INSTRUCTIONS}
+RESPONSE_MARKER = "\n\n### Response:\n"
+
 def format_instruction(task_type: str, input_text: str, target_text: str = None) -> str:
     """
     Formats the clinical input into a prompt structure for MedGemma.
@@ -11,23 +31,8 @@ def format_instruction(task_type: str, input_text: str, target_text: str = None)
     - 'red_flag': Detection of critical conditions
     - 'soap': Generation of SOAP notes
     """
-    
-    prefix = f"### Task: {task_type.upper()}\n"
-    instruction = ""
-    
-    if task_type == "triage":
-        instruction = "Based on the following patient symptoms and vitals, determine the ESI (Emergency Severity Index) level from 1 (highest urgency) to 5 (lowest urgency)."
-    elif task_type == "red_flag":
-        instruction = "Identify any life-threatening 'red-flag' conditions from the clinical text provided. List them if found, or state 'None'."
-    elif task_type == "soap":
-        instruction = "Generate a structured SOAP (Subjective, Objective, Assessment, Plan) note from the following clinical notes."
-    
-    prompt = f"{prefix}### Instruction:\n{instruction}\n\n### Input:\n{input_text}\n\n### Response:\n"
-    
-    if target_text:
-        prompt += f"{target_text}"
-        
-    return prompt
+    prefix = PROMPT_PREFIXES.get(task_type) or _prompt_prefix(task_type)
+    return f"{prefix}{input_text}{RESPONSE_MARKER}{target_text or ''}"
 
 def preprocess_function(examples, tokenizer, max_length=1024):
     """
@@ -54,6 +59,37 @@ def preprocess_function(examples, tokenizer, max_length=1024):
     
     return model_inputs
 
+def tokenization_cache_key(tokenizer, dataset, max_length=1024) -> str:
+    """
+    Fingerprint for a tokenized dataset: tokenizer, template version and
+    a hash of the source data. Used as the `datasets` Arrow cache key.
+    """
+    digest = hashlib.sha256()
+    digest.update(getattr(tokenizer, "name_or_path", type(tokenizer).__name__).encode())
+    digest.update(str(len(tokenizer)).encode())
+    digest.update(TEMPLATE_VERSION.encode())
+    digest.update(str(max_length).encode())
+    for split in sorted(dataset.keys()):
+        digest.update(split.encode())
+        digest.update(dataset[split]._fingerprint.encode())
+    return digest.hexdigest()[:32]
+
+def tokenize_with_cache(dataset, tokenizer, cache_dir, max_length=1024):
+    """
+    Tokenize every split once and persist the token ids as Arrow files in
+    `cache_dir`. Later runs with the same key memory-map them instead of
+    re-running preprocess_function.
+    """
+    key = tokenization_cache_key(tokenizer, dataset, max_length)
+    os.makedirs(cache_dir, exist_ok=True)
+    return dataset.map(
+        lambda x: preprocess_function(x, tokenizer, max_length),
+        batched=True,
+        remove_columns=dataset["train"].column_names,
+        cache_file_names={split: os.path.join(cache_dir, f"{split}-{key}.arrow") for split in dataset},
+        load_from_cache_file=True,
+    )
+
 class ClinicalDatasetLoader:
     """
     Handles loading and splitting of clinical datasets.
@@ -0,0 +1,168 @@
+import numpy as np
+from typing import Dict, Iterable, Sequence
+
+ESI_LEVELS = 5
+
+
+def _to_numpy(values) -> np.ndarray:
+    # Trainer hands over torch tensors when batch_eval_metrics is enabled
+    if hasattr(values, "detach"):
+        values = values.detach().cpu().numpy()
+    return np.asarray(values)
+
+
+def preprocess_logits_for_metrics(logits, labels):
+    """
+    Reduce logits to token ids on-device, before the Trainer gathers them.
+
+    Without this the Trainer accumulates (batch, seq_len, vocab) logits for
+    the whole validation set; with it only (batch, seq_len) ids are kept.
+    """
+    if isinstance(logits, tuple):
+        logits = logits[0]
+    return logits.argmax(dim=-1)
+
+
+class TokenAccuracy:
+    """Next-token accuracy over non-padding positions, updated per batch."""
+
+    def __init__(self, ignore_index: int = -100):
+        self.ignore_index = ignore_index
+        self.reset()
+
+    def reset(self):
+        self.correct = 0
+        self.total = 0
+
+    def update(self, predictions, labels):
+        predictions, labels = _to_numpy(predictions), _to_numpy(labels)
+        # Prediction at position i is for the token at position i + 1
+        predictions, labels = predictions[:, :-1], labels[:, 1:]
+        mask = labels != self.ignore_index
+        self.correct += int((predictions[mask] == labels[mask]).sum())
+        self.total += int(mask.sum())
+
+    def compute(self) -> Dict[str, float]:
+        return {"accuracy": self.correct / self.total if self.total else 0.0}
+
+
+class TriageConfusionMatrix:
+    """
+    ESI confusion matrix (rows = true level, columns = predicted level).
+
+    Per-class sensitivity is what matters clinically: a missed ESI-1 is far
+    worse than a missed ESI-4, and a weighted average hides that.
+    """
+
+    def __init__(self, num_levels: int = ESI_LEVELS):
+        self.num_levels = num_levels
+        self.reset()
+
+    def reset(self):
+        self.matrix = np.zeros((self.num_levels, self.num_levels), dtype=np.int64)
+
+    def update(self, y_true: Iterable[int], y_pred: Iterable[int]):
+        y_true = self._levels(y_true, "y_true")
+        y_pred = self._levels(y_pred, "y_pred")
+        if y_true.shape != y_pred.shape:
+            raise ValueError(f"y_true and y_pred differ in length ({y_true.size} vs {y_pred.size})")
+        np.add.at(self.matrix, (y_true - 1, y_pred - 1), 1)
+
+    def _levels(self, values: Iterable[int], name: str) -> np.ndarray:
+        levels = _to_numpy(list(values)).astype(np.int64)
+        bad = levels[(levels < 1) | (levels > self.num_levels)]
+        if bad.size:
+            raise ValueError(f"{name} has ESI level {int(bad[0])}; expected 1..{self.num_levels}")
+        return levels
+
+    def compute(self) -> Dict[str, float]:
+        support = self.matrix.sum(axis=1)
+        predicted = self.matrix.sum(axis=0)
+        true_pos = np.diag(self.matrix)
+        total = support.sum()
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            recall = np.where(support > 0, true_pos / support, 0.0)
+            precision = np.where(predicted > 0, true_pos / predicted, 0.0)
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+        weights = support / total if total else np.zeros_like(support, dtype=float)
+        # Under-triage: predicted level is less urgent (higher number) than truth
+        under_triage = np.triu(self.matrix, k=1).sum()
+
+        results = {
+            "triage_accuracy": float(true_pos.sum() / total) if total else 0.0,
+            "triage_f1": float((f1 * weights).sum()),
+            "triage_sensitivity": float((recall * weights).sum()),
+            "triage_undertriage_rate": float(under_triage / total) if total else 0.0,
+        }
+        for level in range(self.num_levels):
+            results[f"triage_sensitivity_esi{level + 1}"] = float(recall[level])
+        return results
+
+
+class RedFlagCounter:
+    """Binary precision/recall counts for red-flag detection."""
+
+    def __init__(self, pos_label: int = 1):
+        self.pos_label = pos_label
+        self.reset()
+
+    def reset(self):
+        self.tp = self.fp = self.fn = 0
+
+    def update(self, y_true: Iterable[int], y_pred: Iterable[int]):
+        y_true = _to_numpy(list(y_true)) == self.pos_label
+        y_pred = _to_numpy(list(y_pred)) == self.pos_label
+        self.tp += int((y_true & y_pred).sum())
+        self.fp += int((~y_true & y_pred).sum())
+        self.fn += int((y_true & ~y_pred).sum())
+
+    def compute(self) -> Dict[str, float]:
+        precision = self.tp / (self.tp + self.fp) if self.tp + self.fp else 0.0
+        recall = self.tp / (self.tp + self.fn) if self.tp + self.fn else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        return {
+            "redflag_precision": precision,
+            "redflag_recall": recall,
+            "redflag_f1": f1
+        }
+
+
+class RougeAccumulator:
+    """
+    Running mean of ROUGE F-measures.
+
+    Each (prediction, reference) pair is scored as it arrives and only the
+    sums are kept. The rouge_score package is imported on first update.
+    """
+
+    def __init__(self, rouge_types: Sequence[str] = ("rouge1", "rouge2", "rougeL"), use_stemmer: bool = True):
+        self.rouge_types = list(rouge_types)
+        self.use_stemmer = use_stemmer
+        self._scorer = None
+        self.reset()
+
+    def reset(self):
+        self.sums = {rouge_type: 0.0 for rouge_type in self.rouge_types}
+        self.count = 0
+
+    @property
+    def scorer(self):
+        if self._scorer is None:
+            from rouge_score import rouge_scorer
+            self._scorer = rouge_scorer.RougeScorer(self.rouge_types, use_stemmer=self.use_stemmer)
+        return self._scorer
+
+    def update(self, predictions: Iterable[str], references: Iterable[str]):
+        for prediction, reference in zip(predictions, references):
+            scores = self.scorer.score(reference, prediction)
+            for rouge_type in self.rouge_types:
+                self.sums[rouge_type] += scores[rouge_type].fmeasure
+            self.count += 1
+
+    def compute(self) -> Dict[str, float]:
+        return {
+            f"soap_{rouge_type}": self.sums[rouge_type] / self.count if self.count else 0.0
+            for rouge_type in self.rouge_types
+        }
@@ -0,0 +1,30 @@
+import pytest
+from streaming_metrics import TriageConfusionMatrix
+
+
+def test_confusion_matrix_accumulates_batches():
+    matrix = TriageConfusionMatrix()
+    matrix.update([1, 2, 3], [1, 3, 3])
+    matrix.update([1, 5], [2, 5])
+    results = matrix.compute()
+
+    assert matrix.matrix[0, 0] == 1 and matrix.matrix[0, 1] == 1 and matrix.matrix[1, 2] == 1
+    assert results["triage_accuracy"] == 3 / 5
+    assert results["triage_undertriage_rate"] == 2 / 5
+    assert results["triage_sensitivity_esi1"] == 0.5
+    assert results["triage_sensitivity_esi2"] == 0.0
+    assert results["triage_sensitivity_esi4"] == 0.0  # no support
+
+
+def test_empty_matrix():
+    results = TriageConfusionMatrix().compute()
+    assert results["triage_accuracy"] == 0.0
+    assert results["triage_f1"] == 0.0
+
+
+@pytest.mark.parametrize("y_true, y_pred", [([0], [1]), ([1], [6]), ([1, 2], [1])])
+def test_rejects_invalid_levels(y_true, y_pred):
+    matrix = TriageConfusionMatrix()
+    with pytest.raises(ValueError):
+        matrix.update(y_true, y_pred)
+    assert matrix.matrix.sum() == 0
@@ -10,8 +10,8 @@ from transformers import (
     EarlyStoppingCallback,
 )
 from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training
-from data_utils import ClinicalDatasetLoader, preprocess_function
-from eval_metrics import compute_metrics
+from data_utils import ClinicalDatasetLoader, tokenize_with_cache
+from eval_metrics import compute_metrics, preprocess_logits_for_metrics
 import tensorboard
 
 def load_config(config_path):
@@ -56,16 +56,13 @@ def train():
     model.print_trainable_parameters()
     
     # 5. Load and Preprocess Dataset
+    # Token ids are cached as Arrow files keyed by tokenizer, template version
+    # and source data, so repeated runs skip tokenization entirely.
+    token_cache_dir = os.path.join(config['model_settings']['output_dir'], "tokenized_cache")
     # Placeholder: In production, substitute actual dataset paths
     try:
         loader = ClinicalDatasetLoader(data_path="c:/Users/soura/ER Clinical Intelligence Suite/data/train_data.jsonl")
         dataset = loader.load_data()
-        
-        tokenized_dataset = dataset.map(
-            lambda x: preprocess_function(x, tokenizer),
-            batched=True,
-            remove_columns=dataset["train"].column_names
-        )
     except Exception as e:
         print(f"Warning: Data loading failed ({e}). Proceeding with mock setup for validation...")
         # Mock data for verification purposes if real data isn't present
@@ -77,11 +74,6 @@ def train():
         }
         mock_ds = Dataset.from_dict(mock_data)
         dataset = DatasetDict({"train": mock_ds, "test": mock_ds})
-        tokenized_dataset = dataset.map(
-            lambda x: preprocess_function(x, tokenizer),
-            batched=True,
-            remove_columns=dataset["train"].column_names
-        )
 
     # 6. Training Arguments
     training_args = TrainingArguments(
@@ -102,8 +94,15 @@ def train():
         fp16=True, # T4/V100 support fp16
         push_to_hub=False,
         load_best_model_at_end=True,
-        metric_for_best_model="loss"
+        metric_for_best_model="loss",
+        # Metrics are accumulated batch by batch instead of on the full eval set
+        batch_eval_metrics=True
     )
+
+    # Rank 0 tokenizes (or hits the cache) first; other ranks then read the
+    # same Arrow files instead of tokenizing in parallel.
+    with training_args.main_process_first(desc="dataset tokenization"):
+        tokenized_dataset = tokenize_with_cache(dataset, tokenizer, token_cache_dir)
     
     # 7. Initialize Trainer
     trainer = Trainer(
@@ -112,6 +111,7 @@ def train():
         train_dataset=tokenized_dataset["train"],
         eval_dataset=tokenized_dataset["test"],
         compute_metrics=compute_metrics,
+        preprocess_logits_for_metrics=preprocess_logits_for_metrics,
         callbacks=[EarlyStoppingCallback(
             early_stopping_patience=config['early_stopping_params']['early_stopping_patience']
         )]